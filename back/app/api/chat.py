@@ -1,12 +1,139 @@
-from api.graph import load_graph
+import os
+from dotenv import load_dotenv
+import time
+from datetime import datetime, timezone
+from typing import Iterator, TYPE_CHECKING
+from api.graph import get_graph
 from db.orm.orm import db_engine
-from db.orm.orm_models import UsrSession, UsrMessages
+from db.orm.writer import message_writer
+from db.vdb.registry import corpus_registry, DEFAULT_CORPUS
 from models.dataclasses import ChatRequest, ChatResponse
-from utils.auxiliar_functions import format_order_history
-from utils.logger import logger
+from utils.auxiliar_functions import format_order_history, embed_queries
+from utils.circuit_breaker import chat_breaker
+from utils.deadline import remaining_time
+from utils.limiter import llm_limiter, Overloaded
+from utils.metrics import metrics
+from utils.quotas import quotas, QuotaExceeded
+from utils.scheduler import fair_scheduler, FAIR_QUEUE_TIMEOUT
+from utils.session_cache import session_cache, apply_message
+from utils.security import DEFAULT_CLIENT
+from utils.single_flight import chat_flight, session_locks, idempotency_store, SESSION_LOCK_TIMEOUT
+from utils.logger import logger, payload_logger
 
+if TYPE_CHECKING:
+    from db.orm.orm_models import UsrMessages
 
-def get_answer(request: ChatRequest) -> ChatResponse:
+load_dotenv()
+BATCH_MAX_CONCURRENCY = int(os.getenv('BATCH_MAX_CONCURRENCY', '8'))
+BATCH_INSERT_SIZE = int(os.getenv('BATCH_INSERT_SIZE', '500'))
+# Si está activo, la columna 'state' guarda todas las salidas intermedias del LLM ('partial_states')
+STORE_VERBOSE_STATE = os.getenv('STORE_VERBOSE_STATE', 'false').lower() == 'true'
+
+TECHNICAL_ERROR_MESSAGE = "Perdón, tuvimos un problema técnico. Por favor, intentá más tarde."
+
+
+class ForeignSession(Exception):
+    """
+    Se lanza cuando un cliente de la API intenta continuar una sesión creada por otro cliente.
+    """
+
+
+def _client_name(client) -> str:
+    # Sin cliente (por ejemplo, desde un script) se usa el cliente 'default', igual que en `fair_scheduler`
+    return client.name if client is not None else DEFAULT_CLIENT
+
+
+def get_answer(request: ChatRequest, deadline: float = None, idempotency_key: str = None, corpus: str = None,
+               client=None, on_token=None) -> ChatResponse:
+    """
+    Procesa una solicitud de interacción con el LLM evitando ejecuciones duplicadas.
+
+    - Si se recibe una clave de idempotencia ya respondida, se devuelve la respuesta guardada sin volver a procesarla.
+      Solo se guardan las respuestas exitosas (ver `_answer_once`).
+    - Las solicitudes idénticas en curso (misma clave de idempotencia, o mismo `session_id` y pregunta) comparten
+      una única ejecución del flujo de nodos y un único registro en la tabla 'messages'.
+    - Las interacciones de una misma sesión se procesan de a una, esperando como mucho 'SESSION_LOCK_TIMEOUT' segundos.
+
+    Parámetros:
+        request (ChatRequest): El objeto que contiene los detalles de la solicitud del chat, 
+        incluyendo el ID de la sesión y el mensaje del usuario.
+        deadline (float, opcional): Instante (reloj monótono) en el que vence la solicitud.
+        idempotency_key (str, opcional): Clave enviada por el cliente en el encabezado 'Idempotency-Key'.
+        corpus (str, opcional): Corpus enviado por el cliente en el encabezado 'X-Corpus'. Si no se indica, se usa
+        el guardado en la sesión o, para las sesiones nuevas, el corpus por defecto.
+        client (ApiClient, opcional): Cliente de la API que hizo la solicitud (ver `utils.security`). El flujo de
+        nodos espera su turno en `fair_scheduler` y los tokens usados se descuentan de su cuota. Las claves de
+        idempotencia y de las solicitudes en curso son por cliente, y solo el cliente que creó una sesión puede continuarla.
+        on_token (Callable, opcional): Recibe cada parte de la respuesta mientras se genera (ver `answer_turn`). Una
+        solicitud duplicada que espera la ejecución en curso no recibe las partes, solo la respuesta final.
+
+    Retorno:
+        ChatResponse: Un objeto que contiene el ID de la sesión y la respuesta generada por el bot.
+
+    Excepciones:
+        UnknownCorpus: Si el corpus pedido (o el de la sesión) no está declarado.
+        ForeignSession: Si la sesión la creó otro cliente de la API.
+        Overloaded: Si el limitador de llamadas al LLM está saturado. Se verifica antes de crear o recuperar
+        la sesión, para rechazar la solicitud lo antes posible.
+        SessionBusy: Si la sesión tiene otra interacción en curso que no terminó a tiempo.
+        QuotaExceeded: Si el cliente tiene demasiadas solicitudes esperando su turno en `fair_scheduler`.
+    """
+    logger.debug("Entrando en la función 'get_answer'.")
+    owner = _client_name(client)
+    if idempotency_key:
+        stored = idempotency_store.get((owner, idempotency_key))
+        if stored:
+            metrics.incr("chat.idempotent_replay")
+            logger.info("Clave de idempotencia '%s' ya respondida, se devuelve la respuesta guardada.", idempotency_key)
+            return stored
+    llm_limiter.check_admission()
+
+    if idempotency_key:
+        key = (owner, "idempotency_key", idempotency_key)
+    elif request.session_id:
+        key = (owner, request.session_id, request.question, corpus)
+    else:
+        key = None # Dos sesiones nuevas con el mismo mensaje son usuarios distintos: no se agrupan
+    if key:
+        return chat_flight.do(key, lambda: _answer_once(request, deadline, corpus, client, idempotency_key, on_token),
+                              timeout=remaining_time({"deadline": deadline}))
+    return _answer(request, deadline, corpus, client, on_token)
+
+
+def _answer_once(request: ChatRequest, deadline: float = None, corpus: str = None, client=None,
+                 idempotency_key: str = None, on_token=None) -> ChatResponse:
+    """
+    Ejecuta `_answer_in_session` y, si la solicitud trae clave de idempotencia, guarda la respuesta antes de
+    liberar la ejecución en curso: un duplicado que llega justo al terminar encuentra la respuesta guardada en
+    lugar de volver a ejecutar el flujo de nodos. Las respuestas de error técnico no se guardan, para que el
+    reintento del cliente vuelva a procesar la solicitud.
+    """
+    if idempotency_key:
+        # Un duplicado pudo haber leído el almacén justo antes de que la ejecución anterior guardara su respuesta
+        stored = idempotency_store.get((_client_name(client), idempotency_key))
+        if stored:
+            metrics.incr("chat.idempotent_replay")
+            return stored
+    response = _answer_in_session(request, deadline, corpus, client, on_token)
+    if idempotency_key and response.respuesta != TECHNICAL_ERROR_MESSAGE:
+        idempotency_store.set((_client_name(client), idempotency_key), response)
+    return response
+
+
+def _answer_in_session(request: ChatRequest, deadline: float = None, corpus: str = None, client=None,
+                       on_token=None) -> ChatResponse:
+    """
+    Ejecuta `_answer` con el lock de la sesión tomado, para que sus interacciones no compitan por el historial.
+    """
+    if not request.session_id:
+        return _answer(request, deadline, corpus, client, on_token)
+    remaining = remaining_time({"deadline": deadline})
+    timeout = SESSION_LOCK_TIMEOUT if remaining is None else min(SESSION_LOCK_TIMEOUT, remaining)
+    with session_locks.hold(request.session_id, timeout=timeout):
+        return _answer(request, deadline, corpus, client, on_token)
+
+
+def _answer(request: ChatRequest, deadline: float = None, corpus: str = None, client=None, on_token=None) -> ChatResponse:
     """
     Procesa una solicitud de interacción con el LLM y genera una respuesta.
 
@@ -17,17 +144,160 @@ def get_answer(request: ChatRequest) -> ChatResponse:
     Parámetros:
         request (ChatRequest): El objeto que contiene los detalles de la solicitud del chat, 
         incluyendo el ID de la sesión y el mensaje del usuario.
+        deadline (float, opcional): Instante (reloj monótono) en el que vence la solicitud. Se propaga a través del
+        flujo de nodos en la clave 'deadline' para que cada llamada al LLM use el tiempo restante como timeout.
+        corpus (str, opcional): Corpus en el que buscar la información (ver `_prepare_inputs`).
+        client (ApiClient, opcional): Cliente de la API (ver `get_answer`).
+        on_token (Callable, opcional): Recibe cada parte de la respuesta mientras se genera (ver `get_answer`).
 
     Retorno:
         ChatResponse: Un objeto que contiene el ID de la sesión y la respuesta generada por el bot.
     """
-    logger.debug("Entrando en la función 'get_answer'.")
+    inputs = _prepare_inputs(request, deadline, corpus=corpus, client=client)
+    if on_token is not None:
+        inputs["on_token"] = on_token
+
+    logger.debug(f"Entrando en el flujo de nodos.")
+    start_time = time.time()
+    try:
+        remaining = remaining_time({"deadline": deadline})
+        timeout = FAIR_QUEUE_TIMEOUT if remaining is None else min(FAIR_QUEUE_TIMEOUT, remaining)
+        with fair_scheduler.slot(client, timeout=timeout):
+            answer = get_graph().invoke(inputs)
+        quotas.charge(client, answer["tokens_used"]["total_tokens"])
+        usr_messages = _to_usr_message(request, answer, time.time() - start_time)
+        message = usr_messages.to_dict()
+        logger.debug(f"Guardando datos en la tabla 'messages'")
+        db_engine.save(usr_messages, usage=_to_usage(request, answer))
+        session_cache.update(request.session_id, message)
+
+    except (Overloaded, QuotaExceeded):
+        raise
+    except Exception as e:
+        logger.error("Error al invocar el LLM: %s", e)
+        answer = inputs
+        answer["agent_outcome"] = TECHNICAL_ERROR_MESSAGE
+    
+    payload_logger.debug("Respuesta final del bot: %s", answer['agent_outcome'])
+    
+    return ChatResponse(
+            session_id=request.session_id,
+            respuesta=answer["agent_outcome"]
+        )
+
+
+def answer_turn(request: ChatRequest, state: dict = None, deadline: float = None, corpus: str = None, client=None,
+                on_token=None) -> tuple:
+    """
+    Procesa una interacción de una conexión WebSocket (ver `api.websocket`), que mantiene el estado de sus
+    sesiones en memoria y no espera a la base de datos.
+
+    A diferencia de `get_answer`:
+        - El estado de la sesión ('state') lo aporta la conexión; solo se lee de la caché o de la base de datos
+          la primera vez que la conexión usa una sesión existente.
+        - La respuesta final se envía token a token a 'on_token' mientras se genera (ver `utils.token_stream`).
+        - La sesión nueva, el registro de 'messages' y las filas de 'usage' se guardan en segundo plano con
+          `message_writer`.
+
+    Parámetros:
+        request (ChatRequest): La solicitud del chat. Si es una sesión nueva, se le asigna el `session_id` creado.
+        state (dict, opcional): Estado de la sesión (con el formato de la caché de sesiones), o None si la conexión
+            todavía no lo tiene.
+        deadline (float, opcional): Instante (reloj monótono) en el que vence la interacción.
+        corpus (str, opcional): Corpus pedido por el cliente (ver `_prepare_inputs`).
+        client (ApiClient, opcional): Cliente de la API (ver `get_answer`).
+        on_token (Callable, opcional): Recibe cada parte de la respuesta (o None si la respuesta vuelve a empezar).
+
+    Retorno:
+        tuple[ChatResponse, dict]: La respuesta y el estado actualizado de la sesión.
+
+    Excepciones:
+        UnknownCorpus, ForeignSession, Overloaded, SessionBusy y QuotaExceeded, igual que `get_answer`.
+    """
+    llm_limiter.check_admission()
+    if not request.session_id:
+        return _answer_turn(request, state, deadline, corpus, client, on_token)
+    remaining = remaining_time({"deadline": deadline})
+    timeout = SESSION_LOCK_TIMEOUT if remaining is None else min(SESSION_LOCK_TIMEOUT, remaining)
+    with session_locks.hold(request.session_id, timeout=timeout):
+        return _answer_turn(request, state, deadline, corpus, client, on_token)
+
+
+def _answer_turn(request: ChatRequest, state: dict, deadline: float, corpus: str, client, on_token) -> tuple:
+    new_sessions = []
+    if request.session_id and state is None:
+        state = session_state(request.session_id)
+    inputs = _prepare_inputs(request, deadline, new_sessions=new_sessions, corpus=corpus, state=state, client=client)
+    if state is None:
+        state = {"user_name": None, "language": None, "corpus": inputs["corpus"], "client": _client_name(client), "messages": []}
+    inputs["on_token"] = on_token
+    start_time = time.time()
+    try:
+        remaining = remaining_time({"deadline": deadline})
+        timeout = FAIR_QUEUE_TIMEOUT if remaining is None else min(FAIR_QUEUE_TIMEOUT, remaining)
+        with fair_scheduler.slot(client, timeout=timeout):
+            answer = get_graph().invoke(inputs)
+        quotas.charge(client, answer["tokens_used"]["total_tokens"])
+        usr_messages = _to_usr_message(request, answer, time.time() - start_time)
+        message = usr_messages.to_dict()
+        message_writer.put(new_sessions + [usr_messages], usage=_to_usage(request, answer),
+                           session_id=request.session_id, message=message, timeout=remaining_time({"deadline": deadline}))
+        state = apply_message(state, message)
+    except (Overloaded, QuotaExceeded):
+        if new_sessions:
+            message_writer.put(new_sessions, timeout=remaining_time({"deadline": deadline}))
+        raise
+    except Exception as e:
+        logger.error("Error al invocar el LLM: %s", e)
+        if new_sessions:
+            message_writer.put(new_sessions, timeout=remaining_time({"deadline": deadline}))
+        answer = inputs
+        answer["agent_outcome"] = TECHNICAL_ERROR_MESSAGE
+
+    return ChatResponse(session_id=request.session_id, respuesta=answer["agent_outcome"]), state
+
+
+def _prepare_inputs(request: ChatRequest, deadline: float = None, new_sessions: list = None, corpus: str = None,
+                    state: dict = None, client=None) -> dict:
+    """
+    Arma el estado inicial del flujo de nodos para una solicitud.
+
+    Si no existe una sesión previa, crea una nueva con el historial de bienvenida. Si la sesión ya existe,
+    recupera el historial de los últimos 5 mensajes y el nombre e idioma del último mensaje: de la caché de
+    sesiones si está (sin leer la base de datos) o de la base de datos (ver `_load_session_state`).
+
+    Parámetros:
+        request (ChatRequest): La solicitud del chat. Si es una sesión nueva, se le asigna el `session_id` creado.
+        deadline (float, opcional): Instante (reloj monótono) en el que vence la solicitud.
+        new_sessions (list, opcional): Si se indica, las sesiones nuevas se agregan a esta lista en lugar de
+        guardarse de inmediato (para guardarlas todas juntas).
+        corpus (str, opcional): Corpus pedido por el cliente. Las sesiones nuevas lo guardan (o guardan el corpus
+        por defecto); las existentes usan el guardado si no se pide uno.
+        state (dict, opcional): Estado de la sesión ya conocido (con el formato de la caché de sesiones), por ejemplo
+        el que guarda una conexión WebSocket. Si se indica, no se lee la caché ni la base de datos.
+        client (ApiClient, opcional): Cliente de la API. Las sesiones nuevas quedan asociadas a él; las sesiones
+        anteriores a los clientes de la API pertenecen al cliente 'default'.
+
+    Retorno:
+        dict: El diccionario 'inputs' con el que se invoca el flujo de nodos.
+
+    Excepciones:
+        UnknownCorpus: Si el corpus pedido (o el de la sesión) no está declarado.
+        ForeignSession: Si la sesión la creó otro cliente de la API.
+    """
+    from db.orm.orm_models import UsrSession, UsrMessages
     # Si no existe la sesión, entonces se crea una.
     if not request.session_id:
-        session = UsrSession()
+        corpus = corpus_registry.check(corpus or DEFAULT_CORPUS)
+        session = UsrSession(corpus=corpus, client=_client_name(client))
         request.session_id = session.id
         logger.info("Sesión con ID %s creada.", request.session_id)
-        db_engine.save(session)
+        if new_sessions is None:
+            db_engine.save(session)
+        else:
+            new_sessions.append(session)
+        session_cache.set(request.session_id, {"user_name": None, "language": None, "corpus": corpus,
+                                               "client": _client_name(client), "messages": []})
         user_name = None
         language = None
         history_message = [{"HumanMessage": "", 
@@ -42,48 +312,215 @@ def get_answer(request: ChatRequest) -> ChatResponse:
     # Si existe la sesión, se recuperan los datos almmacenados hasta el momento
         # en conjunto con el historial de los últimos 5 mensajes. 
     else:
+        state = state or session_state(request.session_id)
+        if (state.get("client") or DEFAULT_CLIENT) != _client_name(client):
+            metrics.incr("chat.foreign_session")
+            logger.warning("El cliente '%s' intentó continuar la sesión '%s' de otro cliente.", _client_name(client), request.session_id)
+            raise ForeignSession(f"La sesión '{request.session_id}' pertenece a otro cliente.")
         logger.info("Sesión con ID %s recuperada.", request.session_id)
-        messages = db_engine.retrieve_history(request.session_id, UsrMessages)
-        if messages:
-            history_message = format_order_history(messages)
+        corpus = corpus_registry.check(corpus or state["corpus"] or DEFAULT_CORPUS)
+        if state["messages"]:
+            history_message = format_order_history(state["messages"])
         else:
             history_message = UsrMessages().to_dict() 
-        last_message = db_engine.get_last_message_dict()
-        user_name = last_message["user_name"]
-        language = last_message["language"]
+        user_name = state["user_name"]
+        language = state["language"]
 
-    inputs = {
+    return {
         "input": request.question,
         "input_translated": None,
         "user_name": user_name,
         "chat_history": history_message,
         "language": language,
-        "partial_states": None
+        "partial_states": None,
+        "tokens_used": {"completion_tokens": 0, "prompt_tokens": 0, "total_tokens": 0},
+        "llm_calls": [],
+        "deadline": deadline,
+        "corpus": corpus,
+        # Si el circuito del LLM está abierto, la respuesta se arma solo con la información recuperada
+        "degraded": chat_breaker.is_open()
     }
 
-    logger.debug(f"Entrando en el flujo de nodos.")
-    try:
-        answer = load_graph().invoke(inputs)
-        usr_messages = UsrMessages(
-            session_id=request.session_id,
-            user_name=answer["user_name"],
-            user_message=answer["input"],
-            answer=answer["agent_outcome"],
-            language=answer["language"],
-            tokens_used=answer["tokens_used"],
-            state=answer["partial_states"]
-            )
-        logger.debug(f"Guardando datos en la tabla 'messages'")
-        db_engine.save(usr_messages)
 
+def session_state(session_id: str) -> dict:
+    """
+    Devuelve el estado de una sesión existente: de la caché de sesiones o, si no está, de la base de datos
+    (y lo guarda en la caché).
+    """
+    state = session_cache.get(session_id)
+    if state is None or "client" not in state:
+        # Los estados guardados antes de asociar las sesiones a un cliente se vuelven a leer de la base de datos
+        state = _load_session_state(session_id)
+        if state["messages"]:
+            session_cache.set(session_id, state)
+    return state
+
+
+def _load_session_state(session_id: str) -> dict:
+    """
+    Lee de la base de datos el estado de una sesión con el formato de la caché de sesiones: el nombre y el
+    idioma del último mensaje, el corpus y el cliente de la sesión y los últimos 5 mensajes (del más nuevo al más viejo).
+    """
+    from db.orm.orm_models import UsrMessages
+    messages = db_engine.retrieve_history(session_id, UsrMessages)
+    last_message = messages[0] if messages else {}
+    info = db_engine.get_session_info(session_id)
+    return {
+        "user_name": last_message.get("user_name"),
+        "language": last_message.get("language"),
+        "corpus": info["corpus"],
+        "client": info["client"],
+        "messages": [{"user_message": m["user_message"], "answer": m["answer"]} for m in messages],
+    }
+
+
+def _to_usr_message(request: ChatRequest, answer: dict, latency: float = None) -> "UsrMessages":
+    """
+    Convierte el estado final del flujo de nodos en el registro a guardar en la tabla 'messages'.
+    'latency' es el tiempo en segundos que tardó el flujo de nodos.
+    """
+    from db.orm.orm_models import UsrMessages
+    if answer.get("degraded"):
+        metrics.incr("chat.degraded")
+        logger.warning("Interacción de la sesión '%s' respondida en modo degradado.", request.session_id)
+    return UsrMessages(
+        session_id=request.session_id,
+        user_name=answer["user_name"],
+        user_message=answer["input"],
+        answer=answer["agent_outcome"],
+        language=answer["language"],
+        tokens_used=answer["tokens_used"],
+        state=_state(answer),
+        latency_ms=int(latency * 1000) if latency is not None else None,
+        prompt_tokens=answer["tokens_used"]["prompt_tokens"],
+        completion_tokens=answer["tokens_used"]["completion_tokens"],
+        total_tokens=answer["tokens_used"]["total_tokens"]
+        )
+
+
+def _state(answer: dict) -> dict:
+    """
+    Arma el valor de la columna 'state' de la tabla 'messages'.
+
+    Para retomar una sesión alcanza con el nombre, el idioma y el historial, que ya tienen sus propias columnas,
+    así que por defecto solo se guardan los nodos que llamaron al LLM, si la respuesta fue en modo degradado y
+    el corpus. Con 'STORE_VERBOSE_STATE' se guardan además todas las salidas intermedias ('partial_states').
+    """
+    state = {
+        "steps": list(answer.get("partial_states") or {}),
+        "degraded": bool(answer.get("degraded")),
+        "corpus": answer.get("corpus"),
+    }
+    if STORE_VERBOSE_STATE:
+        state["partial_states"] = answer.get("partial_states")
+    return state
+
+
+def _to_usage(request: ChatRequest, answer: dict) -> list:
+    """
+    Convierte las llamadas al LLM de la interacción (clave 'llm_calls') en filas de la tabla 'usage'.
+    Las fechas se guardan en UTC, igual que los intervalos de los totales por hora y por día.
+    """
+    from db.orm.orm_models import UsrUsage
+    ts = datetime.now(timezone.utc).replace(tzinfo=None)
+    return [UsrUsage(session_id=request.session_id, ts=ts, **call) for call in answer.get("llm_calls") or []]
+
+
+def get_answers(requests: list, max_concurrency: int = BATCH_MAX_CONCURRENCY, deadline: float = None, corpus: str = None,
+                client=None) -> Iterator[tuple]:
+    """
+    Procesa muchas solicitudes de chat en lote y devuelve las respuestas a medida que terminan.
+
+    A diferencia de `get_answer`, el grafo compilado se ejecuta una sola vez con `batch_as_completed`, con
+    como mucho 'max_concurrency' solicitudes en paralelo. Los embeddings de todas las preguntas se piden al
+    proveedor en una sola llamada, las sesiones nuevas se guardan juntas y los registros de la tabla 'messages'
+    se insertan en bloques de 'BATCH_INSERT_SIZE'.
+
+    Parámetros:
+        requests (list[ChatRequest]): Las solicitudes a procesar.
+        max_concurrency (int, opcional): Cantidad máxima de solicitudes ejecutándose a la vez. Se limita a la
+        cantidad de solicitudes en espera por cliente de `fair_scheduler` ('FAIR_MAX_QUEUE_PER_CLIENT').
+        deadline (float, opcional): Instante (reloj monótono) en el que vence el lote completo.
+        corpus (str, opcional): Corpus para todas las solicitudes del lote (ver `_prepare_inputs`).
+        client (ApiClient, opcional): Cliente de la API. Cada solicitud del lote espera su turno en
+        `fair_scheduler` (sin plazo, salvo el del lote, y sin el límite de la cola del cliente, porque el lote ya
+        pasó la cuota) y sus tokens se descuentan de la cuota del cliente.
+
+    Retorno:
+        Iterator[tuple[int, ChatResponse]]: Pares (posición de la solicitud en 'requests', respuesta), en el
+        orden en que terminan.
+
+    Excepciones:
+        Overloaded: Si el limitador de llamadas al LLM está saturado (se verifica antes de empezar).
+        UnknownCorpus: Si el corpus pedido (o el de alguna sesión) no está declarado.
+        ForeignSession: Si alguna sesión la creó otro cliente de la API.
+
+    Notas:
+        - Las solicitudes del lote son independientes: varias preguntas de una misma sesión ven el historial
+          previo al lote, no las respuestas de las otras preguntas del mismo lote.
+        - La preparación (sesiones y embeddings) se hace al llamar a la función; el flujo de nodos corre
+          a medida que se consume el iterador.
+    """
+    logger.debug("Entrando en la función 'get_answers'.")
+    llm_limiter.check_admission()
+    # Más solicitudes a la vez que la cola del cliente en `fair_scheduler` solo esperarían en ella
+    max_concurrency = max(1, min(max_concurrency, fair_scheduler.max_queue_per_client))
+    new_sessions = []
+    batch_inputs = [_prepare_inputs(request, deadline, new_sessions, corpus, client=client) for request in requests]
+    if new_sessions:
+        db_engine.save_all(new_sessions)
+    try:
+        vectors = embed_queries([inputs["input"] for inputs in batch_inputs], deadline)
+        for inputs, vector in zip(batch_inputs, vectors):
+            inputs["query_embedding"] = vector
+    except Overloaded:
+        raise
     except Exception as e:
-        logger.error(f"Error al invocar el LLM: {e}")
-        answer = inputs
-        answer["agent_outcome"] = "Perdón, tuvimos un problema técnico. Por favor, intentá más tarde." 
-    
-    logger.debug(f"Respuesta final del bot: {answer['agent_outcome']}")
-    
-    return ChatResponse(
-            session_id=request.session_id,
-            respuesta=answer["agent_outcome"]
-        )
\ No newline at end of file
+        logger.error("No se pudieron calcular los embeddings del lote, se calcularán por solicitud: %s", e)
+    return _run_batch(requests, batch_inputs, max_concurrency, client)
+
+
+def _run_batch(requests: list, batch_inputs: list, max_concurrency: int, client=None) -> Iterator[tuple]:
+    from langchain_core.runnables import RunnableLambda
+    graph = get_graph()
+    pending_rows = []
+    pending_usage = []
+
+    def save_pending():
+        messages = [(row.session_id, row.to_dict()) for row in pending_rows]
+        db_engine.save_all(pending_rows, usage=pending_usage)
+        pending_rows.clear()
+        pending_usage.clear()
+        for session_id, message in messages:
+            session_cache.update(session_id, message)
+
+    def scheduled(inputs: dict, config) -> tuple:
+        # Cada solicitud del lote ocupa un lugar del cliente en `fair_scheduler` mientras corre el flujo de nodos.
+        # El lote ya pasó la cuota: sus solicitudes esperan su turno aunque la cola del cliente esté llena.
+        # La latencia se mide por solicitud, desde que empieza a procesarse (incluye la espera en `fair_scheduler`,
+        # igual que en `_answer`)
+        start_time = time.time()
+        with fair_scheduler.slot(client, timeout=remaining_time(inputs), limit_queue=False):
+            answer = graph.invoke(inputs, config)
+        return answer, time.time() - start_time
+
+    try:
+        for index, result in RunnableLambda(scheduled).batch_as_completed(
+                batch_inputs, config={"max_concurrency": max_concurrency}, return_exceptions=True):
+            request = requests[index]
+            if isinstance(result, Exception):
+                logger.error("Error al invocar el LLM para la solicitud %s del lote: %s", index, result)
+                respuesta = TECHNICAL_ERROR_MESSAGE
+            else:
+                answer, latency = result
+                pending_rows.append(_to_usr_message(request, answer, latency))
+                pending_usage.extend(_to_usage(request, answer))
+                quotas.charge(client, answer["tokens_used"]["total_tokens"])
+                respuesta = answer["agent_outcome"]
+            if len(pending_rows) >= BATCH_INSERT_SIZE:
+                save_pending()
+            yield index, ChatResponse(session_id=request.session_id, respuesta=respuesta)
+    finally:
+        # Se guardan las respuestas pendientes aunque el cliente deje de leer el resultado
+        if pending_rows:
+            save_pending()
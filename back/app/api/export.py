@@ -0,0 +1,227 @@
+import os
+from dotenv import load_dotenv
+import csv
+import io
+import json
+import time
+from datetime import datetime
+from typing import Iterator, Optional
+from db.orm.orm import db_engine
+from utils.logger import logger
+
+load_dotenv()
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '1000'))
+
+"""
+Exportación de conversaciones (tablas 'sessions' y 'messages').
+
+Cada fila exportada es un mensaje con los datos de su sesión. Las filas se leen de la base de datos con un
+cursor del lado del servidor ('yield_per', que en PostgreSQL implica 'stream_results'), de a 'EXPORT_BATCH_SIZE',
+y se escriben a medida que llegan: la memoria usada no depende del tamaño de las tablas.
+
+Las columnas JSON ('tokens_used' y 'state') solo se leen si se piden con 'include_state'.
+
+Uso (desde back/app):
+    python -m api.export --format ndjson --start 2024-10-01 --end 2024-11-01 > conversaciones.ndjson
+    python -m api.export --format parquet --out conversaciones.parquet   (requiere pyarrow)
+"""
+
+FORMATS = ("ndjson", "csv", "parquet")
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+COLUMNS = ("message_id", "session_id", "ts", "session_ts", "api_version", "corpus", "user_name", "language",
+           "user_message", "answer", "latency_ms", "prompt_tokens", "completion_tokens", "total_tokens")
+INTEGER_COLUMNS = ("message_id", "latency_ms", "prompt_tokens", "completion_tokens", "total_tokens")
+STATE_COLUMNS = ("tokens_used", "state")
+
+
+def _columns(include_state: bool = False) -> dict:
+    """
+    Devuelve las columnas de SQLAlchemy a exportar por nombre (los modelos se importan recién al exportar).
+    """
+    from db.orm.orm_models import UsrSession, UsrMessages
+    columns = {
+        "message_id": UsrMessages.id,
+        "session_id": UsrMessages.session_id,
+        "ts": UsrMessages.ts,
+        "session_ts": UsrSession.ts,
+        "api_version": UsrSession.api_version,
+        "corpus": UsrSession.corpus,
+        "user_name": UsrMessages.user_name,
+        "language": UsrMessages.language,
+        "user_message": UsrMessages.user_message,
+        "answer": UsrMessages.answer,
+        "latency_ms": UsrMessages.latency_ms,
+        "prompt_tokens": UsrMessages.prompt_tokens,
+        "completion_tokens": UsrMessages.completion_tokens,
+        "total_tokens": UsrMessages.total_tokens,
+    }
+    if include_state:
+        columns.update({"tokens_used": UsrMessages.tokens_used, "state": UsrMessages.state})
+    return columns
+
+
+def export_columns(include_state: bool = False) -> list[str]:
+    return list(COLUMNS) + (list(STATE_COLUMNS) if include_state else [])
+
+
+def iter_rows(start: Optional[datetime] = None,
+              end: Optional[datetime] = None,
+              session_id: Optional[str] = None,
+              include_state: bool = False,
+              batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[dict]:
+    """
+    Recorre los mensajes (con los datos de su sesión) ordenados por fecha, sin cargarlos todos en memoria.
+
+    Parámetros:
+        start (datetime, opcional): Solo mensajes con 'ts' mayor o igual.
+        end (datetime, opcional): Solo mensajes con 'ts' menor.
+        session_id (str, opcional): Solo los mensajes de esa sesión.
+        include_state (bool): Si es True, incluye las columnas 'tokens_used' y 'state'.
+        batch_size (int): Cantidad de filas que se traen del servidor por vez.
+
+    Retorno:
+        Iterator[dict]: Un diccionario por mensaje, con las claves de `export_columns`.
+    """
+    from sqlalchemy import select
+    from db.orm.orm_models import UsrSession, UsrMessages
+    columns = _columns(include_state)
+    query = (
+        select(*(column.label(name) for name, column in columns.items()))
+        .join(UsrSession, UsrSession.id == UsrMessages.session_id)
+        .order_by(UsrMessages.ts, UsrMessages.id)
+    )
+    if start is not None:
+        query = query.where(UsrMessages.ts >= start)
+    if end is not None:
+        query = query.where(UsrMessages.ts < end)
+    if session_id is not None:
+        query = query.where(UsrMessages.session_id == session_id)
+
+    start_time = time.time()
+    count = 0
+    session = db_engine.Session()
+    try:
+        result = session.execute(query.execution_options(yield_per=batch_size))
+        for row in result.mappings():
+            count += 1
+            yield dict(row)
+    finally:
+        session.close()
+        logger.info("Exportación: %s mensajes leídos en %.2f segundos.", count, time.time() - start_time)
+
+
+def to_ndjson(rows: Iterator[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
+
+def to_csv(rows: Iterator[dict], columns: list[str]) -> Iterator[str]:
+    """
+    Convierte las filas a CSV (con encabezado). Las columnas JSON se escriben como texto JSON.
+    """
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=columns)
+    writer.writeheader()
+    for row in rows:
+        writer.writerow({
+            name: json.dumps(value, ensure_ascii=False) if isinstance(value, (dict, list)) else value
+            for name, value in row.items()
+        })
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def write_parquet(rows: Iterator[dict], path: str, columns: list[str], batch_size: int = EXPORT_BATCH_SIZE) -> int:
+    """
+    Escribe las filas en un archivo Parquet, un grupo de filas cada 'batch_size' mensajes.
+    Las columnas JSON se guardan como texto JSON. Requiere 'pyarrow'.
+
+    Retorno:
+        int: La cantidad de filas escritas.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("La exportación a Parquet requiere instalar 'pyarrow'.") from e
+
+    schema = pa.schema([
+        (name, pa.int64() if name in INTEGER_COLUMNS else pa.timestamp("us") if name in ("ts", "session_ts") else pa.string())
+        for name in columns
+    ])
+
+    def to_batch(chunk: list) -> "pa.RecordBatch":
+        data = {
+            name: [
+                json.dumps(row[name], ensure_ascii=False) if isinstance(row[name], (dict, list))
+                else str(row[name]) if name == "session_id" and row[name] is not None
+                else row[name]
+                for row in chunk
+            ]
+            for name in columns
+        }
+        return pa.RecordBatch.from_pydict(data, schema=schema)
+
+    count = 0
+    chunk = []
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= batch_size:
+                writer.write_batch(to_batch(chunk))
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            writer.write_batch(to_batch(chunk))
+            count += len(chunk)
+    return count
+
+
+def export(fmt: str, **filters) -> Iterator[str]:
+    """
+    Devuelve la exportación en formato 'ndjson' o 'csv' como un iterador de texto, para enviarla por
+    streaming o escribirla en un archivo. 'filters' son los parámetros de `iter_rows`.
+    """
+    if fmt == "ndjson":
+        return to_ndjson(iter_rows(**filters))
+    if fmt == "csv":
+        return to_csv(iter_rows(**filters), export_columns(filters.get("include_state", False)))
+    raise ValueError(f"Formato de exportación no soportado: '{fmt}'.")
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+    parser = argparse.ArgumentParser(description="Exporta las conversaciones en NDJSON, CSV o Parquet.")
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--out", help="Archivo de salida (obligatorio para Parquet; si no, la salida estándar).")
+    parser.add_argument("--start", type=datetime.fromisoformat)
+    parser.add_argument("--end", type=datetime.fromisoformat)
+    parser.add_argument("--session-id")
+    parser.add_argument("--include-state", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+    filters = {
+        "start": args.start,
+        "end": args.end,
+        "session_id": args.session_id,
+        "include_state": args.include_state,
+        "batch_size": args.batch_size,
+    }
+    if args.format == "parquet":
+        if not args.out:
+            parser.error("La exportación a Parquet necesita '--out'.")
+        written = write_parquet(iter_rows(**filters), args.out, export_columns(args.include_state), args.batch_size)
+        logger.info("Exportación a Parquet: %s filas escritas en '%s'.", written, args.out)
+    else:
+        out = open(args.out, "w", encoding="utf-8", newline="") if args.out else sys.stdout
+        try:
+            for chunk in export(args.format, **filters):
+                out.write(chunk)
+        finally:
+            if args.out:
+                out.close()
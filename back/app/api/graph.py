@@ -1,9 +1,18 @@
-from langgraph.graph import END, StateGraph
-from models.agent_state import AgentState
+from functools import lru_cache
 from utils.functions import CallChain
-from utils.auxiliar_functions import edge_has_name, edge_has_language
+from utils.auxiliar_functions import edge_has_name, edge_has_language, edge_is_degraded
 
-def load_graph() -> StateGraph:
+
+@lru_cache(maxsize=1)
+def get_graph():
+    """
+    Devuelve el flujo de nodos compilado. Se compila una única vez por proceso y se reutiliza
+    en todas las solicitudes (el grafo compilado no guarda estado entre invocaciones).
+    """
+    return load_graph()
+
+
+def load_graph():
     """
     Crea y configura el flujo de nodos.
 
@@ -15,13 +24,17 @@ def load_graph() -> StateGraph:
     personalidad.
 
     Se configuran las transiciones condicionales entre los nodos en función de las 
-    condiciones `edge_has_name` y `edge_has_language`, y se establecen los puntos de 
-    entrada y salida del flujo de trabajo.
+    condiciones `edge_has_name`, `edge_has_language` y `edge_is_degraded`, y se establecen 
+    los puntos de entrada y salida del flujo de trabajo.
 
     Returns:
         El gráfico de estados compilado, que puede ser utilizado para manejar el 
         flujo de interacción del agente.
     """
+    # langgraph se importa acá para no demorar el arranque de la aplicación
+    from langgraph.graph import END, StateGraph
+    from models.agent_state import AgentState
+
     call_chain = CallChain()
 
     workflow = StateGraph(AgentState)
@@ -54,7 +67,14 @@ def load_graph() -> StateGraph:
         }
     )
 
-    workflow.add_edge("call_rag", "personality")
+    workflow.add_conditional_edges(
+        "call_rag",  
+        edge_is_degraded,
+        {
+            "personality": "personality",  
+            "end": END  
+        }
+    )
 
     workflow.add_edge("personality", END)
 
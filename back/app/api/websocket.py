@@ -0,0 +1,181 @@
+import os
+from dotenv import load_dotenv
+import asyncio
+import json
+from collections import OrderedDict
+from fastapi import WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from api.chat import answer_turn, ForeignSession
+from db.vdb.registry import UnknownCorpus
+from models.dataclasses import ChatRequest
+from utils.deadline import new_deadline
+from utils.limiter import Overloaded
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.quotas import quotas, QuotaExceeded
+from utils.startup import readiness
+
+load_dotenv()
+# Interacciones procesándose a la vez por conexión; la conexión deja de leer mensajes hasta que termine alguna
+WS_MAX_IN_FLIGHT = int(os.getenv('WS_MAX_IN_FLIGHT', '8'))
+# Sesiones cuyo estado guarda cada conexión (se descartan las menos usadas)
+WS_MAX_SESSIONS = int(os.getenv('WS_MAX_SESSIONS', '1000'))
+
+"""
+Conversaciones por WebSocket ('/chat/ws').
+
+El cliente se autentica una sola vez al conectarse (ver `utils.security.verify_websocket`) y después envía
+sus preguntas por la misma conexión, como mensajes JSON:
+    {"type": "message", "id": "...", "session_id": "...", "question": "...", "corpus": "..."}
+'session_id' vacío crea una sesión nueva; 'corpus' es opcional (como el encabezado 'X-Corpus'); 'id' identifica
+la interacción en las respuestas (por defecto, el 'session_id').
+
+Por cada pregunta el servidor envía la respuesta final token a token y un evento de cierre:
+    {"type": "token", "id": "...", "content": "..."}
+    {"type": "end", "id": "...", "respuesta": "...", "session_id": "..."}
+    {"type": "error", "id": "...", "status": 429, "detail": "...", "retry_after": 5}
+Si una llamada se reintenta después de haber enviado tokens, se envía {"type": "reset", "id": "..."} y la
+respuesta vuelve a empezar. Las respuestas que no pasan por el LLM (por ejemplo, la bienvenida o el modo
+degradado) llegan solo en el evento 'end'.
+
+Varias sesiones pueden compartir una conexión (integraciones servidor a servidor): las interacciones de
+sesiones distintas se procesan en paralelo, hasta 'WS_MAX_IN_FLIGHT', y las de una misma sesión en orden.
+La conexión guarda en memoria el estado de sus sesiones (nombre, idioma, corpus y últimos mensajes), así que
+solo lee la caché de sesiones o la base de datos la primera vez que usa una sesión existente, y los mensajes
+se guardan en segundo plano (ver `db.orm.writer`).
+"""
+
+
+class ChatConnection:
+    """
+    Una conexión WebSocket autenticada: lee las preguntas, las procesa con `answer_turn` en el pool de hilos
+    y envía los eventos desde una única tarea, en el orden en que se generan.
+    """
+    def __init__(self, websocket: WebSocket, client):
+        self.websocket = websocket
+        self.client = client
+        self.sessions = OrderedDict()  # session_id -> estado de la sesión (formato de la caché de sesiones)
+        self._session_locks = {}       # session_id -> asyncio.Lock
+        self._outbox = asyncio.Queue()
+        self._slots = asyncio.Semaphore(WS_MAX_IN_FLIGHT)
+        self._tasks = set()
+
+    async def serve(self) -> None:
+        metrics.incr("ws.connections")
+        sender = asyncio.create_task(self._send_events())
+        try:
+            while True:
+                try:
+                    text = await self.websocket.receive_text()
+                except KeyError:
+                    # Un frame binario no trae 'text': se rechaza y la conexión sigue abierta
+                    metrics.incr("ws.invalid_frames")
+                    self._send({"type": "error", "id": None, "status": 400,
+                                "detail": "Mensaje inválido: se esperan frames de texto con JSON."})
+                    continue
+                await self._slots.acquire()
+                task = asyncio.create_task(self._turn(text))
+                self._tasks.add(task)
+                task.add_done_callback(self._turn_done)
+        except WebSocketDisconnect:
+            logger.info("Conexión WebSocket del cliente '%s' cerrada.", self.client.name)
+        finally:
+            # Las interacciones en curso terminan en su hilo y se guardan igual; solo se deja de esperarlas
+            for task in self._tasks:
+                task.cancel()
+            sender.cancel()
+
+    def _turn_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+
+    async def _send_events(self) -> None:
+        while True:
+            events = [await self._outbox.get()]
+            while not self._outbox.empty():
+                events.append(self._outbox.get_nowait())
+            try:
+                for event in _coalesce(events):
+                    await self.websocket.send_json(event)
+            except (WebSocketDisconnect, RuntimeError):
+                return
+
+    def _send(self, event: dict) -> None:
+        self._outbox.put_nowait(event)
+
+    async def _turn(self, text: str) -> None:
+        try:
+            data = json.loads(text)
+        except ValueError:
+            data = None
+        if not isinstance(data, dict) or data.get("type", "message") != "message" or not isinstance(data.get("question"), str):
+            self._send({"type": "error", "id": data.get("id") if isinstance(data, dict) else None, "status": 400,
+                        "detail": "Mensaje inválido: se espera {\"type\": \"message\", \"session_id\": ..., \"question\": ...}."})
+            return
+        session_id = str(data.get("session_id") or "")
+        turn_id = data.get("id") or session_id or None
+        if not session_id:
+            await self._answer(turn_id, session_id, data)
+            return
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        async with lock:
+            await self._answer(turn_id, session_id, data)
+
+    async def _answer(self, turn_id, session_id: str, data: dict) -> None:
+        loop = asyncio.get_running_loop()
+
+        def on_token(token) -> None:
+            # Se llama desde el hilo que ejecuta el flujo de nodos
+            event = {"type": "token", "id": turn_id, "content": token} if token is not None else {"type": "reset", "id": turn_id}
+            loop.call_soon_threadsafe(self._outbox.put_nowait, event)
+
+        request = ChatRequest(session_id=session_id, question=data["question"])
+        try:
+            readiness.check()
+            quotas.admit(self.client)
+            res, state = await run_in_threadpool(answer_turn, request, self.sessions.get(session_id), new_deadline(),
+                                                 data.get("corpus"), self.client, on_token)
+        except UnknownCorpus as e:
+            self._send({"type": "error", "id": turn_id, "status": 404, "detail": str(e)})
+            return
+        except ForeignSession as e:
+            self._send({"type": "error", "id": turn_id, "status": 403, "detail": str(e)})
+            return
+        except QuotaExceeded as e:
+            self._send({"type": "error", "id": turn_id, "status": 429, "detail": str(e), "retry_after": e.retry_after})
+            return
+        except Overloaded as e:
+            self._send({"type": "error", "id": turn_id, "status": 503, "retry_after": e.retry_after,
+                        "detail": "Servicio saturado, por favor reintentá en unos segundos."})
+            return
+        except Exception as e:
+            logger.error("Error al procesar la interacción '%s' por WebSocket: %s", turn_id, e)
+            self._send({"type": "error", "id": turn_id, "status": 500, "detail": "Error interno del servidor."})
+            return
+        self._remember(str(res.session_id), state)
+        metrics.incr("ws.turns")
+        self._send({"type": "end", "id": turn_id or str(res.session_id), "respuesta": res.respuesta, "session_id": str(res.session_id)})
+
+    def _remember(self, session_id: str, state: dict) -> None:
+        self.sessions[session_id] = state
+        self.sessions.move_to_end(session_id)
+        while len(self.sessions) > WS_MAX_SESSIONS:
+            evicted, _ = self.sessions.popitem(last=False)
+            lock = self._session_locks.get(evicted)
+            if lock is not None and not lock.locked():
+                del self._session_locks[evicted]
+
+
+def _coalesce(events: list) -> list:
+    """
+    Une los tokens seguidos de una misma interacción en un solo evento, para enviar menos mensajes
+    cuando el modelo genera más rápido de lo que se envían.
+    """
+    merged = []
+    for event in events:
+        last = merged[-1] if merged else None
+        if last is not None and event["type"] == "token" and last["type"] == "token" and last["id"] == event["id"]:
+            merged[-1] = {**last, "content": last["content"] + event["content"]}
+        else:
+            merged.append(event)
+    return merged
@@ -0,0 +1,80 @@
+"""
+Benchmark del embedding de las consultas: backend de OpenAI frente al modelo local (ONNX en CPU).
+
+Lanza '--queries' consultas con distintos niveles de concurrencia (un hilo por consulta en vuelo, como las
+solicitudes de la API) y mide la latencia de `embed_query` y el rendimiento. Con el backend local informa
+además el tamaño medio de los lotes que arma el agrupador de consultas.
+
+El backend de OpenAI necesita 'OPENAI_API_KEY'; el local, 'LOCAL_EMBEDDING_PATH' con el modelo exportado.
+
+Uso (desde back/app):
+    python -m benchmarks.bench_embeddings --backend local --concurrency 1 8 32 --queries 2000
+"""
+import argparse
+import random
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from utils.metrics import metrics
+
+QUESTIONS = [
+    "¿Cuáles son los plazos de entrega?",
+    "¿Qué pasa si el producto llega dañado?",
+    "¿Cómo solicito una factura?",
+    "What is the return policy?",
+    "¿Hay envíos al exterior?",
+    "Quels sont les moyens de paiement acceptés ?",
+]
+
+
+def get_backend(name: str):
+    if name == "local":
+        from utils.embeddings import LocalEmbeddings
+        return LocalEmbeddings()
+    from langchain_openai import OpenAIEmbeddings
+    from utils.auxiliar_functions import EMBEDDING_NAME_MODEL, EMBEDDING_SIZE_MODEL
+    return OpenAIEmbeddings(model=EMBEDDING_NAME_MODEL, dimensions=EMBEDDING_SIZE_MODEL)
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+    return f"p50={pick(50):.2f} ms  p95={pick(95):.2f} ms  p99={pick(99):.2f} ms  media={statistics.mean(samples) * 1000:.2f} ms"
+
+
+def run(embeddings, concurrency: int, queries: int) -> None:
+    def one(i: int) -> float:
+        # Se agrega un número para que el proveedor no devuelva resultados en caché
+        text = f"{random.choice(QUESTIONS)} ({i})"
+        start = time.perf_counter()
+        embeddings.embed_query(text)
+        return time.perf_counter() - start
+
+    metrics.reset()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(one, range(queries)))
+    elapsed = time.perf_counter() - start
+    line = f"concurrencia {concurrency:>3}: {queries / elapsed:8.1f} consultas/s  {percentiles(latencies)}"
+    batch = metrics.snapshot()["timings"].get("embeddings.local.batch_size")
+    if batch:
+        line += f"  lote medio={batch['avg']:.1f}"
+    print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("local", "openai"), default="local")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    embeddings = get_backend(args.backend)
+    print(f"Backend '{args.backend}' listo en {time.perf_counter() - start:.2f} s")
+    for concurrency in args.concurrency:
+        run(embeddings, concurrency, args.queries)
+
+
+if __name__ == "__main__":
+    main()
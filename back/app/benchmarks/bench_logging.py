@@ -0,0 +1,74 @@
+"""
+Benchmark del costo de logging por interacción.
+
+Reproduce las llamadas al logger que hace una interacción completa (nodos, llamadas al LLM, RAG, ORM),
+con contenidos de tamaño realista, y mide el tiempo que pasan en el hilo de la solicitud con nivel
+DEBUG e INFO, en formato texto y JSON, con escritura síncrona y con QueueHandler/QueueListener.
+
+Uso (desde back/app):
+    python -m benchmarks.bench_logging --turns 2000
+"""
+import argparse
+import logging
+import os
+import time
+from utils.logger import GetLogger, SamplingFilter
+
+CHUNK = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 40
+OUTCOME = {"language": "español", "translate": "¿Qué dice el documento sobre los plazos de entrega?"}
+ANSWER = "Según el documento, los plazos de entrega son de cinco días hábiles. " * 3
+PROMPT = "Dada la siguiente consulta del usuario: ... " + CHUNK
+
+
+def one_turn(logger: logging.Logger, payload: logging.Logger) -> None:
+    logger.debug("Entrando en la función 'get_answer'.")
+    logger.info("Sesión con ID %s recuperada.", "5f0c3c52-7b1e-4f5e-9d7e-1f1d7f2d9b11")
+    logger.info("[orm][retrieve_history] ID de la sesión: '%s'. Historial de mensajes recuperado exitosamente en %.2f segundos.", "5f0c3c52", 0.004)
+    for prompt_name, outcome in (("get_language", OUTCOME), ("call_rag", ANSWER), ("personality_esp", ANSWER)):
+        logger.debug("Entrando en la llamada al LLM.")
+        logger.debug("Entrando en la función 'get_prompt'.")
+        payload.debug("Prompt '%s': %s", prompt_name, PROMPT)
+        logger.debug("Modelo de '%s' instanciado.", "chat")
+        logger.debug("Entrando en la función 'invoke_llm'.")
+        logger.debug("Tokens calculados: %s", {"completion_tokens": 52, "prompt_tokens": 812, "total_tokens": 864})
+        logger.info("LLamada al LLM con el prompt: '%s' ejecutada en %.2f segundos.", prompt_name, 0.83)
+        payload.debug("Respuesta del LLM: '%s'", outcome)
+    payload.debug("Información recuperada por el RAG: '%s'", CHUNK)
+    payload.debug("Respuesta final del bot: %s", ANSWER)
+    logger.info("ID de la sesión: '%s'. Sesión guardada exitosamente en %.2f segundos.", "5f0c3c52", 0.006)
+    logger.info("Interacción con ID '%s' procesada en %.2f segundos.", "5f0c3c52", 2.1)
+
+
+def run(turns: int, level: int, log_format: str, use_queue: bool, sample_rate: float) -> float:
+    name = f"bench.{logging.getLevelName(level)}.{log_format}.{use_queue}.{sample_rate}"
+    with open(os.devnull, "w") as devnull:
+        root = GetLogger(name=name, level=level, log_format=log_format, use_queue=use_queue, stream=devnull)
+        logger = root.logger
+        logger.propagate = False
+        payload = logger.getChild("payload")
+        if sample_rate < 1:
+            payload.addFilter(SamplingFilter(sample_rate))
+        one_turn(logger, payload)  # calentamiento
+        start = time.perf_counter()
+        for _ in range(turns):
+            one_turn(logger, payload)
+        elapsed = time.perf_counter() - start
+        root.stop()
+    return elapsed / turns * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=2000)
+    args = parser.parse_args()
+    print(f"{'nivel':<6} {'formato':<7} {'cola':<5} {'muestreo':<8} {'µs/interacción':>15}")
+    for level in (logging.DEBUG, logging.INFO):
+        for log_format in ("text", "json"):
+            for use_queue in (False, True):
+                for sample_rate in ((1.0, 0.1) if level == logging.DEBUG else (1.0,)):
+                    cost = run(args.turns, level, log_format, use_queue, sample_rate)
+                    print(f"{logging.getLevelName(level):<6} {log_format:<7} {str(use_queue):<5} {sample_rate:<8} {cost:>15.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Benchmark de la tabla 'messages': esquema anterior frente a esquema compacto y particionado.
+
+Crea en un esquema aparte ('--schema') dos tablas con '--rows' mensajes repartidos en '--months' meses:
+    - legacy: tabla común, columnas JSON y 'state' con todas las salidas intermedias del LLM.
+    - partitioned: particionada por mes sobre 'ts', columnas JSONB y 'state' compacto (ver `api.chat._state`).
+Ambas tienen el índice (session_id, id) que usa `retrieve_history`.
+
+Después mide el tamaño de cada tabla, la latencia de insertar un mensaje (una transacción por fila) y la de
+leer el historial de una sesión (los últimos 5 mensajes), con sesiones elegidas al azar.
+
+Los datos se generan en el servidor con generate_series, así que cargar decenas de millones de filas no pasa
+por Python. Se necesita una base PostgreSQL ('POSTGRES_URL' o '--url').
+
+Uso (desde back/app):
+    python -m benchmarks.bench_messages --rows 20000000 --samples 2000
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from datetime import date
+from dotenv import load_dotenv
+from sqlalchemy import create_engine, text
+
+load_dotenv()
+POSTGRES_URL = os.getenv('POSTGRES_URL')
+MESSAGES_PER_SESSION = 5
+VERBOSE_STATE_SIZE = 1500
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def create_tables(conn, schema: str, months: int) -> None:
+    conn.execute(text(f"DROP SCHEMA IF EXISTS {schema} CASCADE"))
+    conn.execute(text(f"CREATE SCHEMA {schema}"))
+    columns = """
+        session_id UUID NOT NULL,
+        ts TIMESTAMP NOT NULL DEFAULT now(),
+        user_name VARCHAR,
+        user_message VARCHAR NOT NULL,
+        answer VARCHAR NOT NULL,
+        language VARCHAR,
+        tokens_used {json} NOT NULL,
+        state {json} NOT NULL
+    """
+    conn.execute(text(f"CREATE TABLE {schema}.legacy (id BIGSERIAL PRIMARY KEY, {columns.format(json='JSON')})"))
+    conn.execute(text(
+        f"CREATE TABLE {schema}.partitioned (id BIGSERIAL, {columns.format(json='JSONB')}, PRIMARY KEY (id, ts)) "
+        f"PARTITION BY RANGE (ts)"
+    ))
+    first = add_months(date.today().replace(day=1), -months + 1)
+    for i in range(months + 1):
+        month = add_months(first, i)
+        conn.execute(text(
+            f"CREATE TABLE {schema}.partitioned_y{month.year}m{month.month:02d} PARTITION OF {schema}.partitioned "
+            f"FOR VALUES FROM ('{month}') TO ('{add_months(month, 1)}')"
+        ))
+    conn.execute(text(f"CREATE TABLE {schema}.partitioned_default PARTITION OF {schema}.partitioned DEFAULT"))
+
+
+def load(conn, schema: str, rows: int, months: int) -> None:
+    session = f"lpad(to_hex(i / {MESSAGES_PER_SESSION}), 32, '0')::uuid"
+    # Los mensajes de una sesión quedan juntos en el tiempo; las sesiones se reparten en todo el período
+    ts = f"now() - interval '{months * 30} days' * (1 - (i / {MESSAGES_PER_SESSION})::float / {rows // MESSAGES_PER_SESSION + 1}) + interval '1 minute' * (i % {MESSAGES_PER_SESSION})"
+    common = f"""
+        {session}, {ts}, 'Ana', 'Pregunta número ' || i, 'Respuesta número ' || i || ' ' || repeat('x', 200), 'español',
+        '{{"completion_tokens": 52, "prompt_tokens": 812, "total_tokens": 864}}'
+    """
+    verbose = (
+        f"json_build_object('get_language', json_build_object('language', 'español', 'translate', 'Pregunta ' || i), "
+        f"'call_rag', repeat('y', {VERBOSE_STATE_SIZE}), 'personality_esp', repeat('z', 400))"
+    )
+    compact = "'{\"steps\": [\"get_language\", \"call_rag\", \"personality_esp\"], \"degraded\": false, \"corpus\": \"default\"}'"
+    for table, state in (("legacy", verbose), ("partitioned", compact)):
+        start = time.perf_counter()
+        conn.execute(text(
+            f"INSERT INTO {schema}.{table} (session_id, ts, user_name, user_message, answer, language, tokens_used, state) "
+            f"SELECT {common}, {state} FROM generate_series(0, {rows - 1}) AS i"
+        ))
+        conn.execute(text(f"CREATE INDEX ON {schema}.{table} (session_id, id)"))
+        conn.execute(text(f"ANALYZE {schema}.{table}"))
+        print(f"{table}: {rows} filas cargadas en {time.perf_counter() - start:.1f} s")
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+    return f"p50={pick(50):.2f} ms  p95={pick(95):.2f} ms  p99={pick(99):.2f} ms  media={statistics.mean(samples) * 1000:.2f} ms"
+
+
+def measure(engine, schema: str, table: str, rows: int, samples: int) -> None:
+    sessions = rows // MESSAGES_PER_SESSION
+    with engine.connect() as conn:
+        size = conn.execute(text(f"SELECT pg_size_pretty(sum(pg_total_relation_size(c.oid))) FROM pg_class c "
+                                 f"JOIN pg_namespace n ON n.oid = c.relnamespace "
+                                 f"WHERE n.nspname = '{schema}' AND c.relname LIKE '{table}%' AND c.relkind = 'r'")).scalar()
+        reads = []
+        for _ in range(samples):
+            session_id = f"{random.randrange(sessions):032x}"
+            start = time.perf_counter()
+            conn.execute(text(
+                f"SELECT * FROM {schema}.{table} WHERE session_id = :s ORDER BY id DESC LIMIT 5"
+            ), {"s": session_id}).fetchall()
+            reads.append(time.perf_counter() - start)
+    state = ("json_build_object('call_rag', repeat('y', 1500))" if table == "legacy"
+             else "'{\"steps\": [\"call_rag\"], \"degraded\": false}'")
+    inserts = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"INSERT INTO {schema}.{table} (session_id, user_message, answer, tokens_used, state) "
+                f"VALUES (:s, 'pregunta', 'respuesta', '{{}}', {state})"
+            ), {"s": f"{random.randrange(sessions):032x}"})
+        inserts.append(time.perf_counter() - start)
+    print(f"\n{table} (tamaño {size})")
+    print(f"  insert:    {percentiles(inserts)}")
+    print(f"  historial: {percentiles(reads)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default=POSTGRES_URL)
+    parser.add_argument("--schema", default="bench_messages")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--months", type=int, default=12)
+    parser.add_argument("--samples", type=int, default=1000)
+    parser.add_argument("--keep", action="store_true", help="No borra el esquema al terminar.")
+    args = parser.parse_args()
+
+    engine = create_engine(args.url)
+    with engine.begin() as conn:
+        create_tables(conn, args.schema, args.months)
+        load(conn, args.schema, args.rows, args.months)
+    try:
+        for table in ("legacy", "partitioned"):
+            measure(engine, args.schema, table, args.rows, args.samples)
+    finally:
+        if not args.keep:
+            with engine.begin() as conn:
+                conn.execute(text(f"DROP SCHEMA {args.schema} CASCADE"))
+
+
+if __name__ == "__main__":
+    main()
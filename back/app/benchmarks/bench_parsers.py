@@ -0,0 +1,131 @@
+"""
+Benchmark del parseo de documentos para crear los índices: documentos por segundo según la cantidad de procesos.
+
+Genera un corpus sintético en una carpeta temporal ('--docs' documentos repartidos entre Word, HTML,
+Markdown y texto, de '--sections' secciones cada uno; los PDF no se generan porque hacen falta librerías
+externas para escribirlos) y lo parsea con `db.vdb.parsers.iter_documents` para cada cantidad de procesos
+de '--workers'. Informa documentos y secciones por segundo y la aceleración respecto de un solo proceso.
+
+La aceleración depende de la cantidad de CPU de la máquina: con más procesos que CPU no mejora y el costo de
+crear los procesos y pasar los resultados la empeora (en una máquina de 1 CPU, 2 y 4 procesos dieron x0.58 y x0.49).
+
+Uso (desde back/app):
+    python -m benchmarks.bench_parsers --workers 1 2 4 8 --docs 400
+"""
+import argparse
+import html
+import os
+import random
+import tempfile
+import time
+import zipfile
+from db.vdb.parsers import discover, iter_documents
+
+WORDS = ("envío plazo factura producto devolución garantía pago cliente pedido reclamo stock tarjeta "
+         "transferencia sucursal horario atención cambio talle color precio descuento cuota").split()
+
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Target="word/document.xml" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+    '</Relationships>'
+)
+_W_NS = 'xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"'
+
+
+def sentence(rng: random.Random, words: int = 14) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def sections(rng: random.Random, count: int) -> list:
+    return [(f"Sección {i + 1}", [" ".join(sentence(rng) for _ in range(5)) for _ in range(3)]) for i in range(count)]
+
+
+def docx_paragraph(text: str, style: str = "") -> str:
+    properties = f'<w:pPr><w:pStyle w:val="{style}"/></w:pPr>' if style else ""
+    return f'<w:p>{properties}<w:r><w:t xml:space="preserve">{html.escape(text)}</w:t></w:r></w:p>'
+
+
+def write_docx(path: str, content: list) -> None:
+    styles = (f'<w:styles {_W_NS}><w:style w:type="paragraph" w:styleId="Ttulo1">'
+              f'<w:name w:val="heading 1"/></w:style></w:styles>')
+    body = "".join(docx_paragraph(title, "Ttulo1") + "".join(docx_paragraph(p) for p in paragraphs) for title, paragraphs in content)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("[Content_Types].xml", _DOCX_CONTENT_TYPES)
+        archive.writestr("_rels/.rels", _DOCX_RELS)
+        archive.writestr("word/styles.xml", styles)
+        archive.writestr("word/document.xml", f'<w:document {_W_NS}><w:body>{body}</w:body></w:document>')
+
+
+def write_html(path: str, content: list) -> None:
+    body = "".join(f"<h2>{html.escape(title)}</h2>" + "".join(f"<p>{html.escape(p)}</p>" for p in paragraphs)
+                   for title, paragraphs in content)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(f"<html><head><style>p {{margin: 0}}</style></head><body><h1>Preguntas</h1>{body}</body></html>")
+
+
+def write_markdown(path: str, content: list) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("# Preguntas\n\n" + "".join(f"## {title}\n\n" + "\n\n".join(paragraphs) + "\n\n" for title, paragraphs in content))
+
+
+def write_text(path: str, content: list) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n\n".join(f"{title}\n\n" + "\n\n".join(paragraphs) for title, paragraphs in content))
+
+
+WRITERS = {".docx": write_docx, ".html": write_html, ".md": write_markdown, ".txt": write_text}
+
+
+def build_corpus(folder: str, docs: int, count: int, seed: int = 0) -> None:
+    rng = random.Random(seed)
+    extensions = list(WRITERS)
+    for i in range(docs):
+        extension = extensions[i % len(extensions)]
+        WRITERS[extension](os.path.join(folder, f"doc_{i:05d}{extension}"), sections(rng, count))
+
+
+def run(paths: list, workers: int) -> float:
+    start = time.perf_counter()
+    parsed = total_sections = errors = 0
+    for _, result, error in iter_documents(paths, workers=workers):
+        parsed += error is None
+        errors += error is not None
+        total_sections += len(result)
+    elapsed = time.perf_counter() - start
+    print(f"workers {workers:>2}: {parsed / elapsed:8.1f} docs/s  {total_sections / elapsed:9.1f} secciones/s  "
+          f"{elapsed:6.2f} s  errores={errors}")
+    return parsed / elapsed
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--docs", type=int, default=400)
+    parser.add_argument("--sections", type=int, default=40)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        build_corpus(folder, args.docs, args.sections)
+        paths = discover(folder)
+        print(f"Corpus sintético: {len(paths)} documentos ({', '.join(WRITERS)}), {args.sections} secciones cada uno "
+              f"({os.cpu_count()} CPUs)")
+        baseline = None
+        for workers in args.workers:
+            rate = run(paths, workers)
+            baseline = baseline or rate
+            print(f"            aceleración x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark de los prompts de extracción ('get_name' y 'get_language') con cada modo de salida.
+
+Compara `JsonOutputParser` (el modelo responde JSON siguiendo las instrucciones del prompt) con las salidas
+estructuradas nativas del proveedor ('function_calling', 'json_schema'): tokens del prompt por llamada,
+proporción de intentos cuya salida no se pudo parsear y latencia.
+
+Usa el modelo configurado ('CHAT_NAME_MODEL'); para no depender del proveedor se puede apuntar al simulador
+con 'OPENAI_BASE_URL' (ver `simulator`).
+
+Uso (desde back/app):
+    python -m benchmarks.bench_structured_output --modes json_parser function_calling json_schema --repeat 3
+"""
+import argparse
+import statistics
+import time
+from models.dataclasses import Language, Name
+from utils.auxiliar_functions import get_prompt, get_model, invoke_llm, structured_model
+from utils.metrics import metrics
+
+MESSAGES = {
+    "get_name": [
+        "Hola, soy el ingeniero a cargo, Pedro",
+        "buenas! mi nombre completo es María José",
+        "Todos me dicen Tincho",
+        "no quiero decirte mi nombre",
+        "Hi there, it's Jonathan speaking",
+    ],
+    "get_language": [
+        "¿Cuáles son los plazos de entrega?",
+        "What is the return policy?",
+        "Quels sont les moyens de paiement acceptés ?",
+        "Wie lange dauert der Versand?",
+        "asdf qwer",
+    ],
+}
+SCHEMAS = {"get_name": Name, "get_language": Language}
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+    return f"p50={pick(50):.0f} ms  p95={pick(95):.0f} ms"
+
+
+def run(mode: str, repeat: int) -> None:
+    metrics.reset()
+    for prompt_name, messages in MESSAGES.items():
+        latencies, prompt_tokens, failures = [], [], 0
+        for _ in range(repeat):
+            for message in messages:
+                inputs = {"input": message}
+                prompt, parser = get_prompt(inputs, prompt_name, SCHEMAS[prompt_name], mode)
+                model = structured_model(get_model(model_type="chat", temperature=0), SCHEMAS[prompt_name], mode)
+                start = time.perf_counter()
+                try:
+                    _, cb = invoke_llm(model, prompt, parser, inputs, prompt_name=prompt_name, mode=mode)
+                    prompt_tokens.append(cb.prompt_tokens)
+                    latencies.append(time.perf_counter() - start)
+                except Exception:
+                    failures += 1
+        calls = repeat * len(messages)
+        attempts = calls - failures + metrics.get(f"llm.output.{mode}.parse_errors")
+        line = (f"{mode:>16} {prompt_name:>12}: tokens de prompt={statistics.mean(prompt_tokens) if prompt_tokens else 0:6.1f}  "
+                f"errores de parseo={metrics.get(f'llm.output.{mode}.parse_errors') / max(attempts, 1):6.1%}  "
+                f"fallidas={failures}/{calls}")
+        if latencies:
+            line += f"  {percentiles(latencies)}"
+        print(line)
+        metrics.reset()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--modes", nargs="+", default=["json_parser", "function_calling", "json_schema"],
+                        choices=["json_parser", "function_calling", "json_schema", "json_mode"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    for mode in args.modes:
+        run(mode, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
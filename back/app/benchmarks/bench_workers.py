@@ -0,0 +1,152 @@
+"""
+Benchmark de memoria por worker y escalado del throughput con la cantidad de procesos.
+
+Para cada cantidad de workers (de 1 a N) levanta `gunicorn -c gunicorn.conf.py main:app` en un puerto
+local, espera a que '/ready' responda 200 y mide:
+    - RSS, PSS y memoria compartida de cada worker (de /proc/<pid>/smaps_rollup, solo Linux). El PSS
+      reparte las páginas compartidas entre los procesos que las usan, así que muestra el efecto de
+      inicializar antes del fork (WEB_PRELOAD=true) frente a hacerlo en cada worker.
+    - Solicitudes por segundo contra 'path' con 'concurrency' clientes durante 'duration' segundos.
+
+Se necesita la misma configuración (.env, base de datos, índice vectorial) que para levantar la API.
+
+Uso (desde back/app):
+    python -m benchmarks.bench_workers --max-workers 4 --path /health
+    WEB_PRELOAD=false python -m benchmarks.bench_workers --max-workers 4
+"""
+import argparse
+import http.client
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from dotenv import load_dotenv
+
+load_dotenv()
+FASTAPI_PASSWORD = os.getenv('FASTAPI_PASSWORD', '')
+
+
+def children(pid: int) -> list[int]:
+    """
+    Devuelve los PIDs de los procesos hijos de 'pid' (los workers de gunicorn).
+    """
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except FileNotFoundError:
+        return []
+
+
+def memory(pid: int) -> dict:
+    """
+    Lee RSS, PSS y memoria compartida (en MB) de /proc/<pid>/smaps_rollup.
+    """
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) / 1024
+    return {
+        "rss": values.get("Rss", 0.0),
+        "pss": values.get("Pss", 0.0),
+        "shared": values.get("Shared_Clean", 0.0) + values.get("Shared_Dirty", 0.0),
+    }
+
+
+def request(conn: http.client.HTTPConnection, path: str) -> int:
+    conn.request("GET", path, headers={"X-API-Key": FASTAPI_PASSWORD})
+    response = conn.getresponse()
+    response.read()
+    return response.status
+
+
+def wait_ready(port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if request(http.client.HTTPConnection("127.0.0.1", port, timeout=2), "/ready") == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise SystemExit(f"La API no estuvo lista en {timeout} segundos.")
+
+
+def load(port: int, path: str, concurrency: int, duration: float) -> tuple[float, int]:
+    """
+    Envía solicitudes con 'concurrency' clientes (una conexión keep-alive cada uno) durante
+    'duration' segundos. Devuelve las solicitudes exitosas por segundo y la cantidad de errores.
+    """
+    counts = [[0, 0] for _ in range(concurrency)]
+    stop = time.monotonic() + duration
+
+    def client(index: int) -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.monotonic() < stop:
+            try:
+                ok = request(conn, path) == 200
+            except (OSError, http.client.HTTPException):
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                ok = False
+            counts[index][0 if ok else 1] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return sum(c[0] for c in counts) / duration, sum(c[1] for c in counts)
+
+
+def run(workers: int, args) -> dict:
+    env = {**os.environ, "WEB_CONCURRENCY": str(workers), "WEB_BIND": f"127.0.0.1:{args.port}"}
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "main:app"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready(args.port, args.startup_timeout)
+        pids = children(proc.pid)
+        rps, errors = load(args.port, args.path, args.concurrency, args.duration)
+        mem = [memory(pid) for pid in pids]
+        return {
+            "workers": workers,
+            "rps": rps,
+            "errors": errors,
+            "rss": sum(m["rss"] for m in mem) / len(mem),
+            "pss": sum(m["pss"] for m in mem) / len(mem),
+            "shared": sum(m["shared"] for m in mem) / len(mem),
+            "total_pss": sum(m["pss"] for m in mem) + memory(proc.pid)["pss"],
+        }
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--path", default="/health")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--startup-timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"preload={os.getenv('WEB_PRELOAD', 'true')} path={args.path} concurrency={args.concurrency}")
+    print(f"{'workers':>8}{'req/s':>10}{'escalado':>10}{'errores':>9}{'RSS MB':>9}{'PSS MB':>9}{'compart.':>10}{'PSS total':>11}")
+    base = None
+    for workers in range(1, args.max_workers + 1):
+        result = run(workers, args)
+        base = base or result["rps"] or 1
+        print(f"{workers:>8}{result['rps']:>10.0f}{result['rps'] / base:>10.2f}{result['errors']:>9}"
+              f"{result['rss']:>9.1f}{result['pss']:>9.1f}{result['shared']:>10.1f}{result['total_pss']:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
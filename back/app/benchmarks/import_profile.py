@@ -0,0 +1,94 @@
+"""
+Perfil del tiempo de importación de la aplicación.
+
+Ejecuta `python -X importtime -c "import main"` en un subproceso limpio, suma los tiempos propios de cada
+módulo agrupados por paquete de primer nivel y muestra los más costosos. También mide el tiempo de pared
+total de `import main`, que es lo que tarda un worker en poder aceptar conexiones.
+
+Uso (desde back/app):
+    python -m benchmarks.import_profile --top 20
+    python -m benchmarks.import_profile --json > import_profile.json
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+import time
+
+LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def run_importtime(module: str) -> tuple[list[dict], float]:
+    """
+    Importa 'module' en un subproceso con `-X importtime` y devuelve las filas parseadas
+    junto con el tiempo de pared del subproceso en segundos.
+    """
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise SystemExit(f"No se pudo importar '{module}':\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        match = LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append({
+                "module": name,
+                "self_ms": int(self_us) / 1000,
+                "cumulative_ms": int(cumulative_us) / 1000,
+                "depth": len(indent) // 2
+            })
+    return rows, elapsed
+
+
+def by_package(rows: list[dict]) -> dict:
+    """
+    Suma los tiempos propios de los módulos agrupados por paquete de primer nivel.
+    """
+    packages = {}
+    for row in rows:
+        package = row["module"].split(".")[0]
+        packages[package] = packages.get(package, 0.0) + row["self_ms"]
+    return dict(sorted(packages.items(), key=lambda item: item[1], reverse=True))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", action="store_true", help="Imprime el resultado en JSON para compararlo entre versiones.")
+    args = parser.parse_args()
+
+    rows, elapsed = run_importtime(args.module)
+    total_ms = sum(row["self_ms"] for row in rows)
+    packages = by_package(rows)
+    slowest = sorted(rows, key=lambda row: row["self_ms"], reverse=True)[:args.top]
+
+    if args.json:
+        print(json.dumps({
+            "module": args.module,
+            "wall_seconds": round(elapsed, 3),
+            "import_ms": round(total_ms, 1),
+            "modules": len(rows),
+            "packages": {name: round(ms, 1) for name, ms in list(packages.items())[:args.top]},
+            "slowest": slowest
+        }, indent=1))
+        return
+
+    print(f"import {args.module}: {total_ms:.1f} ms en {len(rows)} módulos ({elapsed:.2f} s de pared con el intérprete)")
+    print(f"\n{'paquete':<30}{'ms':>10}")
+    for name, ms in list(packages.items())[:args.top]:
+        print(f"{name:<30}{ms:>10.1f}")
+    print(f"\n{'módulo':<50}{'propio ms':>12}{'acum. ms':>12}")
+    for row in slowest:
+        print(f"{row['module']:<50}{row['self_ms']:>12.1f}{row['cumulative_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
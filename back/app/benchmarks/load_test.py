@@ -0,0 +1,102 @@
+"""
+Prueba de carga de la API de chat.
+
+Simula '--sessions' usuarios concurrentes: cada uno envía su nombre (crea la sesión) y después '--turns'
+preguntas, una detrás de otra. Informa el rendimiento, los percentiles de latencia por interacción y los
+códigos de respuesta.
+
+Para obtener números reproducibles sin el proveedor real, la API se levanta apuntando al simulador:
+    python -m simulator --port 8100 --config simulator/scenarios/default.json
+    OPENAI_BASE_URL=http://localhost:8100/v1 OPENAI_API_KEY=simulador EMBEDDING_CHECK_CTX_LENGTH=false uvicorn main:app --port 8000
+
+Uso (desde back/app):
+    python -m benchmarks.load_test --url http://localhost:8000 --sessions 50 --turns 5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+
+load_dotenv()
+FASTAPI_PASSWORD = os.getenv('FASTAPI_PASSWORD', '')
+
+NAMES = ["Ana", "Juan", "Lucía", "Pedro", "Sofía", "Martín"]
+QUESTIONS = [
+    "¿Cuáles son los plazos de entrega?",
+    "¿Qué pasa si el producto llega dañado?",
+    "What is the return policy?",
+    "¿Hay envíos al exterior?",
+    "Quels sont les moyens de paiement acceptés ?",
+]
+
+
+def post(url: str, payload: dict, timeout: float) -> tuple:
+    request = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json", "X-API-Key": FASTAPI_PASSWORD},
+        method="POST",
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, None
+    except (urllib.error.URLError, TimeoutError):
+        return 0, None
+
+
+def conversation(url: str, turns: int, timeout: float, rng: random.Random) -> list:
+    results = []
+    session_id = ""
+    for question in [f"Me llamo {rng.choice(NAMES)}"] + [rng.choice(QUESTIONS) for _ in range(turns)]:
+        start = time.perf_counter()
+        status, body = post(url, {"session_id": session_id, "question": question}, timeout)
+        results.append((status, time.perf_counter() - start))
+        if body and body.get("session_id"):
+            session_id = body["session_id"]
+    return results
+
+
+def percentiles(samples: list) -> str:
+    samples = sorted(samples)
+    pick = lambda p: samples[min(len(samples) - 1, int(p / 100 * len(samples)))] * 1000
+    return f"p50={pick(50):.0f} ms  p95={pick(95):.0f} ms  p99={pick(99):.0f} ms  media={statistics.mean(samples) * 1000:.0f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    url = args.url.rstrip("/") + "/chat/chat"
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions) as pool:
+        futures = [
+            pool.submit(conversation, url, args.turns, args.timeout, random.Random(args.seed + i))
+            for i in range(args.sessions)
+        ]
+        results = [result for future in futures for result in future.result()]
+    elapsed = time.perf_counter() - start
+
+    statuses = Counter(status for status, _ in results)
+    latencies = [latency for status, latency in results if status == 200]
+    print(f"{len(results)} interacciones en {elapsed:.1f} s ({len(results) / elapsed:.1f} por segundo)")
+    print(f"códigos: {dict(sorted(statuses.items()))}")
+    if latencies:
+        print(f"latencia (200): {percentiles(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import os
+from dotenv import load_dotenv
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+# Cada cuántos segundos se recalculan los totales de uso (0 desactiva la tarea), y cuántos minutos hacia atrás
+USAGE_ROLLUP_INTERVAL = float(os.getenv('USAGE_ROLLUP_INTERVAL', '60'))
+USAGE_ROLLUP_LOOKBACK_MINUTES = int(os.getenv('USAGE_ROLLUP_LOOKBACK_MINUTES', '120'))
+# Cada cuántos segundos se mantienen las particiones de 'messages' (0 desactiva la tarea)
+MESSAGES_MAINTENANCE_INTERVAL = float(os.getenv('MESSAGES_MAINTENANCE_INTERVAL', '3600'))
+
+"""
+Tareas periódicas de mantenimiento de la base de datos, fuera del camino de las solicitudes.
+
+Un hilo por proceso ejecuta cada tarea registrada cada 'interval' segundos (la primera vez, un intervalo después
+de arrancar, cuando la inicialización ya creó las tablas). Un error se registra en el log y en la métrica
+'maintenance.<tarea>.error', y la tarea se vuelve a intentar en el siguiente intervalo. Tareas:
+    - 'usage_rollups': recalcula los totales de 'usage_hourly' y 'usage_daily' de los últimos
+      'USAGE_ROLLUP_LOOKBACK_MINUTES' minutos a partir de la tabla 'usage' (ver `PostgresOrm.refresh_usage_rollups`).
+    - 'partitions': crea las particiones mensuales de 'messages' y archiva las viejas (ver `db.orm.partitions.maintain`),
+      así los mensajes de un mes nuevo no quedan en la partición por defecto aunque la aplicación no se reinicie.
+
+Las tareas se pueden ejecutar varias veces sobre los mismos datos y usan advisory locks de PostgreSQL, así que
+con varios workers de gunicorn no se ejecutan a la vez.
+"""
+
+
+class PeriodicTasks:
+    """
+    Tareas con su intervalo y un hilo que las ejecuta. El hilo se crea con `start` (al arrancar la aplicación en
+    cada worker) y se detiene con `stop`.
+    """
+    def __init__(self):
+        self._tasks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def add(self, name: str, task: Callable[[], object], interval: float) -> None:
+        """
+        Registra 'task' para ejecutarla cada 'interval' segundos. Con un intervalo de 0 o menos no se registra.
+        """
+        if interval > 0:
+            self._tasks.append({"name": name, "task": task, "interval": interval, "next_run": 0.0})
+
+    def start(self) -> None:
+        with self._lock:
+            if not self._tasks:
+                return
+            if self._thread is not None and self._thread.is_alive() and self._pid == os.getpid():
+                return
+            now = time.monotonic()
+            for task in self._tasks:
+                task["next_run"] = now + task["interval"]
+            self._pid = os.getpid()
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._run, name="db-maintenance", daemon=True)
+            self._thread.start()
+
+    def run(self, name: str) -> None:
+        """
+        Ejecuta la tarea 'name' una vez y registra su duración o su error.
+        """
+        task = next(task for task in self._tasks if task["name"] == name)
+        start = time.monotonic()
+        try:
+            task["task"]()
+        except Exception as e:
+            metrics.incr(f"maintenance.{name}.error")
+            logger.error("La tarea de mantenimiento '%s' falló: %s", name, e)
+            return
+        metrics.observe(f"maintenance.{name}.seconds", time.monotonic() - start)
+
+    def _run(self) -> None:
+        stop = self._stop
+        while not stop.is_set():
+            for task in self._tasks:
+                if time.monotonic() >= task["next_run"]:
+                    self.run(task["name"])
+                    task["next_run"] = time.monotonic() + task["interval"]
+            stop.wait(max(0.0, min(task["next_run"] for task in self._tasks) - time.monotonic()))
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Detiene el hilo (al apagar la aplicación), esperando como mucho 'timeout' segundos a la tarea en curso.
+        """
+        with self._lock:
+            thread = self._thread
+            self._stop.set()
+        if thread is not None and thread.is_alive() and self._pid == os.getpid():
+            thread.join(timeout)
+
+
+def refresh_usage_rollups(lookback_minutes: int = USAGE_ROLLUP_LOOKBACK_MINUTES) -> int:
+    from db.orm.orm import db_engine
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=lookback_minutes)
+    return db_engine.refresh_usage_rollups(since)
+
+
+def maintain_partitions() -> bool:
+    from db.orm.partitions import maintain
+    return maintain()
+
+
+# static instance for common usages
+maintenance = PeriodicTasks()
+maintenance.add("usage_rollups", refresh_usage_rollups, USAGE_ROLLUP_INTERVAL)
+maintenance.add("partitions", maintain_partitions, MESSAGES_MAINTENANCE_INTERVAL)
@@ -1,27 +1,86 @@
 import os
 from dotenv import load_dotenv
+import threading
 import time
-from sqlalchemy import create_engine, select, desc, and_, or_, not_
-from sqlalchemy.orm import sessionmaker
-from db.orm.orm_models import Base, UsrSession, UsrMessages
 from utils.logger import logger
 
 
 load_dotenv()
 POSTGRES_URL = os.getenv('POSTGRES_URL')
 
+# Cambios de esquema sobre tablas ya creadas (create_all no modifica tablas existentes). Deben poder
+# ejecutarse más de una vez.
+SCHEMA_UPGRADES = [
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS corpus VARCHAR",
+    "ALTER TABLE sessions ADD COLUMN IF NOT EXISTS client VARCHAR",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS latency_ms INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS prompt_tokens INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS completion_tokens INTEGER",
+    "ALTER TABLE messages ADD COLUMN IF NOT EXISTS total_tokens INTEGER",
+    """
+    DO $$ BEGIN
+        IF EXISTS (SELECT 1 FROM information_schema.columns
+                   WHERE table_name = 'messages' AND column_name = 'state' AND data_type = 'json') THEN
+            ALTER TABLE messages
+                ALTER COLUMN state TYPE JSONB USING state::jsonb,
+                ALTER COLUMN tokens_used TYPE JSONB USING tokens_used::jsonb;
+        END IF;
+    END $$
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_messages_session_id_id ON messages (session_id, id)",
+    "ALTER TABLE usage ADD COLUMN IF NOT EXISTS cached_tokens INTEGER NOT NULL DEFAULT 0",
+    "ALTER TABLE usage_hourly ADD COLUMN IF NOT EXISTS cached_tokens BIGINT NOT NULL DEFAULT 0",
+    "ALTER TABLE usage_daily ADD COLUMN IF NOT EXISTS cached_tokens BIGINT NOT NULL DEFAULT 0",
+]
+
+# Columnas de las tablas de totales por intervalo, modelo y prompt (ver `refresh_usage_rollups`)
+ROLLUP_COLUMNS = ("calls", "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens", "latency_ms_sum",
+                  "latency_ms_max")
+# Clave del advisory lock con el que un solo proceso recalcula los totales a la vez
+USAGE_ROLLUP_LOCK = 7_562_001
+
 
 class PostgresOrm:
-    def __init__(self):
-        db_url = POSTGRES_URL
-        self.engine = create_engine(db_url)
-        self.Session = sessionmaker(bind=self.engine)
-        self._create_tables()
-    
-    def _create_tables(self):
+    """
+    Acceso a PostgreSQL. SQLAlchemy y los modelos se importan recién al usar la base de datos por primera vez
+    (ver `engine`), así importar la aplicación no los carga.
+    """
+    def __init__(self, create_tables=True):
+        self.db_url = POSTGRES_URL
+        self._engine = None
+        self._session_factory = None
+        self._lock = threading.Lock()
+        if create_tables:
+            self.create_tables()
+
+    @property
+    def engine(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    from sqlalchemy import create_engine
+                    from sqlalchemy.orm import sessionmaker
+                    # create_engine no abre conexiones: la primera se abre al usar la base de datos
+                    engine = create_engine(self.db_url)
+                    self._session_factory = sessionmaker(bind=engine)
+                    self._engine = engine
+        return self._engine
+
+    @property
+    def Session(self):
+        if self._session_factory is None:
+            self.engine  # crea el engine y la fábrica de sesiones
+        return self._session_factory
+
+    def create_tables(self):
+        from sqlalchemy import text
+        from db.orm.orm_models import Base
         Base.metadata.create_all(self.engine)
+        with self.engine.begin() as connection:
+            for ddl in SCHEMA_UPGRADES:
+                connection.execute(text(ddl))
 
-    def save(self, data_model) -> None:
+    def save(self, data_model, usage: list = None) -> None:
         """
         Guarda un modelo de datos en la base de datos seleccionada.
 
@@ -32,6 +91,8 @@ class PostgresOrm:
         Parámetros:
             data_model: El modelo de datos que se desea guardar en la base de datos. 
                         Debe ser una instancia de un modelo compatible con SQLAlchemy.
+            usage (list, opcional): Filas `UsrUsage` de las llamadas al LLM, que se guardan en la misma
+                        transacción.
 
         Excepciones:
             Exception: Lanza cualquier excepción encontrada durante la operación de guardar, 
@@ -45,8 +106,10 @@ class PostgresOrm:
         session = self.Session()
         try:
             session.add(data_model)
+            if usage:
+                self.save_usage(session, usage)
             session.commit()
-            logger.info(f"ID de la sesión: '{data_model.id}'. Sesión guardada exitosamente en {round(time.time() - start_time, 2)} segundos.")
+            logger.info("ID de la sesión: '%s'. Sesión guardada exitosamente en %.2f segundos.", data_model.id, time.time() - start_time)
         except Exception as e:
             logger.error("Error al intentar guardar la sesión: %s", e)
             session.rollback()
@@ -54,9 +117,121 @@ class PostgresOrm:
         finally:
             session.close()
 
-    def get_last_message_dict(self) -> dict:
+    def save_all(self, data_models: list, usage: list = None) -> None:
+        """
+        Guarda varios modelos de datos en la base de datos en una única transacción.
+
+        Parámetros:
+            data_models (list): Los modelos de datos a guardar. Deben ser instancias de modelos compatibles con SQLAlchemy.
+            usage (list, opcional): Filas `UsrUsage` de las llamadas al LLM (ver `save`).
+
+        Excepciones:
+            Exception: Lanza cualquier excepción encontrada durante la operación de guardar, 
+                    después de revertir la transacción.
+        """
+        start_time = time.time()
+        session = self.Session()
+        try:
+            session.add_all(data_models)
+            if usage:
+                self.save_usage(session, usage)
+            session.commit()
+            logger.info("%s registros guardados exitosamente en %.2f segundos.", len(data_models), time.time() - start_time)
+        except Exception as e:
+            logger.error("Error al intentar guardar los registros: %s", e)
+            session.rollback()
+            raise e
+        finally:
+            session.close()
+
+    @staticmethod
+    def save_usage(session, usage: list) -> None:
+        """
+        Agrega las filas de uso a la sesión de SQLAlchemy 'session'. No confirma la transacción.
+        Los totales por hora y por día se recalculan aparte (ver `refresh_usage_rollups`), así las
+        transacciones de las interacciones no compiten por las mismas filas de totales.
+        """
+        session.add_all(usage)
+
+    def refresh_usage_rollups(self, since) -> int:
+        """
+        Recalcula los totales de 'usage_hourly' desde la hora de 'since' y los de 'usage_daily' desde su día,
+        agrupando las filas de 'usage' (INSERT ... SELECT ... ON CONFLICT DO UPDATE). Los totales diarios se
+        calculan a partir de los horarios. Reemplaza los valores en lugar de sumarlos, así que se puede ejecutar
+        cualquier cantidad de veces. Un advisory lock evita que dos procesos lo ejecuten a la vez.
+
+        Parámetros:
+            since (datetime): Fecha en UTC (sin zona horaria) desde la que se recalculan los totales.
+
+        Retorno:
+            int: La cantidad de filas de totales por hora actualizadas, o -1 si otro proceso las estaba recalculando.
+        """
+        from sqlalchemy import text
+        start_time = time.time()
+        columns = ", ".join(ROLLUP_COLUMNS)
+        updates = ", ".join(f"{name} = excluded.{name}" for name in ROLLUP_COLUMNS)
+        with self.engine.begin() as connection:
+            if not connection.execute(text("SELECT pg_try_advisory_xact_lock(:key)"), {"key": USAGE_ROLLUP_LOCK}).scalar():
+                return -1
+            hourly = connection.execute(text(
+                f"INSERT INTO usage_hourly (bucket, model, prompt_name, {columns}) "
+                "SELECT date_trunc('hour', ts), model, prompt_name, count(*), sum(prompt_tokens), sum(completion_tokens), "
+                "sum(total_tokens), sum(cached_tokens), sum(latency_ms), max(latency_ms) "
+                "FROM usage WHERE ts >= date_trunc('hour', CAST(:since AS timestamp)) GROUP BY 1, 2, 3 "
+                f"ON CONFLICT (bucket, model, prompt_name) DO UPDATE SET {updates}"
+            ), {"since": since}).rowcount
+            connection.execute(text(
+                f"INSERT INTO usage_daily (bucket, model, prompt_name, {columns}) "
+                "SELECT date_trunc('day', bucket), model, prompt_name, sum(calls), sum(prompt_tokens), sum(completion_tokens), "
+                "sum(total_tokens), sum(cached_tokens), sum(latency_ms_sum), max(latency_ms_max) "
+                "FROM usage_hourly WHERE bucket >= date_trunc('day', CAST(:since AS timestamp)) GROUP BY 1, 2, 3 "
+                f"ON CONFLICT (bucket, model, prompt_name) DO UPDATE SET {updates}"
+            ), {"since": since})
+        logger.debug("Totales de uso recalculados desde %s (%s filas por hora) en %.2f segundos.", since, hourly, time.time() - start_time)
+        return hourly
+
+    def get_usage(self, granularity: str = "hour", start=None, end=None, model: str = None, prompt_name: str = None) -> list:
+        """
+        Recupera los totales de uso por intervalo de las tablas 'usage_hourly' o 'usage_daily'
+        (sin leer los mensajes ni las llamadas individuales).
+
+        Parámetros:
+            granularity (str): 'hour' o 'day'.
+            start (datetime, opcional): Solo intervalos que empiezan en o después de esta fecha (UTC).
+            end (datetime, opcional): Solo intervalos que empiezan antes de esta fecha (UTC).
+            model (str, opcional): Solo este modelo.
+            prompt_name (str, opcional): Solo este prompt.
+
+        Retorno:
+            list: Una lista de diccionarios ordenada por intervalo, modelo y prompt.
+        """
+        from sqlalchemy import select
+        from db.orm.orm_models import UsageHourly, UsageDaily
+        table = UsageDaily if granularity == "day" else UsageHourly
+        conditions = []
+        if start is not None:
+            conditions.append(table.bucket >= start)
+        if end is not None:
+            conditions.append(table.bucket < end)
+        if model is not None:
+            conditions.append(table.model == model)
+        if prompt_name is not None:
+            conditions.append(table.prompt_name == prompt_name)
+        session = self.Session()
+        try:
+            result = session.execute(
+                select(table)
+                .where(*conditions)
+                .order_by(table.bucket, table.model, table.prompt_name)
+            )
+            return [row.to_dict() for row in result.scalars()]
+        finally:
+            session.close()
+
+    def get_last_message_dict(self, session_id=None) -> dict:
         """
-        Recupera el último mensaje almacenado en la tabla 'messages'.
+        Recupera el último mensaje almacenado en la tabla 'messages' para la sesión 'session_id'
+        (o de todas las sesiones, si no se indica).
 
         Esta función consulta la base de datos para obtener el último mensaje registrado 
         en la tabla `UsrMessages`, ordenado de forma descendente por el campo `ts` (timestamp). 
@@ -73,12 +248,17 @@ class PostgresOrm:
             - Info: Registra el ID de la sesión del último mensaje y el tiempo que tomó recuperar el mensaje.
             - Error: Registra cualquier error que ocurra durante la consulta.
         """
+        from sqlalchemy import select
+        from db.orm.orm_models import UsrMessages
         start_time = time.time()
-        session = db_engine.Session()
+        session = self.Session()
         try:
             # Consulta para obtener la última fila de la tabla messages ordenada por timestamp
+            query = select(UsrMessages)
+            if session_id is not None:
+                query = query.where(UsrMessages.session_id == session_id)
             result = session.execute(
-                select(UsrMessages)
+                query
                 .order_by(UsrMessages.ts.desc())  # Ordenar de forma descendente por ts (timestamp)
                 .limit(1)  # Limitar a una sola fila
             )
@@ -87,7 +267,7 @@ class PostgresOrm:
             # Si existe un resultado, convertirlo a diccionario usando el método to_dict()
             if last_message:
                 last_message_dict = last_message.to_dict() 
-                logger.info(f"[orm][get_last_message_dict] ID de la sesión: '{last_message_dict["session_id"]}'. Último mensaje recuperado exitosamente en {round(time.time() - start_time, 2)} seconds.")
+                logger.info("[orm][get_last_message_dict] ID de la sesión: '%s'. Último mensaje recuperado exitosamente en %.2f seconds.", last_message_dict["session_id"], time.time() - start_time)
                 return last_message_dict   
             else:
                 return {}  # Si no hay resultados, retornar un diccionario vacío
@@ -98,6 +278,28 @@ class PostgresOrm:
         finally:
             session.close()
 
+    def get_session_info(self, session_id) -> dict:
+        """
+        Recupera el corpus elegido al crear la sesión 'session_id' y el cliente de la API que la creó.
+
+        Retorno:
+            dict: {"corpus": ..., "client": ...}. Los valores son None si la sesión no existe, no los tiene
+                guardados (sesiones anteriores al registro de corpus o a los clientes de la API) u ocurrió un error.
+        """
+        from sqlalchemy import select
+        from db.orm.orm_models import UsrSession
+        session = self.Session()
+        try:
+            row = session.execute(
+                select(UsrSession.corpus, UsrSession.client).where(UsrSession.id == session_id)
+            ).one_or_none()
+            return {"corpus": row.corpus, "client": row.client} if row else {"corpus": None, "client": None}
+        except Exception as e:
+            logger.error("[orm][get_session_info] Error al intentar recuperar los datos de la sesión: %s", e)
+            return {"corpus": None, "client": None}
+        finally:
+            session.close()
+
     def retrieve_history(self, session_id, model) -> list:
         """
         Recupera el historial de mensajes para una sesión específica.
@@ -121,6 +323,7 @@ class PostgresOrm:
             - Info: Registra el ID de la sesión y el tiempo que tomó recuperar el historial de mensajes.
             - Error: Registra cualquier error que ocurra durante la operación de recuperación.
         """
+        from sqlalchemy import select, and_
         start_time = time.time()
         session = self.Session()
         try:
@@ -134,7 +337,7 @@ class PostgresOrm:
             )
             
             previous_history = [row[0].to_dict() for row in result.fetchall()]
-            logger.info(f"[orm][retrieve_history] ID de la sesión: '{session_id}'. Historial de mensajes recuperado exitosamente en {round(time.time() - start_time, 2)} segundos.")
+            logger.info("[orm][retrieve_history] ID de la sesión: '%s'. Historial de mensajes recuperado exitosamente en %.2f segundos.", session_id, time.time() - start_time)
         except Exception as e:
             logger.error("[orm][retrieve_history] Error al intentar recuperar el historial de mensajes: %s", e)
             previous_history = []
@@ -153,8 +356,8 @@ class PostgresOrm:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self._session.close()
 
-# static instance for common usages
-db_engine = PostgresOrm()
+# static instance for common usages (las tablas se crean al iniciar la aplicación, ver utils.startup)
+db_engine = PostgresOrm(create_tables=False)
 
 if __name__ == "__main__":
     # Inicializa la base de datos
@@ -1,10 +1,10 @@
 import os
 from dotenv import load_dotenv
 import uuid
-from sqlalchemy import Column, DateTime, ForeignKey, String, BigInteger
+from sqlalchemy import Column, DateTime, ForeignKey, String, BigInteger, Integer, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import declarative_base, relationship
-from sqlalchemy.dialects.postgresql import UUID, JSON
+from sqlalchemy.dialects.postgresql import UUID, JSONB
 
 load_dotenv()
 API_VERSION = os.getenv('API_VERSION')
@@ -18,29 +18,46 @@ class UsrSession(Base):
     id = Column(UUID, primary_key=True)
     ts = Column(DateTime, default=func.now(), nullable=False)
     api_version = Column(String, nullable=True)
+    corpus = Column(String, nullable=True)
+    # Cliente de la API que creó la sesión (ver `utils.security`); solo ese cliente puede continuarla
+    client = Column(String, nullable=True)
     
     messages = relationship("UsrMessages", back_populates="sessions")
 
-    def __init__(self, id=None):
+    def __init__(self, id=None, corpus=None, client=None):
         if id:
             self.id = id
             self.api_version = API_VERSION
         else:
             self.id = str(uuid.uuid4())
             self.api_version = API_VERSION
+        self.corpus = corpus
+        self.client = client
 
 class UsrMessages(Base):
+    """
+    Tabla particionada por rango de 'ts' (un mes por partición, ver `db.orm.partitions`). La clave primaria
+    incluye 'ts' porque PostgreSQL exige que contenga la columna de partición.
+    """
     __tablename__ = "messages"
+    __table_args__ = (
+        Index("ix_messages_session_id_id", "session_id", "id"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
 
     id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
     session_id = Column(UUID, ForeignKey('sessions.id'), nullable=False)
-    ts = Column(DateTime, default=func.now(), nullable=False)
+    ts = Column(DateTime, default=func.now(), primary_key=True, nullable=False)
     user_name = Column(String, nullable=True)
     user_message = Column(String, nullable=False)
     answer = Column(String, nullable=False)
     language = Column(String, nullable=True)
-    tokens_used = Column(JSON, nullable=False)
-    state = Column(JSON, nullable=False)
+    tokens_used = Column(JSONB, nullable=False)
+    state = Column(JSONB, nullable=False)
+    latency_ms = Column(Integer, nullable=True)
+    prompt_tokens = Column(Integer, nullable=True)
+    completion_tokens = Column(Integer, nullable=True)
+    total_tokens = Column(Integer, nullable=True)
 
 
     sessions = relationship("UsrSession", back_populates="messages")
@@ -56,4 +73,62 @@ class UsrMessages(Base):
             "language": self.language,
             "tokens_used": self.tokens_used,
             "state": self.state,
-        }
\ No newline at end of file
+            "latency_ms": self.latency_ms,
+        }
+
+
+class UsrUsage(Base):
+    """
+    Una fila por llamada al LLM, con su latencia y sus tokens. No tiene clave foránea a 'messages' para
+    poder insertarse en bloque junto con los mensajes.
+    """
+    __tablename__ = "usage"
+
+    id = Column(BigInteger, primary_key=True, autoincrement=True, nullable=False)
+    session_id = Column(UUID, nullable=False, index=True)
+    ts = Column(DateTime, nullable=False, index=True)
+    model = Column(String, nullable=False)
+    prompt_name = Column(String, nullable=False)
+    latency_ms = Column(Integer, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    total_tokens = Column(Integer, nullable=False)
+    # Tokens del prompt que el proveedor leyó de su caché de prefijos (incluidos en 'prompt_tokens')
+    cached_tokens = Column(Integer, nullable=False, default=0, server_default="0")
+
+
+class _UsageRollup:
+    # Totales por intervalo (en UTC), modelo y prompt, recalculados periódicamente (ver `PostgresOrm.refresh_usage_rollups`)
+    bucket = Column(DateTime, primary_key=True)
+    model = Column(String, primary_key=True)
+    prompt_name = Column(String, primary_key=True)
+    calls = Column(BigInteger, nullable=False, default=0)
+    prompt_tokens = Column(BigInteger, nullable=False, default=0)
+    completion_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    cached_tokens = Column(BigInteger, nullable=False, default=0, server_default="0")
+    latency_ms_sum = Column(BigInteger, nullable=False, default=0)
+    latency_ms_max = Column(Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            "bucket": self.bucket,
+            "model": self.model,
+            "prompt_name": self.prompt_name,
+            "calls": self.calls,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cached_tokens": self.cached_tokens,
+            "cache_hit_ratio": round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0,
+            "latency_ms_avg": round(self.latency_ms_sum / self.calls, 1) if self.calls else None,
+            "latency_ms_max": self.latency_ms_max,
+        }
+
+
+class UsageHourly(_UsageRollup, Base):
+    __tablename__ = "usage_hourly"
+
+
+class UsageDaily(_UsageRollup, Base):
+    __tablename__ = "usage_daily"
\ No newline at end of file
@@ -0,0 +1,249 @@
+import os
+from dotenv import load_dotenv
+import gzip
+import json
+import time
+from datetime import date, datetime
+from sqlalchemy import text
+from db.orm.orm import db_engine
+from utils.logger import logger
+
+load_dotenv()
+# Cantidad de particiones mensuales que se crean por adelantado
+MESSAGES_PARTITIONS_AHEAD = int(os.getenv('MESSAGES_PARTITIONS_AHEAD', '2'))
+# Meses que se conservan en la base de datos; los anteriores se archivan (0 desactiva el archivado)
+MESSAGES_RETENTION_MONTHS = int(os.getenv('MESSAGES_RETENTION_MONTHS', '0'))
+MESSAGES_ARCHIVE_DIR = os.getenv('MESSAGES_ARCHIVE_DIR', 'db/archive')
+ARCHIVE_BATCH_SIZE = int(os.getenv('ARCHIVE_BATCH_SIZE', '5000'))
+# Clave del advisory lock con el que un solo proceso ejecuta el mantenimiento a la vez
+PARTITIONS_LOCK = 7_562_002
+
+"""
+Mantenimiento de las particiones mensuales de la tabla 'messages'.
+
+La tabla está particionada por rango de 'ts' con una partición por mes ('messages_yAAAAmMM') y una partición
+por defecto ('messages_default') que recibe las filas fuera de los rangos creados. El mantenimiento:
+    - crea por adelantado las particiones de los próximos 'MESSAGES_PARTITIONS_AHEAD' meses, y las de los meses
+      que tengan filas en la partición por defecto (moviendo esas filas a la partición nueva), y
+    - si 'MESSAGES_RETENTION_MONTHS' es mayor a 0, archiva las particiones más viejas en archivos NDJSON
+      comprimidos con gzip en 'MESSAGES_ARCHIVE_DIR' y después las elimina.
+
+Las bases creadas antes del particionado tienen una tabla 'messages' común; `migrate` la convierte.
+
+La aplicación ejecuta el mantenimiento en segundo plano cada 'MESSAGES_MAINTENANCE_INTERVAL' segundos (ver
+`db.orm.maintenance`); también se puede ejecutar a mano o desde un cron (desde back/app):
+    python -m db.orm.partitions maintain
+    python -m db.orm.partitions migrate
+"""
+
+TABLE = "messages"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+
+def _add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def is_partitioned(connection) -> bool:
+    return connection.execute(
+        text("SELECT c.relkind = 'p' FROM pg_class c WHERE c.oid = to_regclass(:table)"),
+        {"table": TABLE}
+    ).scalar() is True
+
+
+def list_partitions(connection) -> list:
+    """
+    Devuelve las particiones mensuales como (nombre, primer día del mes), de la más vieja a la más nueva.
+    """
+    rows = connection.execute(text(
+        "SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = to_regclass(:table)"
+    ), {"table": TABLE}).scalars()
+    partitions = []
+    for name in rows:
+        if name == DEFAULT_PARTITION:
+            continue
+        year, month = name[len(TABLE) + 2:].split("m")
+        partitions.append((name, date(int(year), int(month), 1)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def _create_partition(connection, month: date) -> None:
+    """
+    Crea la partición del mes 'month'. PostgreSQL no permite crearla si la partición por defecto tiene filas de
+    ese mes; en ese caso la separa, crea la partición, le pasa esas filas y la vuelve a agregar, todo en la
+    transacción de 'connection'.
+    """
+    from db.orm.orm_models import UsrMessages
+    name = partition_name(month)
+    bounds = {"start": month, "end": _add_months(month, 1)}
+    create = (f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {TABLE} "
+              f"FOR VALUES FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')")
+    pending = connection.execute(text(
+        f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end)"
+    ), bounds).scalar()
+    if not pending:
+        connection.execute(text(create))
+        return
+    columns = ", ".join(column.name for column in UsrMessages.__table__.columns)
+    connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {DEFAULT_PARTITION}"))
+    connection.execute(text(create))
+    count = connection.execute(text(
+        f"INSERT INTO {name} ({columns}) SELECT {columns} FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end"
+    ), bounds).rowcount
+    connection.execute(text(f"DELETE FROM {DEFAULT_PARTITION} WHERE ts >= :start AND ts < :end"), bounds)
+    connection.execute(text(f"ALTER TABLE {TABLE} ATTACH PARTITION {DEFAULT_PARTITION} DEFAULT"))
+    logger.warning("Se movieron %s filas de '%s' a la partición nueva '%s'.", count, DEFAULT_PARTITION, name)
+
+
+def ensure_partitions(months_ahead: int = MESSAGES_PARTITIONS_AHEAD, since: date = None) -> list:
+    """
+    Crea (si no existen) la partición por defecto y las mensuales desde 'since' (por defecto, el mes actual)
+    hasta 'months_ahead' meses después, además de las de los meses con filas en la partición por defecto
+    (ver `_create_partition`). No hace nada si 'messages' no está particionada.
+
+    Retorno:
+        list: Los nombres de las particiones creadas.
+    """
+    created = []
+    first = (since or date.today()).replace(day=1)
+    with db_engine.engine.begin() as connection:
+        if not is_partitioned(connection):
+            logger.warning("La tabla '%s' no está particionada; ejecutar 'python -m db.orm.partitions migrate'.", TABLE)
+            return created
+        existing = {name for name, _ in list_partitions(connection)}
+        connection.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {TABLE} DEFAULT"))
+        months = set()
+        month = first
+        while month <= _add_months(date.today().replace(day=1), months_ahead):
+            months.add(month)
+            month = _add_months(month, 1)
+        months.update(day.date() for day in connection.execute(text(
+            f"SELECT DISTINCT date_trunc('month', ts) FROM {DEFAULT_PARTITION}"
+        )).scalars())
+        for month in sorted(months):
+            name = partition_name(month)
+            if name not in existing:
+                _create_partition(connection, month)
+                created.append(name)
+    if created:
+        logger.info("Particiones creadas: %s.", ", ".join(created))
+    return created
+
+
+def archive_partition(name: str, archive_dir: str = MESSAGES_ARCHIVE_DIR) -> str:
+    """
+    Escribe todas las filas de la partición 'name' en '<archive_dir>/<name>.ndjson.gz' (leyéndolas con un
+    cursor del lado del servidor) y después la separa de 'messages' y la elimina.
+
+    El archivo se escribe con un nombre temporal y se renombra recién al terminar; la partición se elimina
+    solo después, así que un error en el medio no pierde datos y el archivado se puede volver a ejecutar.
+
+    Retorno:
+        str: La ruta del archivo generado.
+    """
+    start_time = time.time()
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.ndjson.gz")
+    count = 0
+    with db_engine.engine.connect() as connection:
+        result = connection.execution_options(stream_results=True, yield_per=ARCHIVE_BATCH_SIZE).execute(
+            text(f"SELECT * FROM {name} ORDER BY ts, id")
+        )
+        with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+            for row in result.mappings():
+                f.write(json.dumps(dict(row), ensure_ascii=False, default=str) + "\n")
+                count += 1
+    os.replace(path + ".tmp", path)
+    with db_engine.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {TABLE} DETACH PARTITION {name}"))
+        connection.execute(text(f"DROP TABLE {name}"))
+    logger.info("Partición '%s' archivada en '%s' (%s filas) en %.2f segundos.", name, path, count, time.time() - start_time)
+    return path
+
+
+def archive_old_partitions(retention_months: int = MESSAGES_RETENTION_MONTHS, archive_dir: str = MESSAGES_ARCHIVE_DIR) -> list:
+    """
+    Archiva las particiones cuyos meses terminaron hace más de 'retention_months' meses.
+
+    Retorno:
+        list: Las rutas de los archivos generados.
+    """
+    if retention_months <= 0:
+        return []
+    cutoff = _add_months(date.today().replace(day=1), -retention_months)
+    with db_engine.engine.connect() as connection:
+        old = [name for name, month in list_partitions(connection) if _add_months(month, 1) <= cutoff]
+    return [archive_partition(name, archive_dir) for name in old]
+
+
+def maintain(retention_months: int = MESSAGES_RETENTION_MONTHS, archive_dir: str = MESSAGES_ARCHIVE_DIR) -> bool:
+    """
+    Crea las particiones de los próximos meses y archiva las que superan la retención. Un advisory lock evita
+    que dos procesos lo ejecuten a la vez.
+
+    Retorno:
+        bool: False si otro proceso estaba ejecutando el mantenimiento.
+    """
+    with db_engine.engine.connect() as lock:
+        if not lock.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": PARTITIONS_LOCK}).scalar():
+            return False
+        lock.commit()
+        try:
+            ensure_partitions()
+            archive_old_partitions(retention_months, archive_dir)
+        finally:
+            lock.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": PARTITIONS_LOCK})
+            lock.commit()
+    return True
+
+
+def migrate() -> None:
+    """
+    Convierte una tabla 'messages' sin particionar: la renombra a 'messages_legacy', crea la tabla
+    particionada con sus particiones (desde el mes del mensaje más viejo), copia las filas y ajusta la
+    secuencia de 'id'. La tabla 'messages_legacy' se conserva para poder verificar la copia y eliminarla a mano.
+    """
+    from db.orm.orm_models import UsrMessages
+    start_time = time.time()
+    with db_engine.engine.begin() as connection:
+        if is_partitioned(connection):
+            logger.info("La tabla '%s' ya está particionada.", TABLE)
+            return
+        connection.execute(text(f"ALTER TABLE {TABLE} RENAME TO {TABLE}_legacy"))
+        # El índice conserva su nombre al renombrar la tabla; se renombra para poder crear el de la tabla nueva
+        connection.execute(text("ALTER INDEX IF EXISTS ix_messages_session_id_id RENAME TO ix_messages_legacy_session_id_id"))
+        # Lo mismo con la clave primaria y la secuencia de 'id', cuyos nombres son los de la tabla original
+        connection.execute(text(f"ALTER TABLE {TABLE}_legacy RENAME CONSTRAINT {TABLE}_pkey TO {TABLE}_legacy_pkey"))
+        connection.execute(text(f"ALTER SEQUENCE IF EXISTS {TABLE}_id_seq RENAME TO {TABLE}_legacy_id_seq"))
+        UsrMessages.__table__.create(connection)
+        oldest = connection.execute(text(f"SELECT min(ts) FROM {TABLE}_legacy")).scalar()
+    ensure_partitions(since=oldest.date() if isinstance(oldest, datetime) else None)
+    columns = ", ".join(column.name for column in UsrMessages.__table__.columns)
+    with db_engine.engine.begin() as connection:
+        count = connection.execute(text(f"INSERT INTO {TABLE} ({columns}) SELECT {columns} FROM {TABLE}_legacy")).rowcount
+        connection.execute(text(
+            f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {TABLE}), false)"
+        ))
+    logger.info("Tabla '%s' particionada (%s filas copiadas) en %.2f segundos. La tabla original quedó como '%s_legacy'.",
+                TABLE, count, time.time() - start_time, TABLE)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Mantenimiento de las particiones de la tabla 'messages'.")
+    parser.add_argument("command", choices=("maintain", "migrate", "archive"))
+    parser.add_argument("--retention-months", type=int, default=MESSAGES_RETENTION_MONTHS)
+    parser.add_argument("--archive-dir", default=MESSAGES_ARCHIVE_DIR)
+    args = parser.parse_args()
+    if args.command == "migrate":
+        migrate()
+    elif args.command == "archive":
+        archive_old_partitions(args.retention_months, args.archive_dir)
+    else:
+        maintain(args.retention_months, args.archive_dir)
@@ -0,0 +1,174 @@
+import os
+from dotenv import load_dotenv
+import queue
+import threading
+import time
+from typing import Optional
+from db.orm.orm import db_engine
+from utils.limiter import Overloaded
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.session_cache import session_cache
+
+load_dotenv()
+# Registros que se guardan juntos como mucho, y espera máxima para juntar un bloque
+WRITER_BATCH_SIZE = int(os.getenv('WRITER_BATCH_SIZE', '200'))
+WRITER_FLUSH_INTERVAL = float(os.getenv('WRITER_FLUSH_INTERVAL', '0.2'))
+WRITER_MAX_PENDING = int(os.getenv('WRITER_MAX_PENDING', '10000'))
+# Reintentos de un bloque que no se pudo guardar, con espera exponencial desde 'WRITER_RETRY_BACKOFF' segundos
+WRITER_MAX_RETRIES = int(os.getenv('WRITER_MAX_RETRIES', '3'))
+WRITER_RETRY_BACKOFF = float(os.getenv('WRITER_RETRY_BACKOFF', '0.5'))
+
+"""
+Escritura en segundo plano de las interacciones.
+
+Las conexiones WebSocket (ver `api.websocket`) no esperan a la base de datos para responder: encolan las
+filas de la interacción (la sesión nueva, si corresponde, el registro de 'messages' y las filas de 'usage')
+y un hilo las guarda en bloques con `save_all`, en el orden en que llegaron. Después de guardar cada bloque
+actualiza la caché de sesiones, igual que `api.chat._answer` después de cada escritura.
+
+Si un bloque no se puede guardar, se reintenta 'WRITER_MAX_RETRIES' veces con espera exponencial y después se
+guarda cada interacción por separado (cada una con su sesión nueva antes que su mensaje), así un registro con
+error no impide guardar los demás del bloque. Las interacciones que tampoco se pueden guardar así se descartan y
+se cuentan en la métrica 'message_writer.dropped'.
+
+Si la cola está llena, el hilo que encola espera a que haya lugar como mucho el tiempo que le queda a la
+interacción: así la base de datos frena a las conexiones en lugar de acumular memoria, y las interacciones se
+siguen guardando en orden. Si el lugar no se libera a tiempo, `put` lanza `Overloaded`.
+"""
+
+
+class MessageWriter:
+    """
+    Cola acotada y un hilo que la vacía. El hilo se crea con la primera escritura, así cada proceso
+    (por ejemplo, cada worker de gunicorn después del fork) tiene el suyo.
+    """
+    def __init__(self, batch_size: int = WRITER_BATCH_SIZE, flush_interval: float = WRITER_FLUSH_INTERVAL,
+                 max_pending: int = WRITER_MAX_PENDING, max_retries: int = WRITER_MAX_RETRIES,
+                 retry_backoff: float = WRITER_RETRY_BACKOFF):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._pid = None
+
+    def _ensure_started(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive() or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                self._thread.start()
+
+    def put(self, rows: list, usage: list = None, session_id: str = None, message: dict = None,
+            timeout: float = None) -> None:
+        """
+        Encola las filas de una interacción. Con 'session_id' y 'message' se actualiza la caché de sesiones
+        una vez guardadas. Si la cola está llena espera como mucho 'timeout' segundos (sin límite si es None).
+
+        Excepciones:
+            Overloaded: Si la cola sigue llena después de 'timeout' segundos.
+        """
+        item = (rows, usage or [], session_id, message)
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            metrics.incr("message_writer.blocked")
+            logger.warning("La cola de escritura está llena, la interacción de '%s' espera lugar.", session_id)
+            try:
+                self._queue.put(item, timeout=None if timeout is None else max(0.0, timeout))
+            except queue.Full:
+                metrics.incr("message_writer.rejected")
+                raise Overloaded("Servicio saturado (message_writer).")
+        metrics.set_gauge("message_writer.pending", self._queue.qsize())
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            items = [item]
+            deadline = time.monotonic() + self.flush_interval
+            stop = False
+            while sum(len(rows) for rows, *_ in items) < self.batch_size:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                items.append(item)
+            self._write(items)
+            metrics.set_gauge("message_writer.pending", self._queue.qsize())
+            if stop:
+                return
+
+    def _write(self, items: list) -> None:
+        rows = [row for item in items for row in item[0]]
+        usage = [row for item in items for row in item[1]]
+        start = time.monotonic()
+        for attempt in range(self.max_retries + 1):
+            try:
+                db_engine.save_all(rows, usage=usage)
+                break
+            except Exception as e:
+                metrics.incr("message_writer.error")
+                logger.warning("No se pudieron guardar %s interacciones en segundo plano (intento %s): %s",
+                               len(items), attempt + 1, e)
+                if attempt < self.max_retries:
+                    time.sleep(self.retry_backoff * 2 ** attempt)
+        else:
+            self._write_each(items)
+            return
+        metrics.observe("message_writer.flush_seconds", time.monotonic() - start)
+        metrics.incr("message_writer.written", len(items))
+        for _, _, session_id, message in items:
+            if session_id:
+                session_cache.update(session_id, message)
+
+    def _write_each(self, items: list) -> None:
+        """
+        Guarda las interacciones de un bloque una por una, en orden, y descarta las que no se pueden guardar.
+        """
+        for rows, usage, session_id, message in items:
+            try:
+                db_engine.save_all(rows, usage=usage)
+            except Exception as e:
+                metrics.incr("message_writer.dropped")
+                logger.error("Se descartó una interacción de '%s' que no se pudo guardar: %s", session_id, e)
+                continue
+            metrics.incr("message_writer.written")
+            if session_id:
+                session_cache.update(session_id, message)
+
+    def close(self, timeout: float = 5) -> None:
+        """
+        Guarda lo que quede en la cola y detiene el hilo (al apagar la aplicación), esperando como mucho 'timeout'
+        segundos. Lo que no se llegue a guardar se descarta, se registra en el log y se cuenta en 'message_writer.dropped'.
+        """
+        with self._lock:
+            thread = self._thread
+        if thread is None or not thread.is_alive() or self._pid != os.getpid():
+            return
+        deadline = time.monotonic() + timeout
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            pending = self._queue.qsize()
+            metrics.incr("message_writer.dropped", pending)
+            logger.error("La cola de escritura sigue llena al apagar: se descartan %s interacciones.", pending)
+            return
+        thread.join(max(0.0, deadline - time.monotonic()))
+        if thread.is_alive():
+            # Si la cola no está vacía, el último elemento es la marca de fin (None) y no cuenta
+            pending = max(0, self._queue.qsize() - 1)
+            metrics.incr("message_writer.dropped", pending)
+            logger.error("El hilo de escritura no terminó a tiempo al apagar: se descartan %s interacciones.", pending)
+
+
+# static instance for common usages
+message_writer = MessageWriter()
@@ -0,0 +1,202 @@
+import os
+from dotenv import load_dotenv
+import json
+import mmap
+import struct
+import time
+from typing import Iterable, Optional
+from utils.logger import logger
+
+load_dotenv()
+PATH_DB = os.getenv('PATH_DB')
+
+"""
+Docstore compacto y mapeado en memoria para la base de datos vectorial.
+
+Reemplaza el 'index.pkl' que escribe `FAISS.save_local` (un pickle con todo el docstore y el mapeo de ids)
+por tres archivos que se leen con mmap, sin deserializar nada al cargarlos:
+
+    - docstore.text: los textos de todos los fragmentos, en UTF-8, uno detrás de otro.
+    - docstore.meta: los metadatos de cada fragmento en JSON (UTF-8), uno detrás de otro.
+    - docstore.offsets: (n + 1) pares de enteros uint64 little-endian con el inicio del texto y de los
+      metadatos de cada fragmento; el par 'i + 1' marca el final del fragmento 'i'.
+
+El id de cada fragmento es su posición en el índice FAISS ('index.faiss'), así que no hace falta guardar
+un mapeo aparte. Un manifiesto ('docstore.json') guarda la versión del formato y la cantidad de fragmentos.
+
+Como las páginas mapeadas pertenecen al caché de páginas del sistema operativo, todos los workers comparten
+la misma copia y solo se leen del disco los fragmentos que se consultan.
+
+Uso (desde back/app), para convertir un índice creado con `FAISS.save_local`:
+    python -m db.vdb.docstore --path-db db/vdb/data [--remove-pickle]
+"""
+
+FORMAT_VERSION = 1
+MANIFEST = "docstore.json"
+TEXT_FILE = "docstore.text"
+META_FILE = "docstore.meta"
+OFFSETS_FILE = "docstore.offsets"
+INDEX_FILE = "index.faiss"
+PICKLE_FILE = "index.pkl"
+_OFFSET = struct.Struct("<2Q")
+
+
+def _map(path: str) -> Optional[mmap.mmap]:
+    # mmap no admite archivos vacíos (por ejemplo, si ningún fragmento tiene metadatos)
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class MmapDocstore:
+    """
+    Acceso de solo lectura a los fragmentos guardados con `write_docstore`. Cada fragmento se decodifica
+    recién al pedirlo por su id.
+    """
+    def __init__(self, path_db: str):
+        with open(os.path.join(path_db, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        if manifest.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Versión de docstore no soportada en '{path_db}': {manifest.get('version')}.")
+        self.count = manifest["count"]
+        self._text = _map(os.path.join(path_db, TEXT_FILE))
+        self._meta = _map(os.path.join(path_db, META_FILE))
+        self._offsets = _map(os.path.join(path_db, OFFSETS_FILE))
+        if self._offsets is None or len(self._offsets) != (self.count + 1) * _OFFSET.size:
+            raise ValueError(f"El archivo de offsets de '{path_db}' no coincide con el manifiesto.")
+
+    def __len__(self) -> int:
+        return self.count
+
+    def _bounds(self, i: int) -> tuple[int, int, int, int]:
+        if not 0 <= i < self.count:
+            raise IndexError(f"Fragmento {i} fuera de rango (0..{self.count - 1}).")
+        text_start, meta_start = _OFFSET.unpack_from(self._offsets, i * _OFFSET.size)
+        text_end, meta_end = _OFFSET.unpack_from(self._offsets, (i + 1) * _OFFSET.size)
+        return text_start, text_end, meta_start, meta_end
+
+    def text(self, i: int) -> str:
+        text_start, text_end, _, _ = self._bounds(i)
+        return self._text[text_start:text_end].decode("utf-8") if self._text is not None else ""
+
+    def metadata(self, i: int) -> dict:
+        _, _, meta_start, meta_end = self._bounds(i)
+        if self._meta is None or meta_start == meta_end:
+            return {}
+        return json.loads(self._meta[meta_start:meta_end])
+
+    def close(self) -> None:
+        for mapped in (self._text, self._meta, self._offsets):
+            if mapped is not None:
+                mapped.close()
+
+
+def write_docstore(path_db: str, texts: Iterable[str], metadatas: Optional[Iterable[dict]] = None) -> int:
+    """
+    Escribe los fragmentos en el formato de `MmapDocstore`, en el orden de sus ids en el índice FAISS.
+
+    Los archivos se escriben con un sufijo temporal y se renombran al final, de modo que un proceso que
+    esté leyendo el docstore anterior nunca ve archivos a medio escribir. El manifiesto se renombra último.
+
+    Returns:
+        int: La cantidad de fragmentos escritos.
+    """
+    os.makedirs(path_db, exist_ok=True)
+    metadatas = iter(metadatas) if metadatas is not None else None
+    paths = {name: os.path.join(path_db, name) for name in (TEXT_FILE, META_FILE, OFFSETS_FILE, MANIFEST)}
+    count, text_pos, meta_pos = 0, 0, 0
+    with open(paths[TEXT_FILE] + ".tmp", "wb") as text_file, \
+         open(paths[META_FILE] + ".tmp", "wb") as meta_file, \
+         open(paths[OFFSETS_FILE] + ".tmp", "wb") as offsets_file:
+        for text in texts:
+            offsets_file.write(_OFFSET.pack(text_pos, meta_pos))
+            data = text.encode("utf-8")
+            text_file.write(data)
+            text_pos += len(data)
+            metadata = next(metadatas, None) if metadatas is not None else None
+            if metadata:
+                data = json.dumps(metadata, ensure_ascii=False, default=str).encode("utf-8")
+                meta_file.write(data)
+                meta_pos += len(data)
+            count += 1
+        offsets_file.write(_OFFSET.pack(text_pos, meta_pos))
+    with open(paths[MANIFEST] + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"version": FORMAT_VERSION, "count": count, "text_bytes": text_pos, "meta_bytes": meta_pos}, f)
+    for name in (TEXT_FILE, META_FILE, OFFSETS_FILE, MANIFEST):
+        os.replace(paths[name] + ".tmp", paths[name])
+    return count
+
+
+def docstore_exists(path_db: str) -> bool:
+    return all(os.path.exists(os.path.join(path_db, name)) for name in (INDEX_FILE, MANIFEST))
+
+
+def pickle_exists(path_db: str) -> bool:
+    return all(os.path.exists(os.path.join(path_db, name)) for name in (INDEX_FILE, PICKLE_FILE))
+
+
+def convert_pickle(path_db: str, remove_pickle: bool = False) -> int:
+    """
+    Convierte el 'index.pkl' de un índice creado con `FAISS.save_local` al formato de `MmapDocstore`.
+    El archivo 'index.faiss' no cambia: los fragmentos se escriben en el orden de sus posiciones en el índice.
+
+    Args:
+        path_db (str): Carpeta con 'index.faiss' e 'index.pkl'.
+        remove_pickle (bool): Si es True, borra 'index.pkl' después de convertirlo.
+
+    Returns:
+        int: La cantidad de fragmentos convertidos.
+    """
+    import pickle
+    start_time = time.time()
+    with open(os.path.join(path_db, PICKLE_FILE), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+    documents = [docstore.search(index_to_docstore_id[i]) for i in range(len(index_to_docstore_id))]
+    count = write_docstore(
+        path_db,
+        (doc.page_content for doc in documents),
+        (doc.metadata for doc in documents)
+    )
+    if remove_pickle:
+        os.remove(os.path.join(path_db, PICKLE_FILE))
+    logger.info("Docstore de '%s' convertido (%d fragmentos) en %.2f segundos.", path_db, count, time.time() - start_time)
+    return count
+
+
+class MmapVectorStore:
+    """
+    Índice FAISS junto con su `MmapDocstore`. Las búsquedas devuelven los textos de los fragmentos
+    más cercanos sin cargar el resto del docstore.
+    """
+    def __init__(self, index, docstore: MmapDocstore):
+        self.index = index
+        self.docstore = docstore
+        if index.ntotal != len(docstore):
+            raise ValueError(f"El índice tiene {index.ntotal} vectores y el docstore {len(docstore)} fragmentos.")
+
+    @classmethod
+    def load(cls, path_db: str) -> "MmapVectorStore":
+        import faiss
+        return cls(faiss.read_index(os.path.join(path_db, INDEX_FILE)), MmapDocstore(path_db))
+
+    def search_ids(self, embedding: list[float], k: int = 1) -> list[int]:
+        import numpy as np
+        vector = np.asarray([embedding], dtype=np.float32)
+        _, ids = self.index.search(vector, k)
+        return [int(i) for i in ids[0] if i != -1]
+
+    def similarity_search_by_vector(self, embedding: list[float], k: int = 1) -> list[str]:
+        return [self.docstore.text(i) for i in self.search_ids(embedding, k)]
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Convierte el 'index.pkl' de FAISS al docstore mapeado en memoria.")
+    parser.add_argument("--path-db", default=PATH_DB)
+    parser.add_argument("--remove-pickle", action="store_true")
+    args = parser.parse_args()
+    if not args.path_db:
+        logger.info("La variable de entorno PATH_DB no está definida y no se indicó '--path-db'.")
+    else:
+        convert_pickle(args.path_db, remove_pickle=args.remove_pickle)
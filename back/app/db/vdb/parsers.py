@@ -0,0 +1,394 @@
+import os
+from dotenv import load_dotenv
+import multiprocessing
+import re
+import unicodedata
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from html.parser import HTMLParser
+from typing import Iterator
+from xml.etree import ElementTree
+
+load_dotenv()
+# Procesos que parsean documentos a la vez ('1' parsea en el proceso actual)
+PARSE_WORKERS = int(os.getenv('PARSE_WORKERS', str(min(4, os.cpu_count() or 1))))
+# 'spawn' evita heredar los hilos del proceso que crea el índice (la inicialización corre en un hilo aparte)
+PARSE_START_METHOD = os.getenv('PARSE_START_METHOD', 'spawn')
+
+"""
+Parseo de documentos para crear los índices vectoriales.
+
+Formatos: Word (.docx), PDF (.pdf, requiere 'pypdf'), HTML (.html, .htm), Markdown (.md) y texto (.txt).
+Cada documento se convierte en una lista de secciones, con el texto normalizado y los títulos que la contienen:
+    {"text": str, "source": str, "format": str, "heading": str | None, "headings": [str, ...], "page": int | None}
+así los fragmentos conservan de qué parte del documento salieron (ver `db.vdb.vector_db.create_vdb`).
+
+`iter_documents` reparte los documentos entre 'PARSE_WORKERS' procesos y los devuelve a medida que se
+parsean, para que el troceado y los embeddings empiecen sin esperar a todo el corpus. Este módulo solo usa la
+librería estándar (salvo 'pypdf'), así los procesos arrancan rápido.
+"""
+
+SUPPORTED_EXTENSIONS = (".docx", ".pdf", ".html", ".htm", ".md", ".markdown", ".txt")
+
+_CONTROL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f\x7f\u200b\ufeff]")
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HYPHENATED = re.compile(r"(\w)-\n(\w)")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Normaliza el texto extraído: Unicode NFC, saltos de línea '\\n', sin caracteres de control, espacios
+    repetidos ni más de una línea en blanco seguida.
+    """
+    text = unicodedata.normalize("NFC", text).replace("\r\n", "\n").replace("\r", "\n")
+    text = _CONTROL.sub("", text)
+    text = _SPACES.sub(" ", text)
+    text = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES.sub("\n\n", text).strip()
+
+
+class _Sections:
+    """
+    Arma las secciones de un documento a partir de sus títulos y párrafos, en orden.
+    """
+    def __init__(self, source: str, fmt: str):
+        self.source = source
+        self.format = fmt
+        self.sections = []
+        self._headings = []   # [(nivel, título)] de la sección actual
+        self._paragraphs = []
+        self._page = None
+
+    def heading(self, level: int, title: str) -> None:
+        title = normalize_text(title)
+        if not title:
+            return
+        self._flush()
+        self._headings = [(lvl, text) for lvl, text in self._headings if lvl < level] + [(level, title)]
+
+    def paragraph(self, text: str) -> None:
+        if text.strip():
+            self._paragraphs.append(text)
+
+    def page(self, number: int) -> None:
+        self._flush()
+        self._page = number
+
+    def _flush(self) -> None:
+        text = normalize_text("\n\n".join(self._paragraphs))
+        self._paragraphs = []
+        if not text:
+            return
+        headings = [title for _, title in self._headings]
+        self.sections.append({
+            "text": text,
+            "source": self.source,
+            "format": self.format,
+            "heading": headings[-1] if headings else None,
+            "headings": headings,
+            "page": self._page,
+        })
+
+    def result(self) -> list:
+        self._flush()
+        return self.sections
+
+
+# Espacio de nombres de WordprocessingML
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_HEADING_NAME = re.compile(r"^(?:heading|t[ií]tulo)\s*(\d)$", re.IGNORECASE)
+
+
+def _docx_heading_styles(archive: zipfile.ZipFile) -> dict:
+    """
+    Devuelve {id de estilo: nivel} de los estilos de título del documento: los que se llaman 'heading N'
+    (el nombre interno de Word, también en documentos en español) o tienen un nivel de esquema.
+    """
+    try:
+        root = ElementTree.fromstring(archive.read("word/styles.xml"))
+    except KeyError:
+        return {}
+    levels = {}
+    for style in root.iter(f"{_W}style"):
+        style_id = style.get(f"{_W}styleId")
+        name = style.find(f"{_W}name")
+        match = _HEADING_NAME.match(name.get(f"{_W}val", "")) if name is not None else None
+        outline = style.find(f"{_W}pPr/{_W}outlineLvl")
+        if match:
+            levels[style_id] = int(match.group(1))
+        elif outline is not None and outline.get(f"{_W}val", "").isdigit() and int(outline.get(f"{_W}val")) < 9:
+            levels[style_id] = int(outline.get(f"{_W}val")) + 1
+    return levels
+
+
+def _docx_text(element) -> str:
+    parts = []
+    for node in element.iter():
+        if node.tag == f"{_W}t" and node.text:
+            parts.append(node.text)
+        elif node.tag == f"{_W}tab":
+            parts.append("\t")
+        elif node.tag in (f"{_W}br", f"{_W}cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def parse_docx(path: str) -> list:
+    """
+    Lee el XML del documento ('word/document.xml') directamente del archivo .docx: los párrafos con estilo de
+    título abren secciones y las tablas se agregan fila por fila, con las celdas separadas por ' | '.
+    """
+    sections = _Sections(path, "docx")
+    with zipfile.ZipFile(path) as archive:
+        levels = _docx_heading_styles(archive)
+        body = ElementTree.fromstring(archive.read("word/document.xml")).find(f"{_W}body")
+    for block in body if body is not None else []:
+        if block.tag == f"{_W}p":
+            style = block.find(f"{_W}pPr/{_W}pStyle")
+            outline = block.find(f"{_W}pPr/{_W}outlineLvl")
+            level = levels.get(style.get(f"{_W}val")) if style is not None else None
+            if level is None and outline is not None and outline.get(f"{_W}val", "").isdigit():
+                level = int(outline.get(f"{_W}val")) + 1
+            text = _docx_text(block)
+            if level is not None and level <= 9:
+                sections.heading(level, text)
+            else:
+                sections.paragraph(text)
+        elif block.tag == f"{_W}tbl":
+            rows = [
+                " | ".join(normalize_text(_docx_text(cell)) for cell in row.iter(f"{_W}tc"))
+                for row in block.iter(f"{_W}tr")
+            ]
+            sections.paragraph("\n".join(row for row in rows if row.strip(" |")))
+    return sections.result()
+
+
+def parse_pdf(path: str) -> list:
+    """
+    Extrae el texto de cada página con 'pypdf' (una sección por página, con su número). Las palabras
+    cortadas con guion al final de una línea se vuelven a unir.
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError as e:
+        raise RuntimeError("Para parsear documentos PDF hay que instalar 'pypdf'.") from e
+    sections = _Sections(path, "pdf")
+    reader = PdfReader(path)
+    title = reader.metadata.title if reader.metadata else None
+    if title:
+        sections.heading(1, str(title))
+    for number, page in enumerate(reader.pages, start=1):
+        sections.page(number)
+        sections.paragraph(_HYPHENATED.sub(r"\1\2", page.extract_text() or ""))
+    return sections.result()
+
+
+class _HtmlSections(HTMLParser):
+    _HEADINGS = {f"h{level}": level for level in range(1, 7)}
+    _BLOCKS = {"p", "div", "li", "tr", "br", "section", "article", "blockquote", "pre", "table", "dd", "dt"}
+    _SKIP = {"script", "style", "noscript", "template", "head", "nav", "footer"}
+
+    def __init__(self, sections: _Sections):
+        super().__init__(convert_charrefs=True)
+        self.sections = sections
+        self._skip = 0
+        self._heading_level = None
+        self._buffer = []
+
+    def _flush(self) -> None:
+        text = "".join(self._buffer)
+        self._buffer = []
+        if self._heading_level is not None:
+            self.sections.heading(self._heading_level, text)
+        else:
+            self.sections.paragraph(text)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self._SKIP:
+            self._skip += 1
+        elif tag in self._HEADINGS:
+            self._flush()
+            self._heading_level = self._HEADINGS[tag]
+        elif tag in self._BLOCKS:
+            self._flush()
+
+    def handle_endtag(self, tag):
+        if tag in self._SKIP:
+            self._skip = max(0, self._skip - 1)
+        elif tag in self._HEADINGS:
+            self._flush()
+            self._heading_level = None
+        elif tag in self._BLOCKS:
+            self._flush()
+
+    def handle_data(self, data):
+        if not self._skip:
+            self._buffer.append(data)
+
+    def close(self):
+        super().close()
+        self._flush()
+
+
+def parse_html(path: str) -> list:
+    """
+    Extrae el texto visible de un HTML (sin scripts, estilos ni navegación); los títulos <h1>-<h6> abren secciones.
+    """
+    sections = _Sections(path, "html")
+    parser = _HtmlSections(sections)
+    parser.feed(_read_text(path))
+    parser.close()
+    return sections.result()
+
+
+_MD_HEADING = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+_MD_SETEXT = re.compile(r"^(=+|-+)\s*$")
+_MD_FENCE = re.compile(r"^(```|~~~)")
+_MD_INLINE = [
+    (re.compile(r"!\[([^\]]*)\]\([^)]*\)"), r"\1"),   # imágenes: el texto alternativo
+    (re.compile(r"\[([^\]]+)\]\([^)]*\)"), r"\1"),    # enlaces: el texto
+    (re.compile(r"(\*\*|__)(.+?)\1"), r"\2"),         # negrita
+    (re.compile(r"`([^`]+)`"), r"\1"),                # código en línea
+]
+
+
+def parse_markdown(path: str) -> list:
+    """
+    Separa un Markdown en secciones por sus títulos ('#' o subrayados con '=' y '-'). Los bloques de código
+    se conservan tal cual; del resto se quitan las marcas de enlaces, imágenes, negritas y código en línea.
+    """
+    sections = _Sections(path, "md")
+    lines = _read_text(path).splitlines()
+    paragraph = []
+    in_fence = False
+
+    def flush():
+        if paragraph:
+            sections.paragraph("\n".join(paragraph))
+            paragraph.clear()
+
+    for line in lines:
+        if _MD_FENCE.match(line.strip()):
+            in_fence = not in_fence
+            continue
+        if in_fence:
+            paragraph.append(line)
+            continue
+        match = _MD_HEADING.match(line)
+        if match:
+            flush()
+            sections.heading(len(match.group(1)), match.group(2))
+            continue
+        if _MD_SETEXT.match(line):
+            # Subrayado de una sola línea de texto: es un título; si no, una línea horizontal
+            if len(paragraph) == 1:
+                title = paragraph.pop()
+                sections.heading(1 if line.startswith("=") else 2, title)
+            else:
+                flush()
+            continue
+        if not line.strip():
+            flush()
+            continue
+        for pattern, replacement in _MD_INLINE:
+            line = pattern.sub(replacement, line)
+        paragraph.append(line)
+    flush()
+    return sections.result()
+
+
+def parse_text(path: str) -> list:
+    """
+    Un texto plano es una sola sección, separada en párrafos por las líneas en blanco.
+    """
+    sections = _Sections(path, "txt")
+    for paragraph in re.split(r"\n\s*\n", _read_text(path)):
+        sections.paragraph(paragraph)
+    return sections.result()
+
+
+def _read_text(path: str) -> str:
+    with open(path, "rb") as f:
+        data = f.read()
+    for encoding in ("utf-8-sig", "cp1252"):
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("latin-1")
+
+
+PARSERS = {
+    ".docx": parse_docx,
+    ".pdf": parse_pdf,
+    ".html": parse_html,
+    ".htm": parse_html,
+    ".md": parse_markdown,
+    ".markdown": parse_markdown,
+    ".txt": parse_text,
+}
+
+
+def parse_document(path: str) -> list:
+    """
+    Parsea un documento según su extensión y devuelve sus secciones.
+
+    Excepciones:
+        ValueError: Si el formato no está soportado.
+    """
+    parser = PARSERS.get(os.path.splitext(path)[1].lower())
+    if parser is None:
+        raise ValueError(f"Formato de documento no soportado: '{path}'.")
+    return parser(path)
+
+
+def _parse_safely(path: str) -> tuple:
+    # Se ejecuta en los procesos del pool: los errores se devuelven para registrarlos en el proceso principal
+    try:
+        return path, parse_document(path), None
+    except Exception as e:
+        return path, [], f"{type(e).__name__}: {e}"
+
+
+def discover(path_doc: str) -> list:
+    """
+    Devuelve los documentos de 'path_doc': el archivo mismo o, si es una carpeta, todos los archivos con
+    formato soportado que contiene (recursivamente), ordenados por ruta.
+    """
+    if os.path.isdir(path_doc):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(path_doc)
+            for name in names
+            if name.lower().endswith(SUPPORTED_EXTENSIONS) and not name.startswith("~$")
+        )
+    return [path_doc]
+
+
+def iter_documents(paths: list, workers: int = PARSE_WORKERS, start_method: str = PARSE_START_METHOD) -> Iterator[tuple]:
+    """
+    Parsea 'paths' en 'workers' procesos y devuelve (ruta, secciones, error) a medida que terminan, en el
+    orden de 'paths'. Como mucho hay 2 documentos por proceso pendientes de entregar, así el consumidor
+    (troceado y embeddings) marca el ritmo y los documentos parseados no se acumulan en memoria.
+
+    'error' es None si el documento se parseó bien; si no, el mensaje del error (y 'secciones' está vacía).
+    """
+    if workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield _parse_safely(path)
+        return
+    context = multiprocessing.get_context(start_method)
+    with ProcessPoolExecutor(max_workers=min(workers, len(paths)), mp_context=context) as pool:
+        pending = deque()
+        remaining = iter(paths)
+        for path in remaining:
+            pending.append(pool.submit(_parse_safely, path))
+            if len(pending) >= 2 * workers:
+                break
+        while pending:
+            yield pending.popleft().result()
+            path = next(remaining, None)
+            if path is not None:
+                pending.append(pool.submit(_parse_safely, path))
@@ -0,0 +1,162 @@
+import os
+from dotenv import load_dotenv
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from db.vdb.docstore import MmapVectorStore, INDEX_FILE, OFFSETS_FILE
+from utils.embeddings import validate_index
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight
+
+load_dotenv()
+PATH_DOC = os.getenv('PATH_DOC')
+PATH_DB = os.getenv('PATH_DB')
+# Archivo JSON con los corpus disponibles: {"nombre": {"path_doc": "...", "path_db": "..."}}
+PATH_CORPORA = os.getenv('PATH_CORPORA', 'docs/corpora.json')
+DEFAULT_CORPUS = os.getenv('DEFAULT_CORPUS', 'default')
+CORPUS_MEMORY_BUDGET_MB = float(os.getenv('CORPUS_MEMORY_BUDGET_MB', '1024'))
+
+"""
+Registro de corpus: varias bases de conocimiento (cada una con su índice FAISS y su docstore) servidas
+desde un mismo despliegue.
+
+Cada solicitud elige su corpus con el encabezado 'X-Corpus' o, si no lo envía, usa el guardado en su sesión.
+El corpus 'DEFAULT_CORPUS' es el de 'PATH_DOC' / 'PATH_DB' y existe siempre; el resto se declara en 'PATH_CORPORA'.
+
+Los índices se cargan al primer uso y se mantienen en memoria mientras el total no supere
+'CORPUS_MEMORY_BUDGET_MB'. Antes de cargar un índice se descargan los usados hace más tiempo (LRU) hasta
+que entre en el presupuesto, así la memoria nunca lo supera ni siquiera durante la carga. Las cargas
+concurrentes de un mismo corpus se agrupan en una sola.
+"""
+
+
+class UnknownCorpus(Exception):
+    """
+    Se lanza cuando una solicitud pide un corpus que no está declarado.
+    """
+
+
+def load_corpora(path_corpora: str = PATH_CORPORA) -> dict:
+    """
+    Devuelve los corpus declarados en 'path_corpora' junto con el corpus por defecto.
+    """
+    corpora = {DEFAULT_CORPUS: {"path_doc": PATH_DOC, "path_db": PATH_DB}}
+    if path_corpora and os.path.exists(path_corpora):
+        with open(path_corpora, encoding="utf-8") as f:
+            corpora.update(json.load(f))
+    return corpora
+
+
+def _footprint(path_db: str) -> int:
+    """
+    Memoria que ocupa el corpus una vez cargado: el índice FAISS se lee completo al heap (su tamaño en memoria
+    es el del archivo) y los offsets del docstore se leen en cada búsqueda. Los textos y metadatos mapeados
+    se leen solo al pedirlos y el sistema operativo puede descartar esas páginas, así que no se cuentan.
+    """
+    return sum(
+        os.path.getsize(os.path.join(path_db, name))
+        for name in (INDEX_FILE, OFFSETS_FILE)
+        if os.path.exists(os.path.join(path_db, name))
+    )
+
+
+class CorpusRegistry:
+    """
+    Índices cargados por corpus, con desalojo LRU según un presupuesto de memoria.
+
+    Un índice desalojado no se cierra explícitamente: las búsquedas en curso conservan su referencia y
+    la memoria se libera cuando terminan.
+    """
+    def __init__(self, corpora: dict, memory_budget_mb: float = CORPUS_MEMORY_BUDGET_MB):
+        self.corpora = corpora
+        self.budget = int(memory_budget_mb * 1024 * 1024)
+        self._lock = threading.Lock()
+        self._loaded = OrderedDict()  # nombre -> (MmapVectorStore, bytes)
+        self._reserved = 0            # bytes de los índices que se están cargando
+        self._flight = SingleFlight("corpus_load")
+
+    def check(self, name: str) -> str:
+        """
+        Excepciones:
+            UnknownCorpus: Si 'name' no está declarado.
+        """
+        if name not in self.corpora:
+            raise UnknownCorpus(f"El corpus '{name}' no existe.")
+        return name
+
+    def get(self, name: Optional[str] = None) -> MmapVectorStore:
+        """
+        Devuelve el índice del corpus 'name' (o del corpus por defecto), cargándolo si hace falta.
+        """
+        name = self.check(name or DEFAULT_CORPUS)
+        with self._lock:
+            if name in self._loaded:
+                self._loaded.move_to_end(name)
+                metrics.incr("corpus.hit")
+                return self._loaded[name][0]
+        return self._flight.do(name, lambda: self._load(name))
+
+    def _load(self, name: str) -> MmapVectorStore:
+        from db.vdb.vector_db import ensure_vdb
+        with self._lock:
+            if name in self._loaded:
+                return self._loaded[name][0]
+        start_time = time.time()
+        config = self.corpora[name]
+        ensure_vdb(config.get("path_doc"), config["path_db"])
+        size = _footprint(config["path_db"])
+        with self._lock:
+            self._evict(incoming=size)
+            self._reserved += size
+        try:
+            vdb = MmapVectorStore.load(config["path_db"])
+            validate_index(vdb.index, name)
+        finally:
+            with self._lock:
+                self._reserved -= size
+        with self._lock:
+            self._loaded[name] = (vdb, size)
+        metrics.incr("corpus.load")
+        metrics.observe("corpus.load_seconds", time.time() - start_time)
+        logger.info("Corpus '%s' cargado en %.2f segundos (%.1f MB, %d fragmentos).",
+                    name, time.time() - start_time, size / 1024 / 1024, len(vdb.docstore))
+        return vdb
+
+    def _evict(self, incoming: int) -> None:
+        # Se llama con el lock tomado: descarga los corpus menos usados hasta que entren 'incoming' bytes más
+        used = sum(size for _, size in self._loaded.values()) + self._reserved
+        if incoming > self.budget:
+            logger.warning("El corpus a cargar (%.1f MB) no entra en el presupuesto de memoria (%.1f MB).",
+                           incoming / 1024 / 1024, self.budget / 1024 / 1024)
+        for name in list(self._loaded):
+            if used + incoming <= self.budget:
+                break
+            _, size = self._loaded.pop(name)
+            used -= size
+            metrics.incr("corpus.evict")
+            logger.info("Corpus '%s' descargado por presupuesto de memoria (%.1f MB liberados).", name, size / 1024 / 1024)
+
+    def unload(self, name: str) -> None:
+        """
+        Descarga el corpus 'name' (por ejemplo, después de reconstruir su índice).
+        """
+        with self._lock:
+            self._loaded.pop(name, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            loaded = {name: round(size / 1024 / 1024, 2) for name, (_, size) in self._loaded.items()}
+        return {
+            "budget_mb": round(self.budget / 1024 / 1024, 2),
+            "used_mb": round(sum(loaded.values()), 2),
+            "loaded_mb": loaded,
+            "available": sorted(self.corpora),
+        }
+
+
+# static instance for common usages
+corpus_registry = CorpusRegistry(load_corpora())
+metrics.register("corpora", corpus_registry.snapshot)
@@ -2,16 +2,22 @@ import os
 from dotenv import load_dotenv
 import time
 from utils.logger import logger
-from langchain_community.document_loaders import Docx2txtLoader
-from langchain_community.vectorstores import FAISS
-from langchain_text_splitters import RecursiveCharacterTextSplitter
 from utils.auxiliar_functions import get_model
+from db.vdb.docstore import docstore_exists, write_docstore, pickle_exists, convert_pickle
+from db.vdb.parsers import discover, iter_documents
 
 load_dotenv()
 PATH_DOC = os.getenv('PATH_DOC')
 PATH_DB = os.getenv('PATH_DB')
 EMBEDDING_NAME_MODEL = os.getenv('EMBEDDING_NAME_MODEL')
 EMBEDDING_SIZE_MODEL = os.getenv('EMBEDDING_SIZE_MODEL')
+# Tamaño y solapamiento de los fragmentos, en caracteres ('0' = el párrafo más largo de cada documento, sin solapamiento)
+CHUNK_SIZE = int(os.getenv('CHUNK_SIZE', '0'))
+CHUNK_OVERLAP = int(os.getenv('CHUNK_OVERLAP', '0'))
+# Fragmentos por llamada al modelo de embeddings al crear el índice
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', '256'))
+# Con 'true' el índice se crea aunque algún documento no se pueda parsear (se omiten esos documentos)
+PARSE_ALLOW_ERRORS = os.getenv('PARSE_ALLOW_ERRORS', 'false').lower() == 'true'
 
 
 def calcular_max_caracteres(texto):
@@ -28,45 +34,114 @@ def calcular_max_caracteres(texto):
         int: La longitud del párrafo más largo más uno.
     """
     parrafos = texto.split("\n\n")
-    print()
     longitudes = [len(parrafo) for parrafo in parrafos]
     return max(longitudes) + 1
 
+def vdb_exists(path_db) -> bool:
+    """
+    Indica si la base de datos vectorial ya fue creada en 'path_db' (índice FAISS y docstore mapeado en memoria).
+    """
+    return docstore_exists(os.path.join(os.getcwd(), path_db))
+
+
 def create_vdb(path_doc, path_db):
     """
-    Crea y guarda una base de datos vectorial a partir de un documento.
+    Crea y guarda una base de datos vectorial a partir de un documento o de una carpeta de documentos.
+
+    Los documentos (Word, PDF, HTML, Markdown o texto, ver `db.vdb.parsers`) se parsean en 'PARSE_WORKERS'
+    procesos y se procesan a medida que llegan: cada sección se divide en fragmentos, los fragmentos se
+    convierten en embeddings de a 'EMBED_BATCH_SIZE' y se agregan al índice, mientras los procesos siguen
+    parseando los documentos siguientes. Con 'CHUNK_SIZE=0' cada documento se divide con el tamaño de su
+    párrafo más largo (ver `calcular_max_caracteres`). Finalmente, la base de datos se guarda en la ruta
+    proporcionada: el índice en 'index.faiss' y los fragmentos, con la sección de la que salieron (título,
+    títulos que la contienen y página), en el docstore mapeado en memoria de `db.vdb.docstore`.
 
-    Esta función carga un documento desde la ruta especificada, divide su contenido en 
-    fragmentos utilizando un tamaño de chunk calculado y luego crea una base de datos 
-    vectorial utilizando embeddings del modelo especificado. Finalmente, la base de datos 
-    se guarda en la ruta proporcionada.
+    Si un documento no se puede parsear, la creación se interrumpe sin guardar nada, así `ensure_vdb` la vuelve
+    a intentar completa la próxima vez. Con 'PARSE_ALLOW_ERRORS=true' esos documentos se omiten y el índice se
+    crea con los demás.
 
     Parámetros:
-        path_doc (str): La ruta al documento que se va a cargar.
-        model (str): El tipo de modelo que se va a utilizar para generar embeddings.
+        path_doc (str): La ruta al documento o a la carpeta de documentos que se va a cargar.
         path_db (str): La ruta donde se guardará la base de datos vectorial.
 
     Retorno:
         None: La función no devuelve ningún valor. Los resultados se guardan en el sistema de archivos.
 
     Excepciones:
-        Puede lanzar excepciones si hay errores en la carga del documento o en la creación de la base de datos.
+        ValueError: Si no se pudo extraer texto de ningún documento, o si no se pudo parsear alguno y
+            'PARSE_ALLOW_ERRORS' no está activado.
+        Puede lanzar excepciones si hay errores en la creación de los embeddings o de la base de datos.
     """
+    import faiss
+    import numpy as np
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
     start_time = time.time()
     logger.info("Creando base de datos vectorial.")
-    loader = Docx2txtLoader(path_doc)
-    data = loader.load()
-    chunk_size = calcular_max_caracteres(data[0].page_content)
-    text_splitter = RecursiveCharacterTextSplitter(
-       chunk_size = chunk_size,
-       chunk_overlap  = 0,
-       length_function = len
-       )
-    chunks = text_splitter.split_documents(data)
+    paths = discover(path_doc)
     embeddings = get_model(model_type="embeddings")
-    vdb = FAISS.from_documents(chunks, embeddings)
-    vdb.save_local(path_db)
-    return logger.info(f"Base de datos vectorial creada en {round(time.time() - start_time, 2)} segundos.")
+    index = None
+    texts, metadatas, batch = [], [], []
+    parsed = 0
+    failed = []
+
+    def flush():
+        nonlocal index
+        vectors = np.asarray(embeddings.embed_documents([text for text, _ in batch]), dtype="float32")
+        if index is None:
+            index = faiss.IndexFlatL2(vectors.shape[1])
+        index.add(vectors)
+        for text, metadata in batch:
+            texts.append(text)
+            metadatas.append(metadata)
+        batch.clear()
+
+    for path, sections, error in iter_documents(paths):
+        if error is not None:
+            if not PARSE_ALLOW_ERRORS:
+                raise ValueError(f"No se pudo parsear el documento '{path}': {error}")
+            logger.error("No se pudo parsear el documento '%s': %s", path, error)
+            failed.append(path)
+            continue
+        parsed += 1
+        if not sections:
+            continue
+        chunk_size = CHUNK_SIZE or max(calcular_max_caracteres(section["text"]) for section in sections)
+        text_splitter = RecursiveCharacterTextSplitter(
+           chunk_size = chunk_size,
+           chunk_overlap  = CHUNK_OVERLAP if CHUNK_SIZE else 0,
+           length_function = len
+           )
+        for section in sections:
+            metadata = {key: value for key, value in section.items() if key != "text" and value not in (None, [])}
+            for chunk in text_splitter.split_text(section["text"]):
+                batch.append((chunk, metadata))
+                if len(batch) >= EMBED_BATCH_SIZE:
+                    flush()
+    if batch:
+        flush()
+    if index is None:
+        raise ValueError(f"No se pudo extraer texto de ningún documento de '{path_doc}'.")
+    os.makedirs(path_db, exist_ok=True)
+    faiss.write_index(index, os.path.join(path_db, "index.faiss"))
+    write_docstore(path_db, texts, metadatas)
+    if failed:
+        logger.warning("Base de datos vectorial de '%s' creada sin %s documentos que no se pudieron parsear: %s",
+                       path_db, len(failed), ", ".join(failed))
+    return logger.info(f"Base de datos vectorial creada en {round(time.time() - start_time, 2)} segundos "
+                       f"({parsed} de {len(paths)} documentos, {index.ntotal} fragmentos).")
+
+def ensure_vdb(path_doc, path_db) -> None:
+    """
+    Crea la base de datos vectorial de 'path_db' a partir de 'path_doc' si no existe. Si solo existe en el
+    formato anterior ('index.pkl' de `FAISS.save_local`), convierte el docstore en lugar de recrearla.
+    """
+    if vdb_exists(path_db):
+        logger.info("La base de datos vectorial de '%s' ya estaba creada.", path_db)
+    elif pickle_exists(path_db):
+        convert_pickle(path_db)
+    else:
+        create_vdb(path_doc, path_db)
 
 if __name__ == "__main__":
     if PATH_DOC and PATH_DB:
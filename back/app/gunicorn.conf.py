@@ -0,0 +1,51 @@
+import os
+from dotenv import load_dotenv
+
+"""
+Configuración de gunicorn para servir la aplicación con varios procesos (workers de uvicorn).
+
+Con 'preload_app' la aplicación se importa e inicializa una sola vez en el proceso padre (plantillas,
+tablas, flujo de nodos compilado e índice vectorial) y los workers la heredan con el fork, compartiendo
+esa memoria copy-on-write. Los recursos propios de cada proceso (pool de conexiones, hilo del logger,
+pool de hilos de las llamadas duplicadas) se reinicializan en 'post_fork'.
+
+Los límites de concurrencia (LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE), el circuit breaker, las métricas y
+el almacén de idempotencia son por proceso, al igual que el reparto equitativo entre clientes
+(FAIR_MAX_CONCURRENCY); las cuotas por cliente se comparten con QUOTA_BACKEND=redis.
+
+Uso (desde back/app):
+    gunicorn -c gunicorn.conf.py main:app
+"""
+
+load_dotenv()
+WEB_CONCURRENCY = int(os.getenv('WEB_CONCURRENCY', os.cpu_count() or 1))
+WEB_BIND = os.getenv('WEB_BIND', '0.0.0.0:8000')
+WEB_PRELOAD = os.getenv('WEB_PRELOAD', 'true').lower() == 'true'
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '30'))
+
+bind = WEB_BIND
+workers = WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = WEB_PRELOAD
+# Margen sobre el deadline de las solicitudes antes de que el proceso padre reinicie un worker bloqueado
+timeout = int(REQUEST_TIMEOUT * 2)
+graceful_timeout = int(REQUEST_TIMEOUT)
+keepalive = 5
+
+
+def when_ready(server):
+    if preload_app:
+        from utils.startup import initialize, before_fork
+        initialize()
+        before_fork()
+
+
+def post_fork(server, worker):
+    from utils.session_cache import SESSION_CACHE_BACKEND, configure
+    if preload_app:
+        from utils.startup import after_fork
+        after_fork()
+    if workers > 1 and SESSION_CACHE_BACKEND == "memory":
+        # Cada worker tendría su propia copia de las sesiones y podría servir un historial desactualizado
+        server.log.warning("La caché de sesiones en memoria no se comparte entre workers; se desactiva (usar SESSION_CACHE_BACKEND=redis).")
+        configure("none")
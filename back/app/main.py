@@ -1,54 +1,89 @@
 import os
 from dotenv import load_dotenv
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Depends
+from fastapi.responses import JSONResponse
+from db.orm.maintenance import maintenance
+from db.orm.writer import message_writer
 from utils.logger import logger
-from db.vdb.vector_db import create_vdb
+from utils.profiling import start_memory_tracing
 from rutas.chat import router_chat
+from rutas.debug import router_debug
+from rutas.export import router_export
+from rutas.metrics import router_metrics
+from rutas.usage import router_usage
 from utils.security import verify_api_key
+from utils.startup import initialize_in_background, readiness
 
 load_dotenv()
 FASTAPI_NAME = os.getenv('FASTAPI_NAME')
 FASTAPI_VERSION = os.getenv('FASTAPI_VERSION')
-PATH_DOC = os.getenv('PATH_DOC')
-PATH_DB = os.getenv('PATH_DB')
 
 """
 Configuración de la aplicación FastAPI.
 
 Este script inicializa la aplicación FastAPI con el título 'Challenge Pi Consulting' y la versión '0.0.1'.
-Incluye una dependencia para verificar la clave API en todas las solicitudes y registra
-el router para el chat. Además, define un endpoint de verificación de salud.
+Cada router verifica la clave API en sus rutas (ver `utils.security`) y registra el router para el chat.
+La verificación es por router y no global porque la conexión WebSocket del chat ('/chat/ws') se autentica
+una sola vez al conectarse. Además, define los endpoints de verificación de salud y de disponibilidad.
+
+La inicialización pesada (tablas de la base de datos, plantillas de prompts, flujo de nodos compilado y
+creación o carga del índice vectorial) se hace en un hilo aparte al arrancar (ver `utils.startup`), de modo
+que la aplicación acepta conexiones de inmediato. Las librerías pesadas (langchain, langgraph, FAISS, SQLAlchemy) se
+importan recién en ese momento. Las tareas periódicas de la base de datos (por ejemplo, los totales de uso) corren
+en otro hilo (ver `db.orm.maintenance`).
 
 Atributos:
-    app (FastAPI): La instancia de la aplicación FastAPI inicializada con un título,
-        versión y una dependencia para verificar la clave API.
+    app (FastAPI): La instancia de la aplicación FastAPI inicializada con un título y versión.
 
 Rutas:
     - /health (GET): Devuelve "OK" como una verificación simple de salud para confirmar
         que el servicio está funcionando.
+    - /ready (GET): Devuelve 200 cuando todos los componentes están inicializados y 503 mientras
+        tanto, con el estado de cada componente. No requiere 'X-API-Key', para que
+        las sondas de readiness del orquestador lo puedan consultar sin credenciales.
+    - /metrics (GET): Devuelve las métricas en memoria del proceso.
+    - /export (GET): Exporta las conversaciones en NDJSON o CSV por streaming.
+    - /chat/ws (WebSocket): Conversación por una conexión persistente (ver `api.websocket`).
+    - /usage (GET): Devuelve los totales de tokens y latencia por hora o por día, modelo y prompt.
+    - /debug/profiles y /debug/memory (GET): Perfiles de solicitudes y uso de memoria; solo con
+        'PROFILING_ENABLED=true' (ver `utils.profiling`).
 
 Funciones:
     session() -> str: Un endpoint de verificación de salud que devuelve la cadena "OK".
+    ready() -> JSONResponse: Un endpoint de disponibilidad con el estado de inicialización de cada componente.
 
 """
-faiss_file = os.path.exists(os.path.join(os.getcwd(), PATH_DB,'index.faiss'))
-pkl_file = os.path.exists(os.path.join(os.getcwd(), PATH_DB,'index.pkl'))
-logger.debug(f"Directorio de 'index.faiss': {os.path.join(os.getcwd(), PATH_DB,'index.faiss')}")
-logger.debug(f"Directorio de 'index.pkl': {os.path.join(os.getcwd(), PATH_DB,'index.pkl')}")
 
-if not faiss_file or not pkl_file:
-    create_vdb(PATH_DOC, PATH_DB)
-else:
-    logger.info(f"La base de datos vectorial ya estaba creada.")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    start_memory_tracing()
+    initialize_in_background()
+    maintenance.start()
+    yield
+    maintenance.stop()
+    message_writer.close()
+    logger.info("Aplicación detenida.")
 
 app = FastAPI(
     title=FASTAPI_NAME,
     version=FASTAPI_VERSION,
-    dependencies=[Depends(verify_api_key)]
+    lifespan=lifespan
 )
 
 app.include_router(router_chat)
+app.include_router(router_metrics)
+app.include_router(router_export)
+app.include_router(router_usage)
+app.include_router(router_debug)
 
-@app.get("/health")
+@app.get("/health", dependencies=[Depends(verify_api_key)])
 def session() -> str:
-    return "OK"
\ No newline at end of file
+    return "OK"
+
+@app.get("/ready")
+def ready() -> JSONResponse:
+    return JSONResponse(
+        status_code=200 if readiness.is_ready() else 503,
+        content=readiness.snapshot()
+    )
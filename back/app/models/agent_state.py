@@ -1,5 +1,5 @@
 import operator
-from typing import TypedDict, Annotated, Union
+from typing import Callable, TypedDict, Annotated, Union
 from langchain_core.agents import AgentAction, AgentFinish
 from langchain_core.messages import BaseMessage
 
@@ -11,4 +11,10 @@ class AgentState(TypedDict):
     language: str
     tokens_used: dict
     partial_states: Union[dict, None]
-    chat_history: list[BaseMessage]
\ No newline at end of file
+    chat_history: list[BaseMessage]
+    deadline: Union[float, None]
+    degraded: bool
+    query_embedding: Union[list[float], None]
+    corpus: Union[str, None]
+    llm_calls: list[dict]
+    on_token: Union[Callable, None]
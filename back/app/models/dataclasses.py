@@ -23,9 +23,22 @@ class ChatResponse(BaseModel):
         description="ID de la Sesión"
     )
 
+class BatchChatRequest(BaseModel):
+    requests: list[ChatRequest] = Field(
+        default=...,
+        description="Solicitudes a procesar"
+    )
+    max_concurrency: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description="Cantidad máxima de solicitudes procesándose a la vez"
+    )
+
+# Los campos son obligatorios pero admiten null: así el esquema es válido para las salidas estructuradas
+# estrictas del proveedor y el modelo puede indicar que no encontró el dato
 class Language(BaseModel):
-        language: str = Field(description="idioma del mensaje del usuario")
-        translate: str = Field(description="traducción al español del mensaje del usuario")
+        language: Optional[str] = Field(description="idioma del mensaje del usuario")
+        translate: Optional[str] = Field(description="traducción al español del mensaje del usuario")
 
 class Name(BaseModel):
-        user_name: str = Field(description="Nombre del usuario")
\ No newline at end of file
+        user_name: Optional[str] = Field(description="Nombre del usuario")
\ No newline at end of file
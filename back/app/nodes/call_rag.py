@@ -1,8 +1,9 @@
 import os
 from dotenv import load_dotenv
-from utils.logger import logger
+from utils.logger import logger, payload_logger
 from typing import Dict
-from utils.auxiliar_functions import rag
+from utils.auxiliar_functions import rag, get_template
+from utils.circuit_breaker import CircuitOpen
 
 # Cargo variables de ambiente
 load_dotenv()
@@ -30,9 +31,17 @@ def call_rag(inputs: Dict[str, str]) -> Dict[str, str]:
     Notas:
         - La función utiliza el proceso RAG para recuperar información relevante basada en las entradas proporcionadas.
         - La información recuperada se almacena en 'rag', y luego se ejecuta el prompt correspondiente para generar una respuesta.
+        - En modo degradado (circuito del LLM abierto) no se llama al LLM: la respuesta se arma con la información
+          recuperada y la plantilla 'degraded_call_rag'.
     """
     logger.debug("Entrando en el nodo 'call_rag'")
     inputs["rag"]=rag(inputs)
-    CallChain.run(inputs, prompt_name="call_rag") # model_type="chat"
-    logger.debug(f"Respuesta del Nodo 'call_rag': {inputs["agent_outcome"]}")
+    if not inputs.get("degraded"):
+        try:
+            CallChain.run(inputs, prompt_name="call_rag") # model_type="chat"
+        except CircuitOpen:
+            inputs["degraded"] = True
+    if inputs.get("degraded"):
+        inputs["agent_outcome"] = get_template("degraded_call_rag").format(rag=inputs["rag"])
+    payload_logger.debug("Respuesta del Nodo 'call_rag': %s", inputs["agent_outcome"])
     return inputs
\ No newline at end of file
@@ -1,7 +1,8 @@
 import os
 from dotenv import load_dotenv
-from utils.logger import logger
+from utils.logger import logger, payload_logger
 from typing import Dict
+from utils.circuit_breaker import CircuitOpen
 
 # Cargo variables de ambiente
 load_dotenv()
@@ -28,12 +29,16 @@ def personality(inputs: Dict[str, str]) -> Dict[str, str]:
 
     Notas:
         - El nodo 'personality' es ejecutado para generar una respuesta relevante relacionada con la personalidad del LLM.
+        - Si el circuito del LLM se abre, se conserva la respuesta del nodo 'call_rag' sin personalidad.
     """
     logger.debug("Entrando en el nodo 'personality'")
-    logger.debug(f"La respuesta debe ser en el idioma: '{inputs['language']}'")
-    if inputs["language"] == "español":
-        CallChain.run(inputs, prompt_name="personality_esp")
-    else:
-        CallChain.run(inputs, prompt_name="personality")
-    logger.debug(f"Respuesta del Nodo 'personality': {inputs["agent_outcome"]}")
+    logger.debug("La respuesta debe ser en el idioma: '%s'", inputs['language'])
+    try:
+        if inputs["language"] == "español":
+            CallChain.run(inputs, prompt_name="personality_esp")
+        else:
+            CallChain.run(inputs, prompt_name="personality")
+    except CircuitOpen:
+        inputs["degraded"] = True
+    payload_logger.debug("Respuesta del Nodo 'personality': %s", inputs["agent_outcome"])
     return inputs
\ No newline at end of file
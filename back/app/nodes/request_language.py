@@ -1,8 +1,9 @@
 import os
 from dotenv import load_dotenv
-from utils.logger import logger
+from utils.logger import logger, payload_logger
 from typing import Dict
 from models.dataclasses import Language
+from utils.circuit_breaker import CircuitOpen
 
 # Cargo variables de ambiente
 load_dotenv()
@@ -10,6 +11,28 @@ CHAT_TEMPERATURE = os.getenv('CHAT_TEMPERATURE')
 CHAT_SEED = os.getenv('CHAT_SEED')
 
 
+def parse_language(inputs: Dict[str, str], CallChain) -> None:
+    """
+    Ejecuta el prompt 'get_language' y guarda el idioma y la traducción al español en 'inputs'.
+
+    Si no se pudo extraer un idioma, 'agent_outcome' pide al usuario que repita el mensaje. En modo degradado
+    (circuito del LLM abierto) no se llama al LLM: se conserva el idioma conocido y se usa el mensaje original
+    como 'input_translated'.
+    """
+    if not inputs.get("degraded"):
+        try:
+            CallChain.run(inputs, prompt_name="get_language", pydantic_object=Language)
+        except CircuitOpen:
+            inputs["degraded"] = True
+    if inputs.get("degraded"): # Si el LLM no está disponible, busco en el documento con el mensaje original
+        inputs["input_translated"] = inputs["input"]
+    elif not inputs["agent_outcome"]["language"]: # Si no pude extraer un idioma, entonces es un no entendido
+        inputs["agent_outcome"] = "¡Uy, Perdoname pero no te entendí! ¿Me lo podés volver a escribir?"
+    else: # Si pude extraer un idioma y mensaje traducidos al español, entonces los guardo en el diccionario de 'inputs'
+        inputs["input_translated"] = inputs["agent_outcome"]["translate"]
+        inputs["language"] = inputs["agent_outcome"]["language"].lower()
+
+
 @staticmethod
 def request_language(inputs: Dict[str, str]) -> Dict[str, str]:
     from utils.functions import CallChain
@@ -36,28 +59,19 @@ def request_language(inputs: Dict[str, str]) -> Dict[str, str]:
         - Si la clave 'language' no está presente, se ejecuta un prompt para identificar el idioma del usuario.
         - Si ya se ha ejecutado previamente este nodo, se actualiza 'partial_states' con un mensaje de saludo.
         - Si la entrada no está traducida ('input_translated'), se vuelve a ejecutar el prompt para obtener el idioma y traducir la entrada.
+        - En modo degradado no se llama al LLM (ver `parse_language`).
     """
     logger.debug("Entrando en el nodo 'request_language'")
     if not inputs["language"]: # Si no tengo un idioma
         if not inputs["partial_states"]: # Si no hubo interacción en el nodo 'request_name', entonces parseo la respuesta del usuario
-            CallChain.run(inputs, prompt_name="get_language", pydantic_object=Language)
-            if not inputs["agent_outcome"]["language"]: # Si no pude extraer un idioma, entonces es un no entendido
-                inputs["agent_outcome"] = "¡Uy, Perdoname pero no te entendí! ¿Me lo podés volver a escribir?"
-            else: # Si pude extraer un idioma y mensaje traducidos al español, entonces los guardo en el diccionario de 'inputs'
-                inputs["input_translated"] = inputs["agent_outcome"]["translate"]
-                inputs["language"] = inputs["agent_outcome"]["language"].lower()
+            parse_language(inputs, CallChain)
         else: # Si hubo interacción en el nodo 'request_name' entonces solicito al usuario un mensaje
-            inputs["agent_outcome"] = f"¡Excelente, mucho gusto {inputs["user_name"].capitalize()}! Preguntame lo que quieras."
+            inputs["agent_outcome"] = f"¡Excelente, mucho gusto {inputs["user_name"]}! Preguntame lo que quieras."
             partial_state = {"request_language": inputs["agent_outcome"]}
             inputs["partial_states"].update(partial_state)
-        logger.debug(f"Respuesta del Nodo 'request_language': {inputs["agent_outcome"]}")
+        payload_logger.debug("Respuesta del Nodo 'request_language': %s", inputs["agent_outcome"])
     elif not inputs["input_translated"]: # Si tengo idioma, parseo el mensaje la respuesta del usuario
-        CallChain.run(inputs, prompt_name="get_language", pydantic_object=Language)
-        if not inputs["agent_outcome"]["language"]: # Si no pude extraer un idioma, entonces es un no entendido
-            inputs["agent_outcome"] = "¡Uy, Perdoname pero no te entendí! ¿Me lo podés volver a escribir?"
-        else: # Si pude extraer un idioma y mensaje traducidos al español, entonces los guardo en el diccionario de 'inputs'
-            inputs["input_translated"] = inputs["agent_outcome"]["translate"]
-            inputs["language"] = inputs["agent_outcome"]["language"].lower()
+        parse_language(inputs, CallChain)
     else:
         logger.debug(f"El nodo 'request_language' no hizo nada.")
     return inputs
\ No newline at end of file
@@ -1,13 +1,192 @@
 import os
 from dotenv import load_dotenv
-from utils.logger import logger
-from typing import Dict
+import json
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Optional
+from utils.logger import logger, payload_logger
+from utils.auxiliar_functions import get_template
+from utils.circuit_breaker import CircuitOpen
+from utils.metrics import metrics
 from models.dataclasses import Name
 
 # Cargo variables de ambiente
 load_dotenv()
 CHAT_TEMPERATURE = os.getenv('CHAT_TEMPERATURE')
 CHAT_SEED = os.getenv('CHAT_SEED')
+PATH_NAMES = os.getenv('PATH_NAMES', 'docs/nombres.json')
+NAME_FAST_PATH = os.getenv('NAME_FAST_PATH', 'true').lower() == 'true'
+
+# Lo que sigue a la frase: palabras formadas solo por letras (incluye tildes, ñ, ç, etc.) separadas por espacios.
+# De ellas se toman como nombre las primeras que lo parezcan (ver `_take_name`).
+_WORDS = r"(?P<name>[^\W\d_]+(?:[ \t]+[^\W\d_]+)*)"
+
+# Frases que introducen un nombre (español, inglés y portugués). Igual que en las de apodos, la palabra
+# capturada solo se acepta si está en el listado de nombres o empieza con mayúscula ("mi nombre es secreto").
+STRONG_PATTERNS = [re.compile(p + _WORDS, re.IGNORECASE) for p in (
+    r"\bme\s+llamo\s+",
+    r"\bmi\s+nombre\s+es\s+",
+    r"\bmy\s+name\s+is\s+",
+    r"\bmy\s+name'?s\s+",
+    r"\bmeu\s+nome\s+[eé]\s+",
+    r"\bme\s+chamo\s+",
+)]
+
+# Frases que suelen introducir un nombre o apodo pero también otras cosas ("call me later", "llamame mañana"):
+# solo se aceptan si la palabra capturada está en el listado de nombres o empieza con mayúscula.
+NICKNAME_PATTERNS = [re.compile(p + _WORDS, re.IGNORECASE) for p in (
+    r"\bll[aá]mame\s+",
+    r"\bme\s+dicen\s+",
+    r"\bcall\s+me\s+",
+    r"\bpode\s+me\s+chamar\s+de\s+",
+)]
+
+# Frases que pueden introducir un nombre o cualquier otra cosa ("soy programador", "I'm fine"):
+# solo se aceptan si la palabra capturada está en el listado de nombres.
+WEAK_PATTERNS = [re.compile(p + _WORDS, re.IGNORECASE) for p in (
+    r"\bsoy\s+",
+    r"\bi\s+am\s+",
+    r"\bi'?m\s+",
+    r"\beu\s+sou\s+",
+    r"\bsou\s+",
+)]
+
+# Negación inmediatamente antes de la frase ("no me llamo Juan", "I'm not", "não sou"). "No, me llamo Juan"
+# no es una negación: la coma separa la respuesta de la frase.
+NEGATION = re.compile(r"\b(?:no|not|n[aã]o|nunca|never)\s+$", re.IGNORECASE)
+
+# Un nombre con más palabras que estas es, casi seguro, otra cosa ("me llamo Juan Y Trabajo En...")
+MAX_NAME_WORDS = 4
+
+GREETINGS = {"hola", "buenas", "buenos", "dias", "tardes", "noches", "hi", "hello", "hey",
+             "oi", "ola", "bom", "dia", "boa", "tarde", "noite"}
+
+NOT_NAMES = {"el", "la", "los", "las", "un", "una", "de", "del", "es", "is", "the", "a",
+             "an", "not", "no", "o", "os", "um", "uma", "que", "what",
+             # Palabras de tiempo y de relleno que siguen a "llamame", "call me", etc.
+             "manana", "hoy", "ahora", "luego", "despues", "tarde", "temprano", "pronto", "mas", "cuando",
+             "si", "nunca", "siempre", "ya", "por", "porfa", "favor", "cualquier", "otra", "asi", "como",
+             "later", "tomorrow", "today", "tonight", "now", "back", "soon", "anytime", "sometime", "whenever",
+             "please", "maybe", "when", "if", "again", "anything", "whatever", "any",
+             "amanha", "hoje", "agora", "depois", "logo", "quando", "mais", "sempre"}
+
+
+def _normalize(word: str) -> str:
+    """
+    Pasa una palabra a minúsculas y le quita las tildes para compararla con el listado de nombres.
+    """
+    decomposed = unicodedata.normalize("NFD", word.lower())
+    return "".join(c for c in decomposed if unicodedata.category(c) != "Mn")
+
+
+@lru_cache(maxsize=1)
+def load_names() -> frozenset:
+    """
+    Carga el listado de nombres de pila incluido en 'docs/nombres.json' (o en la ruta
+    indicada por la variable de ambiente 'PATH_NAMES'). El listado se lee una única vez por proceso.
+    """
+    try:
+        with open(PATH_NAMES, "r", encoding="utf-8") as file:
+            return frozenset(_normalize(name) for name in json.load(file))
+    except Exception as e:
+        logger.error("No se pudo cargar el listado de nombres: %s", e)
+        return frozenset()
+
+
+def capitalize_name(name: str) -> str:
+    """
+    Capitaliza cada palabra de un nombre ("juan carlos" -> "Juan Carlos").
+    """
+    return " ".join(word.capitalize() for word in name.split())
+
+
+def _is_name_word(word: str, names: frozenset, cased: bool) -> bool:
+    """
+    Indica si 'word' puede ser parte de un nombre: está en el listado de nombres o, si las mayúsculas del
+    mensaje son informativas ('cased'), empieza con mayúscula. Las palabras de una letra ("I") y las de
+    'NOT_NAMES' nunca lo son.
+    """
+    key = _normalize(word)
+    if len(word) < 2 or key in NOT_NAMES:
+        return False
+    return key in names or (cased and word[0].isupper())
+
+
+def _take_name(words: list, names: frozenset, cased: bool, known_first: bool = False) -> Optional[str]:
+    """
+    Devuelve las primeras palabras consecutivas de 'words' que pueden ser parte de un nombre, capitalizadas
+    y unidas por un espacio. Con 'known_first' la primera tiene que estar en el listado de nombres.
+    Devuelve None si la primera no parece un nombre o si son más de 'MAX_NAME_WORDS'.
+    """
+    taken = []
+    for word in words:
+        if not _is_name_word(word, names, cased):
+            break
+        taken.append(word)
+    if not taken or len(taken) > MAX_NAME_WORDS:
+        return None
+    if known_first and _normalize(taken[0]) not in names:
+        return None
+    return capitalize_name(" ".join(taken))
+
+
+def _match_name(patterns: list, text: str, names: frozenset, cased: bool, known_first: bool) -> Optional[str]:
+    """
+    Busca las frases de 'patterns' en 'text' y devuelve el nombre que introducen, o None si ninguna introduce
+    un nombre o si introducen nombres distintos ("me llamo Juan, mi nombre es Pedro"). Las frases negadas se ignoran.
+    """
+    found = set()
+    for pattern in patterns:
+        for match in pattern.finditer(text):
+            if NEGATION.search(text, 0, match.start()):
+                continue
+            name = _take_name(match.group("name").split(), names, cased, known_first)
+            if name:
+                found.add(name)
+    return found.pop() if len(found) == 1 else None
+
+
+def extract_name(text: str) -> Optional[str]:
+    """
+    Intenta extraer el nombre del usuario con reglas locales, sin invocar al LLM.
+
+    Args:
+        text (str): Mensaje del usuario.
+
+    Returns:
+        Optional[str]: El nombre extraído, con cada palabra capitalizada ("Juan Carlos"), o None si las reglas
+        no permiten extraerlo con confianza.
+
+    Notas:
+        - Después de las frases explícitas ("me llamo", "my name is", "meu nome é", ...) y de las de apodos
+          ("llamame", "me dicen", "call me", ...) se toman las palabras consecutivas que estén en el listado de
+          nombres de pila o empiecen con mayúscula ("me llamo juan carlos", "me llamo Ana García"). Las palabras
+          de 'NOT_NAMES' cortan el nombre ("call me later", "llamame mañana").
+        - Después de las frases ambiguas ("soy", "I'm", "sou") la primera palabra tiene que estar en el listado.
+        - Un mensaje que es solo un nombre (opcionalmente precedido de un saludo) se acepta si la primera
+          palabra está en el listado ("Juan", "Hola, Juan", "Ana García").
+        - Si todas las palabras del mensaje empiezan con mayúscula, o está todo en mayúsculas, las mayúsculas
+          no indican un nombre y solo cuenta el listado ("Mi Nombre Es Secreto").
+        - Se devuelve None ante una negación ("no me llamo Juan"), si frases del mismo tipo introducen nombres distintos o
+          si el nombre tiene más de 'MAX_NAME_WORDS' palabras: en esos casos decide el LLM.
+    """
+    if not text:
+        return None
+    names = load_names()
+    words = re.findall(r"[^\W\d_]+", text)
+    cased = not text.isupper() and any(word[0].islower() for word in words)
+    for patterns, known_first in ((STRONG_PATTERNS, False), (NICKNAME_PATTERNS, False), (WEAK_PATTERNS, True)):
+        name = _match_name(patterns, text, names, cased, known_first)
+        if name:
+            return name
+    # "Juan", "Hola, Juan" o "Ana García": en un mensaje que es solo un nombre las mayúsculas son lo esperable
+    words = [word for word in words if _normalize(word) not in GREETINGS]
+    if words and len(words) <= MAX_NAME_WORDS:
+        name = _take_name(words, names, cased=not text.isupper(), known_first=True)
+        if name and len(name.split()) == len(words):
+            return name
+    return None
 
 
 @staticmethod
@@ -27,17 +206,39 @@ def request_name(inputs: Dict[str, str]) -> Dict[str, str]:
             - 'user_name': Nombre del usuario ingresado o identificado.
             - 'agent_outcome': La respuesta generada por el LLM. Si el nombre no se puede extraer, incluye un mensaje alternativo para solicitar el nombre nuevamente.
     Notas:
-        - La función verifica si ya existe un 'user_name' en los inputs. Si no está presente, se ejecuta un prompt para solicitar el nombre.
+        - La función verifica si ya existe un 'user_name' en los inputs. Si no está presente, primero intenta extraerlo
+          con reglas locales (`extract_name`) y solo si no lo logra ejecuta el prompt 'get_name'.
         - Si el prompt no logra obtener el nombre, se asigna un mensaje predeterminado en 'agent_outcome'.
+        - Los aciertos y fallos del camino rápido se cuentan en las métricas 'request_name.fast_path.hit' y 'request_name.fast_path.miss'.
+        - En modo degradado (circuito del LLM abierto) no se llama al LLM y se vuelve a pedir el nombre con la plantilla 'degraded_request_name'.
     """
     logger.debug("Entrando en el nodo 'request_name'.")
     if not inputs["user_name"]: # Si no tengo un nombre de usuario, entonces parseo la respuesta del usuario
-        CallChain.run(inputs, prompt_name="get_name", pydantic_object=Name)
-        if not inputs["agent_outcome"]["user_name"]: # Si no pude extraer el nombre de usuario, entonces es un no entendido
-            inputs["agent_outcome"] = "¡Uy, Perdoname pero no te entendí! ¿Me podés decir tu nombre?"
+        user_name = extract_name(inputs["input"]) if NAME_FAST_PATH else None
+        if user_name: # Si las reglas locales encontraron el nombre, no hace falta llamar al LLM
+            metrics.incr("request_name.fast_path.hit")
+            inputs["agent_outcome"] = {"user_name": user_name}
+            partial_state = {"get_name": inputs["agent_outcome"]}
+            if inputs.get("partial_states") is None:
+                inputs["partial_states"] = partial_state
+            else:
+                inputs["partial_states"].update(partial_state)
+            inputs["user_name"] = user_name
         else:
-            inputs["user_name"] = inputs["agent_outcome"]["user_name"].capitalize() # Si pude extraer un nombre, entonces lo guardo en el diccionario de 'inputs'
-        logger.debug(f"Respuesta del Nodo 'request_name': {inputs["agent_outcome"]}")
+            if NAME_FAST_PATH:
+                metrics.incr("request_name.fast_path.miss")
+            if not inputs.get("degraded"):
+                try:
+                    CallChain.run(inputs, prompt_name="get_name", pydantic_object=Name)
+                except CircuitOpen:
+                    inputs["degraded"] = True
+            if inputs.get("degraded"): # Si el LLM no está disponible, vuelvo a pedir el nombre en un formato que las reglas locales entiendan
+                inputs["agent_outcome"] = get_template("degraded_request_name")
+            elif not inputs["agent_outcome"]["user_name"]: # Si no pude extraer el nombre de usuario, entonces es un no entendido
+                inputs["agent_outcome"] = "¡Uy, Perdoname pero no te entendí! ¿Me podés decir tu nombre?"
+            else:
+                inputs["user_name"] = capitalize_name(inputs["agent_outcome"]["user_name"]) # Si pude extraer un nombre, entonces lo guardo en el diccionario de 'inputs'
+        payload_logger.debug("Respuesta del Nodo 'request_name': %s", inputs["agent_outcome"])
     else:
         logger.debug(f"El nodo 'request_name' no hizo nada.") # Si ya tengo un nombre de usuario, paso directamente al siguiente nodo
-    return inputs
\ No newline at end of file
+    return inputs
@@ -1,14 +1,19 @@
 import os
 from dotenv import load_dotenv
-from utils.logger import logger
+from utils.logger import logger, payload_logger
 import time
 from typing import Dict
-from utils.auxiliar_functions import get_prompt, get_model, parse_tokens, invoke_llm
+from utils.auxiliar_functions import (get_prompt, get_model, parse_tokens, invoke_llm, output_mode, structured_model,
+                                      STRUCTURED_OUTPUT_METHODS, CHAT_NAME_MODEL)
+from utils.deadline import check_deadline
+from utils.metrics import metrics
 
 # Cargo variables de ambiente
 load_dotenv()
 CHAT_TEMPERATURE = os.getenv('CHAT_TEMPERATURE')
 CHAT_SEED = os.getenv('CHAT_SEED')
+# Prompts que generan la respuesta final: se transmiten token a token si la solicitud lo pide (clave 'on_token')
+STREAMED_PROMPTS = ("personality", "personality_esp")
 
 
 @staticmethod
@@ -34,28 +39,67 @@ def run(inputs: Dict[str, str],
             Dict[str, str]: Diccionario 'inputs' actualizado con nuevas claves:
                 - 'agent_outcome': La respuesta generada por el modelo.
                 - 'partial_states': Un diccionario con actualizaciones de estado parcial para el prompt actual.
+            - 'llm_calls': Se agrega el modelo, el prompt, la latencia y los tokens de la llamada (incluidos los del prompt en caché) (ver `api.chat._to_usage`).
             
         Efectos Colaterales:
             - Actualiza las claves 'agent_outcome' y 'partial_states' en el diccionario `inputs`.
             - Registra en el log el tiempo de ejecución del prompt.
+
+        Excepciones:
+            DeadlineExceeded: Si la solicitud ya no tiene tiempo disponible (clave 'deadline' de `inputs`).
         
         Notas:
             - La función recupera el prompt basado en `prompt_name`, lo ejecuta a través de un modelo de lenguaje y procesa la salida del modelo.
             - La salida se parsea y se incorpora de vuelta en `inputs` bajo la clave 'agent_outcome'.
+            - Con 'pydantic_object', la salida se obtiene con la salida estructurada nativa del proveedor o con
+              `JsonOutputParser`, según la plantilla (ver `output_mode`); en ambos casos 'agent_outcome' es un diccionario.
+              Las llamadas, la latencia y los tokens del prompt de cada modo se registran en las métricas 'llm.output.<modo>.*'.
             - Se actualiza o inicializa la clave 'partial_states' en `inputs` si no está presente.
+            - El tiempo restante de la solicitud al empezar cada intento (después de la espera en el limitador) se usa
+              como timeout de la llamada al modelo.
+            - Si 'inputs' tiene la clave 'on_token' y el prompt está en 'STREAMED_PROMPTS', la respuesta se envía token
+              a token mientras se genera (ver `utils.token_stream`).
         """
         logger.debug("Entrando en la llamada al LLM.")
         start_time = time.time()
-        prompt, parser = get_prompt(inputs, prompt_name, pydantic_object)
-        model = get_model(model_type=model_type,temperature=temperature, seed=seed)
-        output, cb = invoke_llm(model, prompt, parser, inputs)
+        check_deadline(inputs, prompt_name)
+        mode = output_mode(prompt_name, pydantic_object)
+        prompt, parser = get_prompt(inputs, prompt_name, pydantic_object, mode)
+        stream_handler = None
+        if inputs.get("on_token") and prompt_name in STREAMED_PROMPTS:
+            from utils.token_stream import TokenStreamHandler
+            stream_handler = TokenStreamHandler(inputs["on_token"])
+
+        def model(timeout):
+            # Se crea en cada intento, con el tiempo que le queda a la solicitud al conseguir lugar en el limitador
+            llm = get_model(model_type=model_type, temperature=temperature, seed=seed, timeout=timeout, streaming=stream_handler is not None)
+            return structured_model(llm, pydantic_object, mode)
+
+        call_start = time.time()
+        output, cb = invoke_llm(model, prompt, parser, inputs, prompt_name=prompt_name, mode=mode, stream_handler=stream_handler)
+        latency = time.time() - call_start
         parse_tokens(inputs, cb)
-        inputs["agent_outcome"] = output if parser else output.content
+        metrics.incr(f"llm.output.{mode}.calls")
+        metrics.observe(f"llm.output.{mode}.latency_seconds", latency)
+        metrics.observe(f"llm.output.{mode}.prompt_tokens", cb.prompt_tokens)
+        inputs.setdefault("llm_calls", []).append({
+            "model": CHAT_NAME_MODEL or model_type,
+            "prompt_name": prompt_name,
+            "latency_ms": int(latency * 1000),
+            "prompt_tokens": cb.prompt_tokens,
+            "completion_tokens": cb.completion_tokens,
+            "total_tokens": cb.total_tokens,
+            "cached_tokens": getattr(cb, "prompt_tokens_cached", 0) or 0,
+        })
+        if mode in STRUCTURED_OUTPUT_METHODS:
+            inputs["agent_outcome"] = output.model_dump()
+        else:
+            inputs["agent_outcome"] = output if parser else output.content
         partial_state = {prompt_name: inputs["agent_outcome"]}
         if (inputs.get('partial_states') is None):
             inputs["partial_states"] = partial_state
         else:
             inputs["partial_states"].update(partial_state)
-        logger.info(f"LLamada al LLM con el prompt: '{prompt_name}' ejecutada en {round(time.time() - start_time, 2)} segundos.")
-        logger.debug(f"Respuesta del LLM: '{inputs["agent_outcome"]}'")
+        logger.info("LLamada al LLM con el prompt: '%s' ejecutada en %.2f segundos.", prompt_name, time.time() - start_time)
+        payload_logger.debug("Respuesta del LLM: '%s'", inputs["agent_outcome"])
         return inputs
\ No newline at end of file
@@ -1,8 +1,25 @@
+import os
+from dotenv import load_dotenv
+import json
+import queue
+import threading
 import time
-from fastapi import APIRouter
-from api.chat import get_answer
-from models.dataclasses import ChatRequest, ChatResponse
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, WebSocket, status
+from fastapi.responses import StreamingResponse
+from api.chat import get_answer, get_answers, ForeignSession, BATCH_MAX_CONCURRENCY
+from api.websocket import ChatConnection
+from db.vdb.registry import UnknownCorpus
+from models.dataclasses import ChatRequest, ChatResponse, BatchChatRequest
+from utils.deadline import new_deadline
+from utils.limiter import Overloaded, llm_limiter
 from utils.logger import logger
+from utils.profiling import profiler
+from utils.quotas import quotas, QuotaExceeded
+from utils.security import ApiClient, verify_api_key, verify_websocket
+from utils.startup import readiness
+
+load_dotenv()
 
 """
 Ruta para el manejo de interacciones de chat.
@@ -17,10 +34,33 @@ Atributos:
 Rutas:
     - /chat (POST): Endpoint que procesa una solicitud de chat. Recibe un objeto de tipo 
       `ChatRequest` y devuelve un `ChatResponse`.
+    - /stream (POST): Como /chat, pero devuelve la respuesta token a token en líneas JSON (NDJSON) a medida que
+      se genera. Es el endpoint que usa el front-end (FASTAPI_STREAM_URL).
+    - /batch (POST): Endpoint que procesa muchas solicitudes de chat. Recibe un `BatchChatRequest` y
+      devuelve una línea JSON (NDJSON) por solicitud, a medida que se van respondiendo.
+    - /ws (WebSocket): Conversación por una conexión persistente, con la respuesta token a token y varias
+      sesiones por conexión (ver `api.websocket`).
 
 Funciones:
+    batch(req: BatchChatRequest): Procesa el lote con `get_answers` y devuelve las respuestas en formato NDJSON,
+    cada una con la clave 'index' (posición de la solicitud en el lote).
+    stream(req: ChatRequest): Procesa la interacción con `get_answer` (con los mismos encabezados que `interact`) en
+    un hilo aparte y envía cada parte de la respuesta como {"type": "token", "content": ...}, {"type": "reset"} si la
+    respuesta vuelve a empezar, y al final {"type": "end", "respuesta": ..., "session_id": ...}. Los rechazos que se
+    conocen antes de empezar (servicio saturado o iniciándose, cuota superada) responden con el código HTTP, igual
+    que `interact`; los que ocurren después llegan como {"type": "error", "status": ..., "detail": ...}.
+    chat_ws(websocket: WebSocket): Autentica la conexión una sola vez (ver `verify_websocket`) y la atiende con
+    `ChatConnection`. Si la clave no es válida, cierra la conexión con el código 1008.
     interact(req: ChatRequest): Procesa las interraciones con el LLM utilizando la función `get_answer` 
-    y registra el tiempo de procesamiento. Devuelve la respuesta del chat.
+    y registra el tiempo de procesamiento. Devuelve la respuesta del chat. Si el servicio está saturado
+    (o todavía se está inicializando) responde de inmediato con un 503 y el encabezado 'Retry-After'. Cada interacción tiene un plazo
+    total de 'REQUEST_TIMEOUT' segundos que se propaga a todas las llamadas al LLM. El encabezado opcional
+    'Idempotency-Key' permite reenviar una solicitud y recibir la misma respuesta sin volver a procesarla.
+    El encabezado opcional 'X-Corpus' elige la base de conocimiento (ver `db.vdb.registry`); si no se envía se
+    usa la de la sesión. Un corpus inexistente responde 404. Una sesión creada por otro cliente de la API responde 403.
+    El encabezado opcional 'X-Profile' pide perfilar la interacción (ver `utils.profiling`).
+    Cada clave de la API es un cliente con cuotas de solicitudes y de tokens (ver `utils.quotas`); al superarlas
+    se responde con un 429 y el encabezado 'Retry-After'. Las preguntas de un lote cuentan como solicitudes.
     
 Parámetros:
     req (ChatRequest): El objeto de solicitud que contiene los datos del chat.
@@ -29,11 +69,139 @@ Retorno:
     ChatResponse: La respuesta procesada del chat.
 """
 
+BATCH_MAX_SIZE = int(os.getenv('BATCH_MAX_SIZE', '1000'))
+
 router_chat = APIRouter(prefix="/chat")
 
+
+def quota_exceeded(e: QuotaExceeded) -> HTTPException:
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+
 @router_chat.post("/chat", response_model=ChatResponse)
-def interact(req: ChatRequest):
+def interact(req: ChatRequest,
+             idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+             corpus: Optional[str] = Header(default=None, alias="X-Corpus"),
+             profile: Optional[str] = Header(default=None, alias="X-Profile"),
+             client: ApiClient = Depends(verify_api_key)):
+    start_time = time.time()
+    try:
+        readiness.check()
+        quotas.admit(client)
+        with profiler.maybe_profile(profile, key=req.session_id) as run:
+            res = get_answer(req, deadline=new_deadline(), idempotency_key=idempotency_key, corpus=corpus, client=client)
+            run.key = res.session_id
+    except UnknownCorpus as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ForeignSession as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except QuotaExceeded as e:
+        raise quota_exceeded(e)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio saturado, por favor reintentá en unos segundos.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    logger.info("Interacción con ID '%s' procesada en %.2f segundos.", res.session_id, time.time() - start_time)
+    return res
+
+
+@router_chat.post("/stream")
+def stream(req: ChatRequest,
+           idempotency_key: Optional[str] = Header(default=None, alias="Idempotency-Key"),
+           corpus: Optional[str] = Header(default=None, alias="X-Corpus"),
+           client: ApiClient = Depends(verify_api_key)):
+    start_time = time.time()
+    try:
+        readiness.check()
+        quotas.admit(client)
+        llm_limiter.check_admission()
+    except QuotaExceeded as e:
+        raise quota_exceeded(e)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio saturado, por favor reintentá en unos segundos.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    events = queue.Queue()
+    deadline = new_deadline()
+
+    def on_token(token) -> None:
+        events.put({"type": "token", "content": token} if token is not None else {"type": "reset"})
+
+    def answer() -> None:
+        try:
+            res = get_answer(req, deadline=deadline, idempotency_key=idempotency_key, corpus=corpus, client=client,
+                             on_token=on_token)
+            events.put({"type": "end", "respuesta": res.respuesta, "session_id": str(res.session_id)})
+            logger.info("Interacción con ID '%s' procesada en %.2f segundos.", res.session_id, time.time() - start_time)
+        except UnknownCorpus as e:
+            events.put({"type": "error", "status": 404, "detail": str(e)})
+        except ForeignSession as e:
+            events.put({"type": "error", "status": 403, "detail": str(e)})
+        except QuotaExceeded as e:
+            events.put({"type": "error", "status": 429, "detail": str(e), "retry_after": e.retry_after})
+        except Overloaded as e:
+            events.put({"type": "error", "status": 503, "retry_after": e.retry_after,
+                        "detail": "Servicio saturado, por favor reintentá en unos segundos."})
+        except Exception as e:
+            logger.error("Error al procesar la interacción por streaming: %s", e)
+            events.put({"type": "error", "status": 500, "detail": "Error interno del servidor."})
+        finally:
+            events.put(None)
+
+    threading.Thread(target=answer, name="chat-stream", daemon=True).start()
+
+    def ndjson():
+        while (event := events.get()) is not None:
+            yield json.dumps(event, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router_chat.post("/batch")
+def batch(req: BatchChatRequest, corpus: Optional[str] = Header(default=None, alias="X-Corpus"),
+          client: ApiClient = Depends(verify_api_key)):
     start_time = time.time()
-    res = get_answer(req)
-    logger.info(f"Interacción con ID '{res.session_id}' procesada en {round(time.time() - start_time, 2)} segundos.")
-    return res
\ No newline at end of file
+    if len(req.requests) > BATCH_MAX_SIZE:
+        raise HTTPException(
+            status_code=413,
+            detail=f"El lote supera el máximo de {BATCH_MAX_SIZE} solicitudes."
+        )
+    try:
+        readiness.check()
+        quotas.admit(client, requests=len(req.requests))
+        results = get_answers(req.requests, max_concurrency=req.max_concurrency or BATCH_MAX_CONCURRENCY, corpus=corpus,
+                              client=client)
+    except UnknownCorpus as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ForeignSession as e:
+        raise HTTPException(status_code=403, detail=str(e))
+    except QuotaExceeded as e:
+        raise quota_exceeded(e)
+    except Overloaded as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Servicio saturado, por favor reintentá en unos segundos.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+    def ndjson():
+        for index, res in results:
+            yield json.dumps({"index": index, **res.model_dump(mode="json")}, ensure_ascii=False) + "\n"
+        logger.info("Lote de %s interacciones procesado en %.2f segundos.", len(req.requests), time.time() - start_time)
+
+    return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+
+
+@router_chat.websocket("/ws")
+async def chat_ws(websocket: WebSocket):
+    await websocket.accept()
+    client = await verify_websocket(websocket)
+    if client is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION, reason="Acceso denegado")
+        return
+    await websocket.send_json({"type": "ready", "client": client.name})
+    await ChatConnection(websocket, client).serve()
@@ -0,0 +1,51 @@
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from utils.profiling import profiler, memory_snapshot
+from utils.security import verify_api_key
+
+"""
+Rutas de diagnóstico: perfiles de solicitudes y uso de memoria (ver `utils.profiling`).
+
+Todas responden 404 salvo que 'PROFILING_ENABLED' sea 'true'.
+
+Atributos:
+    router_debug (APIRouter): La ruta configurada con el prefijo "/debug".
+
+Rutas:
+    - /debug/profiles (GET): Lista los perfiles guardados, del más nuevo al más viejo (opcionalmente, solo los
+      de una sesión con 'session_id').
+    - /debug/profiles/{session_id}/{name} (GET): Descarga un perfil (HTML de pyinstrument, pstats de cProfile,
+      o el resumen '.txt').
+    - /debug/memory (GET): Instantánea de tracemalloc con las ubicaciones que más memoria asignaron y las que
+      más crecieron desde la llamada anterior. Responde 409 si el seguimiento de memoria no está activo.
+"""
+
+
+def require_profiling():
+    if not profiler.enabled:
+        raise HTTPException(status_code=404, detail="Not Found")
+
+
+router_debug = APIRouter(prefix="/debug", dependencies=[Depends(verify_api_key), Depends(require_profiling)])
+
+@router_debug.get("/profiles")
+def list_profiles(session_id: Optional[str] = None) -> list:
+    return profiler.list(session_id)
+
+
+@router_debug.get("/profiles/{session_id}/{name}")
+def get_profile(session_id: str, name: str) -> FileResponse:
+    path = profiler.path(session_id, name)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Perfil inexistente.")
+    media_type = "text/html" if name.endswith(".html") else "text/plain" if name.endswith(".txt") else "application/octet-stream"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+
+@router_debug.get("/memory")
+def get_memory(limit: int = 20, group_by: Literal["lineno", "filename", "traceback"] = "lineno") -> dict:
+    try:
+        return memory_snapshot(limit, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
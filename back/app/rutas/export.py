@@ -0,0 +1,33 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from api.export import export, MEDIA_TYPES
+from utils.security import verify_api_key
+
+"""
+Ruta para la exportación de conversaciones.
+
+Atributos:
+    router_export (APIRouter): La ruta configurada con el prefijo "/export".
+
+Rutas:
+    - /export (GET): Devuelve los mensajes con los datos de su sesión, en NDJSON o CSV, por streaming
+      (ver `api.export`). Se puede filtrar por rango de fechas ('start' incluido, 'end' excluido) y por
+      sesión. Las columnas 'tokens_used' y 'state' solo se incluyen con 'include_state=true'.
+"""
+
+router_export = APIRouter(prefix="/export", dependencies=[Depends(verify_api_key)])
+
+@router_export.get("")
+def export_conversations(format: Literal["ndjson", "csv"] = "ndjson",
+                         start: Optional[datetime] = None,
+                         end: Optional[datetime] = None,
+                         session_id: Optional[str] = None,
+                         include_state: bool = False) -> StreamingResponse:
+    content = export(format, start=start, end=end, session_id=session_id, include_state=include_state)
+    return StreamingResponse(
+        content,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="conversaciones.{format}"'}
+    )
@@ -0,0 +1,25 @@
+from fastapi import APIRouter, Depends
+from utils.metrics import metrics
+from utils.security import verify_api_key
+
+"""
+Ruta para la exposición de métricas internas del servicio.
+
+Atributos:
+    router_metrics (APIRouter): La ruta configurada con el prefijo "/metrics".
+
+Rutas:
+    - /metrics (GET): Devuelve una copia de las métricas en memoria del proceso, junto con
+      la tasa de acierto del camino rápido de extracción de nombres.
+"""
+
+router_metrics = APIRouter(prefix="/metrics", dependencies=[Depends(verify_api_key)])
+
+@router_metrics.get("")
+def get_metrics() -> dict:
+    snapshot = metrics.snapshot()
+    snapshot["request_name_fast_path_hit_rate"] = metrics.ratio(
+        "request_name.fast_path.hit",
+        "request_name.fast_path.miss"
+    )
+    return snapshot
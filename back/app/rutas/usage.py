@@ -0,0 +1,58 @@
+from datetime import datetime
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends
+from db.orm.orm import db_engine
+from utils.security import verify_api_key
+
+"""
+Ruta para los reportes de uso (tokens y latencia de las llamadas al LLM).
+
+Atributos:
+    router_usage (APIRouter): La ruta configurada con el prefijo "/usage".
+
+Rutas:
+    - /usage (GET): Devuelve los totales por intervalo ('hour' o 'day', en UTC), modelo y prompt, junto con
+      el total del período. Lee solo las tablas de totales ('usage_hourly' / 'usage_daily'), que se recalculan
+      periódicamente desde la tabla 'usage' (ver `db.orm.maintenance`), así que el costo no depende de la cantidad
+      de mensajes y las llamadas de los últimos 'USAGE_ROLLUP_INTERVAL' segundos pueden no estar incluidas todavía.
+    - /usage/prompts (GET): Resumen por prompt del período: llamadas, latencia media y máxima, tokens y
+      proporción de tokens del prompt leídos de la caché de prefijos del proveedor ('cache_hit_ratio').
+"""
+
+TOKEN_COLUMNS = ("calls", "prompt_tokens", "completion_tokens", "total_tokens", "cached_tokens")
+
+
+def _cache_hit_ratio(totals: dict) -> float:
+    return round(totals["cached_tokens"] / totals["prompt_tokens"], 4) if totals["prompt_tokens"] else 0.0
+
+router_usage = APIRouter(prefix="/usage", dependencies=[Depends(verify_api_key)])
+
+@router_usage.get("")
+def get_usage(granularity: Literal["hour", "day"] = "hour",
+              start: Optional[datetime] = None,
+              end: Optional[datetime] = None,
+              model: Optional[str] = None,
+              prompt_name: Optional[str] = None) -> dict:
+    buckets = db_engine.get_usage(granularity, start=start, end=end, model=model, prompt_name=prompt_name)
+    totals = {name: sum(bucket[name] for bucket in buckets) for name in TOKEN_COLUMNS}
+    totals["cache_hit_ratio"] = _cache_hit_ratio(totals)
+    return {"granularity": granularity, "totals": totals, "buckets": buckets}
+
+
+@router_usage.get("/prompts")
+def get_prompt_report(start: Optional[datetime] = None,
+                      end: Optional[datetime] = None,
+                      model: Optional[str] = None) -> list:
+    prompts = {}
+    for bucket in db_engine.get_usage("day", start=start, end=end, model=model):
+        report = prompts.setdefault(bucket["prompt_name"], {
+            "prompt_name": bucket["prompt_name"], **{name: 0 for name in TOKEN_COLUMNS}, "latency_ms_sum": 0, "latency_ms_max": 0
+        })
+        for name in TOKEN_COLUMNS:
+            report[name] += bucket[name]
+        report["latency_ms_sum"] += (bucket["latency_ms_avg"] or 0) * bucket["calls"]
+        report["latency_ms_max"] = max(report["latency_ms_max"], bucket["latency_ms_max"])
+    for report in prompts.values():
+        report["latency_ms_avg"] = round(report.pop("latency_ms_sum") / report["calls"], 1) if report["calls"] else None
+        report["cache_hit_ratio"] = _cache_hit_ratio(report)
+    return sorted(prompts.values(), key=lambda report: report["calls"], reverse=True)
@@ -0,0 +1,21 @@
+import argparse
+import os
+
+"""
+Levanta el simulador de OpenAI (ver `simulator.server`).
+
+Uso (desde back/app):
+    python -m simulator --port 8100 --config simulator/scenarios/tail_latency.json
+"""
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulador local compatible con la API de OpenAI.")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--config", help="Escenario JSON (por defecto, 'SIMULATOR_CONFIG').")
+    args = parser.parse_args()
+    if args.config:
+        # Se define antes de importar el servidor, que lee el escenario al cargarse
+        os.environ["SIMULATOR_CONFIG"] = args.config
+    import uvicorn
+    uvicorn.run("simulator.server:app", host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,186 @@
+import base64
+import hashlib
+import json
+import math
+import re
+import struct
+from functools import lru_cache
+from typing import Optional
+
+"""
+Generación determinista de las respuestas del simulador.
+
+Cada solicitud de chat se asocia a una plantilla de 'PATH_TEMPLATES' comparando el texto de los mensajes con
+la plantilla (las partes fijas tienen que coincidir y las variables, por ejemplo '{input}', capturan el resto).
+Así el simulador conoce el 'prompt_name' y los valores con los que se formateó, y responde algo coherente con
+el flujo de nodos:
+    - get_name: {"user_name": ...} con la última palabra con mayúscula del mensaje (o null).
+    - get_language: {"language": "español", "translate": <el mensaje>}.
+    - call_rag: la primera oración de la información recuperada.
+    - personality / personality_esp: la respuesta que recibió para reformular.
+Las respuestas fijas de un escenario ('scripts') tienen prioridad (ver `simulator.server`).
+
+Los embeddings se calculan con feature hashing de las palabras (textos con palabras en común quedan cerca),
+así que el RAG sobre un índice creado con el simulador devuelve fragmentos razonables.
+"""
+
+# Variables ('{input}') y llaves escapadas ('{{' y '}}', que en el prompt formateado quedan simples)
+_VARIABLE = re.compile(r"\{\{|\}\}|\{(\w+)\}")
+
+
+def compile_template(template: str) -> re.Pattern:
+    """
+    Convierte una plantilla de prompt en una expresión regular que captura sus variables.
+    """
+    parts = []
+    position = 0
+    seen = set()
+    for match in _VARIABLE.finditer(template):
+        parts.append(re.escape(template[position:match.start()]))
+        position = match.end()
+        name = match.group(1)
+        if name is None:
+            parts.append(re.escape(match.group(0)[0]))
+            continue
+        parts.append(f"(?P={name})" if name in seen else f"(?P<{name}>.*?)")
+        seen.add(name)
+    parts.append(re.escape(template[position:]))
+    # La plantilla termina el texto (el mensaje del usuario es el último); así la última variable no queda vacía
+    parts.append(r"\s*\Z")
+    return re.compile("".join(parts), re.DOTALL)
+
+
+@lru_cache(maxsize=1)
+def load_patterns(path_templates: str) -> tuple:
+    try:
+        with open(path_templates, "r", encoding="utf-8") as file:
+            templates = json.load(file)
+    except (OSError, TypeError, ValueError):
+        return ()
+    # Las plantillas más largas primero: son las más específicas
+    # Las plantillas con partes 'system' y 'user' llegan como dos mensajes (ver `server._message_text`),
+    # con las instrucciones de 'system_structured' si el prompt usa salida estructurada
+    variants = []
+    for name, template in templates.items():
+        if isinstance(template, str):
+            variants.append((name, template))
+            continue
+        for system in {template["system"], template.get("system_structured", template["system"])}:
+            variants.append((name, f"{system}\n\n{template['user']}"))
+    return tuple(
+        (name, compile_template(template))
+        for name, template in sorted(variants, key=lambda item: len(item[1]), reverse=True)
+    )
+
+
+def identify_prompt(text: str, path_templates: str) -> tuple:
+    """
+    Devuelve ('prompt_name', variables) de la plantilla que generó 'text', o (None, {}) si ninguna coincide.
+    La plantilla puede estar precedida por otro texto (por ejemplo, mensajes anteriores), pero tiene que terminarlo.
+    """
+    for name, pattern in load_patterns(path_templates):
+        match = pattern.search(text)
+        if match:
+            return name, match.groupdict()
+    return None, {}
+
+
+def default_response(prompt_name: Optional[str], variables: dict, text: str):
+    """
+    Respuesta por defecto para un prompt: un diccionario para los prompts con salida JSON o un texto.
+    """
+    if prompt_name == "get_name":
+        words = re.findall(r"[^\W\d_]{2,}", variables.get("input", ""))
+        capitalized = [w for w in words if w[0].isupper()]
+        return {"user_name": capitalized[-1] if capitalized else None}
+    if prompt_name == "get_language":
+        return {"language": "español", "translate": variables.get("input", "").strip()}
+    if prompt_name == "call_rag":
+        rag = variables.get("rag", "").strip()
+        return (re.split(r"(?<=[.!?])\s", rag, maxsplit=1)[0] if rag else "No encontré información sobre eso.")
+    if prompt_name in ("personality", "personality_esp"):
+        return variables.get("agent_outcome", "").strip() or "¡Listo!"
+    digest = hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]
+    return f"Respuesta simulada {digest}."
+
+
+def from_schema(schema: dict, hint=None, definitions: Optional[dict] = None):
+    """
+    Genera un valor que cumple el JSON Schema 'schema', usando los valores de 'hint' (por ejemplo, la respuesta
+    por defecto del prompt) para las propiedades con el mismo nombre.
+    """
+    definitions = definitions if definitions is not None else schema.get("$defs", schema.get("definitions", {}))
+    if "$ref" in schema:
+        return from_schema(definitions.get(schema["$ref"].split("/")[-1], {}), hint, definitions)
+    for key in ("anyOf", "oneOf", "allOf"):
+        if key in schema:
+            options = [option for option in schema[key] if option.get("type") != "null"] or schema[key]
+            return from_schema(options[0], hint, definitions)
+    if "enum" in schema:
+        return hint if hint in schema["enum"] else schema["enum"][0]
+    kind = schema.get("type", "object")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object":
+        hint = hint if isinstance(hint, dict) else {}
+        return {
+            name: hint[name] if name in hint else from_schema(prop, None, definitions)
+            for name, prop in schema.get("properties", {}).items()
+        }
+    if kind == "array":
+        return hint if isinstance(hint, list) else [from_schema(schema.get("items", {}), None, definitions)]
+    if kind == "string":
+        return hint if isinstance(hint, str) else schema.get("default", "texto")
+    if kind == "integer":
+        return hint if isinstance(hint, int) else 0
+    if kind == "number":
+        return hint if isinstance(hint, (int, float)) else 0.0
+    if kind == "boolean":
+        return hint if isinstance(hint, bool) else False
+    return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    Cuenta los tokens con tiktoken (si está instalado) o con una aproximación de 4 caracteres por token.
+    """
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+@lru_cache(maxsize=1)
+def _encoding():
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def split_tokens(text: str) -> list:
+    """
+    Divide un texto en partes del tamaño de un token (aproximado) para el streaming.
+    """
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+def embed(value, dimensions: int) -> list:
+    """
+    Embedding determinista y normalizado de un texto (o de una lista de tokens) por feature hashing.
+    """
+    words = re.findall(r"\w+", value.lower()) if isinstance(value, str) else [str(token) for token in value]
+    vector = [0.0] * dimensions
+    for word in words or [""]:
+        digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+        index, sign = struct.unpack("<IxxxB", digest)
+        vector[index % dimensions] += 1.0 if sign & 1 else -1.0
+    norm = math.sqrt(sum(x * x for x in vector)) or 1.0
+    return [x / norm for x in vector]
+
+
+def encode_embedding(vector: list, encoding_format: str):
+    if encoding_format == "base64":
+        return base64.b64encode(struct.pack(f"<{len(vector)}f", *vector)).decode("ascii")
+    return vector
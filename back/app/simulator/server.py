@@ -0,0 +1,330 @@
+import os
+from dotenv import load_dotenv
+import asyncio
+import hashlib
+import json
+import math
+import random
+import time
+import uuid
+from collections import Counter
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from simulator.responses import (identify_prompt, default_response, from_schema, count_tokens, split_tokens,
+                                 embed, encode_embedding)
+
+load_dotenv()
+# Escenario en JSON (ver 'simulator/scenarios/default.json'); sin archivo se usan los valores por defecto
+SIMULATOR_CONFIG = os.getenv('SIMULATOR_CONFIG', 'simulator/scenarios/default.json')
+PATH_TEMPLATES = os.getenv('PATH_TEMPLATES', 'docs/prompts.json')
+
+"""
+Simulador local compatible con la API de OpenAI, para pruebas de carga y de regresión sin el proveedor real.
+
+Implementa:
+    - POST /v1/chat/completions: respuestas completas o por streaming (SSE), con salida JSON según
+      'response_format' (json_object / json_schema) o con 'tools' (llamadas a funciones), y el uso de tokens
+      (incluidos los tokens de prompt en caché, ver 'prompt_cache').
+    - POST /v1/embeddings: embeddings deterministas (listas de floats o base64).
+    - GET /v1/models.
+    - GET /_simulator/stats y POST /_simulator/reset: contadores del simulador.
+
+El comportamiento se define en un escenario JSON ('SIMULATOR_CONFIG'):
+    - seed: semilla de las latencias y los errores (mismas solicitudes en el mismo orden, mismos resultados).
+    - latency.chat / latency.embeddings: distribución de la latencia hasta el primer token; 'distribution' es
+      'fixed' (value_ms), 'uniform' (min_ms, max_ms), 'normal' (mean_ms, std_ms), 'lognormal' (median_ms, sigma)
+      o 'exponential' (mean_ms). latency.per_token_ms: tiempo por token generado.
+    - errors: proporción de respuestas 429 ('rate_limit', con 'retry_after' segundos) y 500 ('server_error');
+      'by_prompt' define proporciones distintas por 'prompt_name'.
+    - scripts: respuestas fijas por 'prompt_name' (texto u objeto JSON), que se usan en orden y en ciclo.
+    - prompt_cache: simula el caché de prompts del proveedor: a partir de 'min_tokens', los bloques de
+      'block_tokens' tokens del comienzo del prompt ya vistos se informan como 'cached_tokens'.
+
+La aplicación usa el simulador con 'OPENAI_BASE_URL' (por ejemplo, http://localhost:8100/v1), cualquier
+valor en 'OPENAI_API_KEY' y 'EMBEDDING_CHECK_CTX_LENGTH=false' (los embeddings se piden con texto, no con tokens).
+
+Uso (desde back/app):
+    python -m simulator --port 8100 --config simulator/scenarios/default.json
+"""
+
+DEFAULT_CONFIG = {
+    "seed": 42,
+    "latency": {
+        "chat": {"distribution": "lognormal", "median_ms": 600, "sigma": 0.4},
+        "embeddings": {"distribution": "lognormal", "median_ms": 60, "sigma": 0.3},
+        "per_token_ms": 8,
+    },
+    "errors": {"rate_limit": 0.0, "server_error": 0.0, "retry_after": 1, "by_prompt": {}},
+    "embedding_dimensions": 1536,
+    "prompt_cache": {"enabled": True, "min_tokens": 1024, "block_tokens": 128},
+    "scripts": {},
+}
+
+
+def load_config(path: str = SIMULATOR_CONFIG) -> dict:
+    config = json.loads(json.dumps(DEFAULT_CONFIG))
+    if path and os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as file:
+            custom = json.load(file)
+        for key, value in custom.items():
+            if isinstance(value, dict) and isinstance(config.get(key), dict):
+                config[key].update(value)
+            else:
+                config[key] = value
+    return config
+
+
+class Simulator:
+    """
+    Estado del simulador: escenario, generador de números aleatorios, posición de los scripts,
+    prefijos de prompts vistos y contadores.
+    """
+    def __init__(self, config: dict):
+        self.config = config
+        self.reset()
+
+    def reset(self) -> None:
+        self.random = random.Random(self.config.get("seed"))
+        self.script_positions = Counter()
+        self.cached_prefixes = set()
+        self.stats = Counter()
+        self.started_at = time.time()
+
+    def latency(self, kind: str) -> float:
+        """
+        Devuelve una latencia en segundos según la distribución 'latency.<kind>' del escenario.
+        """
+        spec = self.config["latency"].get(kind) or {"distribution": "fixed", "value_ms": 0}
+        distribution = spec.get("distribution", "fixed")
+        if distribution == "uniform":
+            ms = self.random.uniform(spec["min_ms"], spec["max_ms"])
+        elif distribution == "normal":
+            ms = self.random.gauss(spec["mean_ms"], spec["std_ms"])
+        elif distribution == "lognormal":
+            ms = self.random.lognormvariate(math.log(spec["median_ms"]), spec["sigma"])
+        elif distribution == "exponential":
+            ms = self.random.expovariate(1 / spec["mean_ms"])
+        else:
+            ms = spec.get("value_ms", 0)
+        return max(0.0, ms) / 1000
+
+    def injected_error(self, prompt_name: str):
+        """
+        Decide si la solicitud falla. Devuelve una JSONResponse con el error o None.
+        """
+        errors = {**self.config["errors"], **self.config["errors"].get("by_prompt", {}).get(prompt_name or "", {})}
+        draw = self.random.random()
+        if draw < errors.get("rate_limit", 0):
+            self.stats["errors.429"] += 1
+            return JSONResponse(
+                status_code=429,
+                headers={"retry-after": str(errors.get("retry_after", 1))},
+                content={"error": {"message": "Rate limit reached (simulador).", "type": "requests", "code": "rate_limit_exceeded"}}
+            )
+        if draw < errors.get("rate_limit", 0) + errors.get("server_error", 0):
+            self.stats["errors.500"] += 1
+            return JSONResponse(
+                status_code=500,
+                content={"error": {"message": "Internal server error (simulador).", "type": "server_error", "code": None}}
+            )
+        return None
+
+    def scripted(self, prompt_name: str):
+        responses = self.config["scripts"].get(prompt_name or "")
+        if not responses:
+            return None
+        position = self.script_positions[prompt_name]
+        self.script_positions[prompt_name] += 1
+        return responses[position % len(responses)]
+
+    def cached_tokens(self, text: str, prompt_tokens: int) -> int:
+        """
+        Simula el caché de prompts: cuenta los bloques del comienzo del prompt que ya se vieron antes.
+        Los bloques se miden en caracteres (4 por token).
+        """
+        cache = self.config["prompt_cache"]
+        if not cache.get("enabled") or prompt_tokens < cache["min_tokens"]:
+            return 0
+        block = cache["block_tokens"] * 4
+        cached = 0
+        for end in range(cache["min_tokens"] * 4, len(text) + 1, block):
+            digest = hashlib.sha1(text[:end].encode("utf-8")).digest()
+            if digest in self.cached_prefixes:
+                cached = end // 4
+            else:
+                self.cached_prefixes.add(digest)
+        return min(cached, prompt_tokens)
+
+
+def _message_text(messages: list) -> str:
+    texts = []
+    for message in messages:
+        content = message.get("content") or ""
+        if isinstance(content, list):
+            content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+        texts.append(content)
+    return "\n\n".join(texts)
+
+
+def _usage(prompt_tokens: int, completion_tokens: int, cached_tokens: int) -> dict:
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+        "prompt_tokens_details": {"cached_tokens": cached_tokens},
+    }
+
+
+def _build_output(body: dict, prompt_name: str, answer) -> tuple:
+    """
+    Devuelve (content, tool_calls) según el formato pedido: llamada a una función si hay 'tools',
+    JSON si 'response_format' lo pide o si la respuesta es un objeto, y texto en otro caso.
+    """
+    tools = body.get("tools") or []
+    tool_choice = body.get("tool_choice", "auto")
+    if tools and tool_choice != "none":
+        tool = tools[0]
+        if isinstance(tool_choice, dict):
+            name = tool_choice.get("function", {}).get("name")
+            tool = next((t for t in tools if t.get("function", {}).get("name") == name), tool)
+        function = tool.get("function", {})
+        arguments = from_schema(function.get("parameters", {}), answer)
+        return None, [{
+            "id": f"call_{uuid.uuid4().hex[:24]}",
+            "type": "function",
+            "function": {"name": function.get("name"), "arguments": json.dumps(arguments, ensure_ascii=False)},
+        }]
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        return json.dumps(from_schema(schema, answer), ensure_ascii=False), None
+    if response_format.get("type") == "json_object" and not isinstance(answer, dict):
+        return json.dumps({"respuesta": answer}, ensure_ascii=False), None
+    if isinstance(answer, (dict, list)):
+        return json.dumps(answer, ensure_ascii=False), None
+    return str(answer), None
+
+
+simulator = Simulator(load_config())
+app = FastAPI(title="Simulador OpenAI")
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    text = _message_text(body.get("messages", []))
+    prompt_name, variables = identify_prompt(text, PATH_TEMPLATES)
+    simulator.stats[f"chat.{prompt_name or 'desconocido'}"] += 1
+    first_token = simulator.latency("chat")
+    error = simulator.injected_error(prompt_name)
+    if error is not None:
+        await asyncio.sleep(first_token / 4)
+        return error
+
+    answer = simulator.scripted(prompt_name)
+    if answer is None:
+        answer = default_response(prompt_name, variables, text)
+    content, tool_calls = _build_output(body, prompt_name, answer)
+    prompt_tokens = count_tokens(text)
+    generated = content if content is not None else tool_calls[0]["function"]["arguments"]
+    completion_tokens = count_tokens(generated)
+    usage = _usage(prompt_tokens, completion_tokens, simulator.cached_tokens(text, prompt_tokens))
+    simulator.stats["tokens.prompt"] += prompt_tokens
+    simulator.stats["tokens.completion"] += completion_tokens
+    simulator.stats["tokens.cached"] += usage["prompt_tokens_details"]["cached_tokens"]
+    per_token = simulator.config["latency"].get("per_token_ms", 0) / 1000
+    completion_id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+    model = body.get("model") or "simulador"
+    finish_reason = "tool_calls" if tool_calls else "stop"
+
+    if not body.get("stream"):
+        await asyncio.sleep(first_token + per_token * completion_tokens)
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "system_fingerprint": "fp_simulador",
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": content, **({"tool_calls": tool_calls} if tool_calls else {})},
+                "logprobs": None,
+                "finish_reason": finish_reason,
+            }],
+            "usage": usage,
+        }
+
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def chunk(delta: dict, finish=None, chunk_usage=None) -> str:
+        data = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "system_fingerprint": "fp_simulador",
+            "choices": [] if chunk_usage else [{"index": 0, "delta": delta, "logprobs": None, "finish_reason": finish}],
+        }
+        if chunk_usage:
+            data["usage"] = chunk_usage
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def events():
+        await asyncio.sleep(first_token)
+        yield chunk({"role": "assistant", "content": ""})
+        if tool_calls:
+            call = tool_calls[0]
+            yield chunk({"tool_calls": [{"index": 0, **call}]})
+        else:
+            for part in split_tokens(content):
+                await asyncio.sleep(per_token)
+                yield chunk({"content": part})
+        yield chunk({}, finish=finish_reason)
+        if include_usage:
+            yield chunk({}, chunk_usage=usage)
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+@app.post("/v1/embeddings")
+async def embeddings(request: Request):
+    body = await request.json()
+    inputs = body.get("input", [])
+    # Un texto, una lista de textos, una lista de tokens o una lista de listas de tokens
+    if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+        inputs = [inputs]
+    simulator.stats["embeddings.requests"] += 1
+    simulator.stats["embeddings.inputs"] += len(inputs)
+    error = simulator.injected_error("embeddings")
+    if error is not None:
+        return error
+    await asyncio.sleep(simulator.latency("embeddings"))
+    dimensions = body.get("dimensions") or simulator.config["embedding_dimensions"]
+    encoding_format = body.get("encoding_format", "float")
+    tokens = sum(count_tokens(value) if isinstance(value, str) else len(value) for value in inputs)
+    return {
+        "object": "list",
+        "data": [
+            {"object": "embedding", "index": i, "embedding": encode_embedding(embed(value, dimensions), encoding_format)}
+            for i, value in enumerate(inputs)
+        ],
+        "model": body.get("model") or "simulador",
+        "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+    }
+
+
+@app.get("/v1/models")
+def models() -> dict:
+    return {"object": "list", "data": [{"id": "simulador", "object": "model", "created": 0, "owned_by": "simulador"}]}
+
+
+@app.get("/_simulator/stats")
+def stats() -> dict:
+    return {"uptime_seconds": round(time.time() - simulator.started_at, 1), "counters": dict(simulator.stats)}
+
+
+@app.post("/_simulator/reset")
+def reset() -> dict:
+    simulator.reset()
+    return {"reset": True}
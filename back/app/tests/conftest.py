@@ -0,0 +1,21 @@
+import pytest
+
+
+class FakeClock:
+    """
+    Reloj manual: reemplaza al módulo `time` de un módulo bajo prueba (solo `monotonic`), así los plazos
+    y las recargas no dependen de cuánto tarda la prueba.
+    """
+    def __init__(self, start: float = 1000.0):
+        self.now = start
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
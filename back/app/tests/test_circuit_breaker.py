@@ -0,0 +1,95 @@
+import pytest
+from utils import circuit_breaker
+from utils.circuit_breaker import CircuitBreaker, CircuitOpen, CLOSED, OPEN, HALF_OPEN
+from utils.metrics import metrics
+
+
+class LocalError(Exception):
+    pass
+
+
+@pytest.fixture
+def breaker(monkeypatch, clock):
+    monkeypatch.setattr(circuit_breaker, "time", clock)
+    metrics.reset()
+    return CircuitBreaker("test_breaker", window=4, failure_threshold=2, slow_call_seconds=1.0,
+                          open_seconds=10.0, half_open_probes=1)
+
+
+def fail(breaker, error=RuntimeError):
+    with pytest.raises(error):
+        with breaker.guard(ignore=(LocalError,)):
+            raise error()
+
+
+def succeed(breaker, clock=None, seconds=0.0):
+    with breaker.guard(ignore=(LocalError,)):
+        if clock is not None:
+            clock.advance(seconds)
+
+
+def test_opens_after_threshold_failures_in_window(breaker):
+    fail(breaker)
+    succeed(breaker)
+    assert breaker.state == CLOSED
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.is_open()
+    with pytest.raises(CircuitOpen):
+        succeed(breaker)
+    assert metrics.get("test_breaker.rejected") == 1
+
+
+def test_old_failures_leave_the_window(breaker):
+    fail(breaker)
+    for _ in range(4):
+        succeed(breaker)
+    fail(breaker)
+    assert breaker.state == CLOSED
+
+
+def test_slow_calls_count_as_failures(breaker, clock):
+    succeed(breaker, clock, seconds=2.0)
+    succeed(breaker, clock, seconds=2.0)
+    assert breaker.state == OPEN
+
+
+def test_ignored_errors_do_not_count(breaker):
+    for _ in range(3):
+        fail(breaker, LocalError)
+    assert breaker.state == CLOSED
+
+
+def test_half_open_probe_closes_on_success(breaker, clock):
+    fail(breaker)
+    fail(breaker)
+    clock.advance(9.9)
+    assert breaker.is_open()
+    clock.advance(0.2)
+    assert not breaker.is_open()
+    with breaker.guard():
+        assert breaker.state == HALF_OPEN
+        # Solo una llamada de prueba a la vez
+        with pytest.raises(CircuitOpen):
+            breaker.before_call()
+    assert breaker.state == CLOSED
+    assert breaker.snapshot()["recent_calls"] == 0
+
+
+def test_half_open_probe_reopens_on_failure(breaker, clock):
+    fail(breaker)
+    fail(breaker)
+    clock.advance(10)
+    fail(breaker)
+    assert breaker.state == OPEN
+    assert breaker.snapshot()["seconds_until_half_open"] == 10
+
+
+def test_ignored_error_returns_the_probe(breaker, clock):
+    fail(breaker)
+    fail(breaker)
+    clock.advance(10)
+    fail(breaker, LocalError)
+    assert breaker.state == HALF_OPEN
+    succeed(breaker)
+    assert breaker.state == CLOSED
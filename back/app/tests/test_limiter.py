@@ -0,0 +1,109 @@
+import threading
+import time
+import pytest
+from utils import limiter
+from utils.limiter import AdaptiveLimiter, Overloaded
+from utils.metrics import metrics
+
+
+class Throttled(Exception):
+    status_code = 429
+
+
+def make_limiter(initial=2, min_limit=1, max_limit=4, max_queue=1, target_latency=1.0):
+    return AdaptiveLimiter("test_limiter", initial, min_limit, max_limit, max_queue, target_latency)
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.001)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def test_acquire_up_to_limit_then_times_out():
+    lim = make_limiter(initial=2)
+    lim.acquire(timeout=0)
+    lim.acquire(timeout=0)
+    assert lim.in_flight == 2
+    with pytest.raises(Overloaded) as error:
+        lim.acquire(timeout=0.01)
+    assert error.value.retry_after >= 1
+    assert lim.waiting == 0
+    assert metrics.get("test_limiter.rejected.queue_timeout") == 1
+
+
+def test_full_queue_rejects_immediately():
+    lim = make_limiter(initial=1, max_queue=1)
+    lim.acquire(timeout=0)
+    waiter = threading.Thread(target=lim.acquire, args=(5,))
+    waiter.start()
+    wait_until(lambda: lim.waiting == 1)
+    start = time.monotonic()
+    with pytest.raises(Overloaded):
+        lim.check_admission()
+    with pytest.raises(Overloaded):
+        lim.acquire(timeout=5)
+    assert time.monotonic() - start < 1
+    assert metrics.get("test_limiter.rejected.queue_full") == 2
+    # Al liberar el lugar, lo toma la llamada que esperaba en la cola
+    lim.release()
+    waiter.join(2)
+    assert not waiter.is_alive()
+    assert (lim.in_flight, lim.waiting) == (1, 0)
+
+
+def test_limit_grows_additively_and_is_capped():
+    lim = make_limiter(initial=2, max_limit=3)
+    for _ in range(2):
+        lim.acquire(timeout=0)
+        lim.release(latency=0.1)
+    assert lim.limit == pytest.approx(2 + 1 / 2 + 1 / 2.5)
+    for _ in range(20):
+        lim.acquire(timeout=0)
+        lim.release(latency=0.1)
+    assert lim.limit == 3
+
+
+def test_limit_decreases_once_per_window(monkeypatch, clock):
+    monkeypatch.setattr(limiter, "time", clock)
+    lim = make_limiter(initial=4, target_latency=1.0)
+    lim.acquire(timeout=0)
+    lim.release(throttled=True)
+    assert lim.limit == 2
+    # Otro 429 dentro de la misma ventana no vuelve a reducir el límite
+    lim.acquire(timeout=0)
+    lim.release(throttled=True)
+    assert lim.limit == 2
+    clock.advance(1.5)
+    lim.acquire(timeout=0)
+    lim.release(latency=5.0)
+    assert lim.limit == pytest.approx(1.8)
+    clock.advance(1.5)
+    lim.acquire(timeout=0)
+    lim.release(throttled=True)
+    assert lim.limit == 1
+
+
+def test_slot_reports_throttling_and_latency(monkeypatch, clock):
+    monkeypatch.setattr(limiter, "time", clock)
+    lim = make_limiter(initial=2)
+    with pytest.raises(Throttled):
+        with lim.slot(timeout=0):
+            raise Throttled()
+    assert lim.limit == 1
+    assert metrics.get("test_limiter.throttled") == 1
+    with lim.slot(timeout=0):
+        clock.advance(0.2)
+    assert lim.limit == 2
+    assert lim.snapshot()["avg_latency"] == 0.2
+    # Otros errores liberan el lugar sin cambiar el límite
+    with pytest.raises(ValueError):
+        with lim.slot(timeout=0):
+            raise ValueError()
+    assert (lim.limit, lim.in_flight) == (2, 0)
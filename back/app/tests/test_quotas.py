@@ -0,0 +1,75 @@
+import pytest
+from utils import quotas as quotas_module
+from utils.quotas import MemoryBuckets, Quotas, QuotaExceeded
+from utils.security import ApiClient
+
+
+@pytest.fixture
+def buckets(monkeypatch, clock):
+    monkeypatch.setattr(quotas_module, "time", clock)
+    return MemoryBuckets()
+
+
+def test_bucket_refills_continuously(buckets, clock):
+    assert buckets.consume("k", capacity=2, rate=1, cost=1) == (True, 1)
+    assert buckets.consume("k", capacity=2, rate=1, cost=1) == (True, 0)
+    assert buckets.consume("k", capacity=2, rate=1, cost=1) == (False, 0)
+    clock.advance(0.5)
+    assert buckets.consume("k", capacity=2, rate=1, cost=1) == (False, 0.5)
+    clock.advance(0.5)
+    assert buckets.consume("k", capacity=2, rate=1, cost=1) == (True, 0)
+    # La recarga no pasa de la capacidad
+    clock.advance(60)
+    assert buckets.consume("k", capacity=2, rate=1, cost=0) == (True, 2)
+
+
+def test_forced_and_oversized_costs_leave_the_bucket_negative(buckets):
+    assert buckets.consume("k", capacity=10, rate=1, cost=25) == (True, -15)
+    assert buckets.consume("k", capacity=10, rate=1, cost=0) == (False, -15)
+    assert buckets.consume("j", capacity=10, rate=1, cost=4, force=True) == (True, 6)
+    assert buckets.consume("j", capacity=10, rate=1, cost=20, force=True) == (True, -14)
+
+
+def test_request_quota_rejects_with_retry_after(buckets, clock):
+    quotas = Quotas(buckets)
+    client = ApiClient("integracion", requests_per_minute=60, requests_burst=2)
+    quotas.admit(client)
+    quotas.admit(client)
+    with pytest.raises(QuotaExceeded) as error:
+        quotas.admit(client)
+    assert error.value.retry_after == 1
+    clock.advance(1)
+    quotas.admit(client)
+    # Un lote consume una unidad por pregunta; uno más grande que la ráfaga se admite con el balde lleno
+    clock.advance(2)
+    quotas.admit(client, requests=3)
+    with pytest.raises(QuotaExceeded) as error:
+        quotas.admit(client)
+    assert error.value.retry_after == 2
+
+
+def test_token_quota_is_charged_after_the_fact(buckets, clock):
+    quotas = Quotas(buckets)
+    client = ApiClient("integracion", tokens_per_minute=600)
+    quotas.admit(client)
+    quotas.charge(client, 900)
+    with pytest.raises(QuotaExceeded) as error:
+        quotas.admit(client)
+    assert error.value.retry_after == 30
+    clock.advance(30)
+    quotas.admit(client)
+
+
+def test_clients_without_quotas_are_always_admitted(buckets):
+    quotas = Quotas(buckets)
+    quotas.admit(None)
+    quotas.admit(ApiClient("libre", requests_per_minute=0, tokens_per_minute=0), requests=1000)
+    quotas.charge(ApiClient("libre", requests_per_minute=0, tokens_per_minute=0), 10 ** 6)
+
+
+def test_backend_errors_admit_the_request():
+    class Broken:
+        def consume(self, *args, **kwargs):
+            raise ConnectionError("sin conexión")
+
+    Quotas(Broken()).admit(ApiClient("integracion", requests_per_minute=1))
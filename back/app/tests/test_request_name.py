@@ -0,0 +1,80 @@
+import os
+import pytest
+from nodes import request_name
+from nodes.request_name import extract_name, capitalize_name
+
+
+@pytest.fixture(autouse=True)
+def names_file(monkeypatch):
+    # El listado de nombres se lee con una ruta relativa a 'back/app'
+    monkeypatch.setattr(request_name, "PATH_NAMES", os.path.join(os.path.dirname(__file__), "..", "docs", "nombres.json"))
+    request_name.load_names.cache_clear()
+    yield
+    request_name.load_names.cache_clear()
+
+
+@pytest.mark.parametrize("text, expected", [
+    # Frases explícitas
+    ("Me llamo Juan", "Juan"),
+    ("me llamo juan", "Juan"),
+    ("Hola! Mi nombre es María, ¿cómo estás?", "María"),
+    ("my name is John", "John"),
+    ("My name is John I need help", "John"),
+    ("meu nome é João", "João"),
+    ("ME LLAMO JUAN", "Juan"),
+    ("No, me llamo Juan", "Juan"),
+    # Nombres de varias palabras
+    ("me llamo juan carlos", "Juan Carlos"),
+    ("Me llamo José María", "José María"),
+    ("me llamo Pedro Pablo y quiero saber los plazos", "Pedro Pablo"),
+    ("Me llamo Ana García", "Ana García"),
+    # Apodos
+    ("llamame Juanchi", "Juanchi"),
+    ("call me Ana", "Ana"),
+    # Frases ambiguas: solo con nombres del listado
+    ("soy Ana", "Ana"),
+    ("no soy Juan, soy Pedro", "Pedro"),
+    # Mensajes que son solo un nombre
+    ("juan", "Juan"),
+    ("Hola, Juan", "Juan"),
+    ("Ana García", "Ana García"),
+])
+def test_extract_name(text, expected):
+    assert extract_name(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    "hola",
+    # Lo que sigue a la frase no es un nombre
+    "mi nombre es muy largo",
+    "Mi nombre es secreto",
+    "me llamo igual que mi papá",
+    "mi nombre es difícil de pronunciar",
+    "Mi Nombre Es Secreto",
+    "call me later",
+    "llamame mañana",
+    "soy programador",
+    "I'm fine",
+    # Negaciones
+    "no me llamo Juan",
+    "I'm not Juan",
+    "eu não me chamo Pedro",
+    # Nombres distintos o demasiado largos
+    "me llamo Juan, mi nombre es Pedro",
+    "Me llamo Juan Pedro Pablo Martín Gómez",
+    # Mensajes que no son solo un nombre
+    "Juan perez",
+    "¿Cuáles son los plazos de entrega?",
+])
+def test_extract_name_returns_none_when_not_confident(text):
+    assert extract_name(text) is None
+
+
+@pytest.mark.parametrize("name, expected", [
+    ("juan", "Juan"),
+    ("juan carlos", "Juan Carlos"),
+    ("ANA  GARCÍA", "Ana García"),
+])
+def test_capitalize_name(name, expected):
+    assert capitalize_name(name) == expected
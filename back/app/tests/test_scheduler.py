@@ -0,0 +1,94 @@
+import threading
+import time
+import pytest
+from utils.limiter import Overloaded
+from utils.metrics import metrics
+from utils.quotas import QuotaExceeded
+from utils.scheduler import FairScheduler
+from utils.security import ApiClient
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.001)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def grant_order(scheduler: FairScheduler, requests: list) -> list:
+    """
+    Encola 'requests' (pares cliente, peso) en ese orden con el único lugar ocupado y devuelve el orden en que
+    el planificador les da lugar, liberando de a uno.
+    """
+    order = []
+    threads = []
+    for position, (name, weight) in enumerate(requests, start=1):
+        thread = threading.Thread(target=lambda n=name, w=weight: (scheduler.acquire(n, w, timeout=5), order.append(n)))
+        thread.start()
+        threads.append(thread)
+        wait_until(lambda: sum(scheduler.snapshot()["queued"].values()) == position)
+    for granted in range(1, len(requests) + 1):
+        scheduler.release()
+        wait_until(lambda: len(order) == granted)
+    scheduler.release()
+    for thread in threads:
+        thread.join(2)
+    return order
+
+
+def test_acquires_without_waiting_below_the_limit():
+    scheduler = FairScheduler(max_concurrency=2)
+    scheduler.acquire("a", 1, timeout=0)
+    scheduler.acquire("b", 1, timeout=0)
+    assert scheduler.snapshot() == {"max_concurrency": 2, "in_flight": 2, "queued": {}}
+    with pytest.raises(Overloaded):
+        scheduler.acquire("a", 1, timeout=0.01)
+    assert scheduler.snapshot()["queued"] == {}
+    assert metrics.get("fair_scheduler.a.timeout") == 1
+
+
+def test_clients_with_equal_weights_alternate():
+    scheduler = FairScheduler(max_concurrency=1)
+    scheduler.acquire("a", 1, timeout=0)
+    order = grant_order(scheduler, [("a", 1)] * 3 + [("b", 1)] * 3)
+    assert order == ["a", "b", "a", "b", "a", "b"]
+    assert scheduler.snapshot()["in_flight"] == 0
+
+
+def test_slots_follow_client_weights():
+    scheduler = FairScheduler(max_concurrency=1)
+    scheduler.acquire("a", 1, timeout=0)
+    order = grant_order(scheduler, [("a", 2)] * 4 + [("b", 1)] * 2)
+    assert order == ["a", "b", "a", "a", "b", "a"]
+
+
+def test_full_client_queue_is_rejected():
+    scheduler = FairScheduler(max_concurrency=1, max_queue_per_client=1)
+    scheduler.acquire("a", 1, timeout=0)
+    waiter = threading.Thread(target=scheduler.acquire, args=("a", 1, 5))
+    waiter.start()
+    wait_until(lambda: scheduler.snapshot()["queued"] == {"a": 1})
+    with pytest.raises(QuotaExceeded):
+        scheduler.acquire("a", 1, timeout=5)
+    # Otro cliente sí puede esperar, y los lotes esperan aunque la cola esté llena
+    with pytest.raises(Overloaded):
+        scheduler.acquire("b", 1, timeout=0.01)
+    with pytest.raises(Overloaded):
+        scheduler.acquire("a", 1, timeout=0.01, limit_queue=False)
+    scheduler.release()
+    waiter.join(2)
+    assert scheduler.snapshot() == {"max_concurrency": 1, "in_flight": 1, "queued": {}}
+
+
+def test_slot_uses_the_client_name_and_weight():
+    scheduler = FairScheduler(max_concurrency=1)
+    with scheduler.slot(ApiClient("integracion", weight=3), timeout=0):
+        assert scheduler.snapshot()["in_flight"] == 1
+    with scheduler.slot(None, timeout=0):
+        pass
+    assert scheduler.snapshot()["in_flight"] == 0
@@ -0,0 +1,140 @@
+import threading
+import time
+import pytest
+from utils import single_flight
+from utils.limiter import Overloaded
+from utils.metrics import metrics
+from utils.single_flight import SingleFlight, SessionLocks, SessionBusy, IdempotencyStore
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "la condición no se cumplió a tiempo"
+        time.sleep(0.001)
+
+
+@pytest.fixture(autouse=True)
+def reset_metrics():
+    metrics.reset()
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test_flight")
+    started, finish = threading.Event(), threading.Event()
+    calls, results = [], []
+
+    def fn():
+        calls.append(1)
+        started.set()
+        finish.wait(2)
+        return "respuesta"
+
+    leader = threading.Thread(target=lambda: results.append(flight.do("k", fn)))
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=lambda: results.append(flight.do("k", fn, timeout=2)))
+    follower.start()
+    wait_until(lambda: metrics.get("test_flight.shared") == 1)
+    finish.set()
+    leader.join(2)
+    follower.join(2)
+    assert results == ["respuesta", "respuesta"]
+    assert len(calls) == 1
+    # Terminada la llamada, la clave se libera
+    assert flight.do("k", lambda: "otra") == "otra"
+
+
+def test_followers_receive_the_leader_error():
+    flight = SingleFlight("test_flight")
+    started, finish = threading.Event(), threading.Event()
+    errors = []
+
+    def fn():
+        started.set()
+        finish.wait(2)
+        raise ValueError("falló")
+
+    def call(**kwargs):
+        try:
+            flight.do("k", fn, **kwargs)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(2)
+    follower = threading.Thread(target=call, kwargs={"timeout": 2})
+    follower.start()
+    wait_until(lambda: metrics.get("test_flight.shared") == 1)
+    finish.set()
+    leader.join(2)
+    follower.join(2)
+    assert len(errors) == 2 and errors[0] is errors[1]
+
+
+def test_follower_times_out():
+    flight = SingleFlight("test_flight")
+    started, finish = threading.Event(), threading.Event()
+    leader = threading.Thread(target=flight.do, args=("k", lambda: started.set() or finish.wait(2)))
+    leader.start()
+    started.wait(2)
+    with pytest.raises(Overloaded):
+        flight.do("k", lambda: None, timeout=0.01)
+    finish.set()
+    leader.join(2)
+
+
+def test_session_locks_serialize_a_session():
+    locks = SessionLocks()
+    with locks.hold("s1", timeout=0):
+        with pytest.raises(SessionBusy) as error:
+            with locks.hold("s1", timeout=0.01):
+                pass
+        assert error.value.retry_after == 2
+        # Otras sesiones no esperan
+        with locks.hold("s2", timeout=0):
+            pass
+    with locks.hold("s1", timeout=0):
+        pass
+
+
+def test_session_lock_waiter_gets_the_lock_when_released():
+    locks = SessionLocks()
+    held, release = threading.Event(), threading.Event()
+    order = []
+
+    def first():
+        with locks.hold("s1", timeout=0):
+            order.append("first")
+            held.set()
+            release.wait(2)
+
+    thread = threading.Thread(target=first)
+    thread.start()
+    held.wait(2)
+    release.set()
+    with locks.hold("s1", timeout=2):
+        order.append("second")
+    thread.join(2)
+    assert order == ["first", "second"]
+
+
+def test_idempotency_store_expires_entries(monkeypatch, clock):
+    monkeypatch.setattr(single_flight, "time", clock)
+    store = IdempotencyStore(ttl=10, max_keys=10)
+    store.set("a", {"respuesta": "hola"})
+    clock.advance(10)
+    assert store.get("a") == {"respuesta": "hola"}
+    clock.advance(0.1)
+    assert store.get("a") is None
+
+
+def test_idempotency_store_evicts_least_recently_used(monkeypatch, clock):
+    monkeypatch.setattr(single_flight, "time", clock)
+    store = IdempotencyStore(ttl=10, max_keys=2)
+    store.set("a", 1)
+    store.set("b", 2)
+    assert store.get("a") == 1
+    store.set("c", 3)
+    assert (store.get("a"), store.get("b"), store.get("c")) == (1, None, 3)
@@ -1,31 +1,55 @@
 import os
 from dotenv import load_dotenv
 import json
-from tenacity import retry, stop_after_attempt, wait_fixed, RetryError
-from typing import Dict, Union, Any
-from langchain_openai  import ChatOpenAI, OpenAIEmbeddings
-from langchain.prompts import PromptTemplate
-from langchain_core.output_parsers import JsonOutputParser
-from langchain.callbacks import get_openai_callback
-from langchain_community.vectorstores import FAISS
-from utils.logger import logger
+import logging
+from tenacity import retry, retry_if_not_exception_type, stop_after_attempt, wait_random_exponential, RetryError
+from functools import lru_cache
+from typing import Callable, Dict, Optional, Union, Any, TYPE_CHECKING
+from utils.circuit_breaker import chat_breaker, CircuitOpen
+from utils.deadline import DeadlineExceeded, check_deadline, remaining_time
+from utils.embeddings import EMBEDDING_BACKEND, get_local_embeddings
+from utils.hedging import hedged_call
+from utils.limiter import llm_limiter, embeddings_limiter, Overloaded, LLM_QUEUE_TIMEOUT
+from utils.logger import logger, payload_logger
+from utils.metrics import metrics
+
+# Las librerías de langchain se importan dentro de cada función para no demorar el arranque de la aplicación
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
+    from langchain_core.output_parsers import JsonOutputParser
+    from langchain_core.prompts import ChatPromptTemplate
 
 load_dotenv()
 PATH_TEMPLATES = os.getenv('PATH_TEMPLATES')
 OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
+# URL de un servidor compatible con la API de OpenAI (por ejemplo, el simulador local: http://localhost:8100/v1)
+OPENAI_BASE_URL = os.getenv('OPENAI_BASE_URL') or None
+# 'false' envía los textos a embeddings tal cual, sin dividirlos con tiktoken según el contexto del modelo
+# (para servidores compatibles que solo aceptan texto, como el simulador)
+EMBEDDING_CHECK_CTX_LENGTH = os.getenv('EMBEDDING_CHECK_CTX_LENGTH', 'true').lower() == 'true'
 PATH_DB = os.getenv('PATH_DB')
 CHAT_NAME_MODEL = os.getenv('CHAT_NAME_MODEL')
 EMBEDDING_NAME_MODEL = os.getenv('EMBEDDING_NAME_MODEL')
 EMBEDDING_SIZE_MODEL = os.getenv('EMBEDDING_SIZE_MODEL')
+# 'false' desactiva las salidas estructuradas nativas del proveedor en todos los prompts (ver `output_mode`)
+STRUCTURED_OUTPUT = os.getenv('STRUCTURED_OUTPUT', 'true').lower() == 'true'
+LLM_MAX_ATTEMPTS = int(os.getenv('LLM_MAX_ATTEMPTS', '2'))
+LLM_RETRY_BACKOFF = float(os.getenv('LLM_RETRY_BACKOFF', '0.5'))
+LLM_RETRY_MAX_WAIT = float(os.getenv('LLM_RETRY_MAX_WAIT', '4'))
+LLM_MIN_ATTEMPT_TIME = float(os.getenv('LLM_MIN_ATTEMPT_TIME', '1'))
 
 
-def get_model(model_type, temperature=None, seed=None, model_chat=CHAT_NAME_MODEL, model_embedding=EMBEDDING_NAME_MODEL, dimensions=EMBEDDING_SIZE_MODEL) -> Union[ChatOpenAI, OpenAIEmbeddings]:
+def get_model(model_type, temperature=None, seed=None, model_chat=CHAT_NAME_MODEL, model_embedding=EMBEDDING_NAME_MODEL, dimensions=EMBEDDING_SIZE_MODEL, timeout=None, streaming=False) -> Union["ChatOpenAI", "OpenAIEmbeddings"]:
     """
     Obtiene un modelo de chat/embedding según el tipo de 'model_type' especificado.
 
     Args:
         model_type (str): Tipo de modelo a obtener. Puede ser "embeddings" o un modelo de "chat".
         temperature (float, opcional): Parámetro que controla la creatividad del modelo de "chat". Por defecto es None.
+        timeout (float, opcional): Segundos máximos de cada llamada HTTP al proveedor. Por defecto es None (sin límite).
+            El modelo de chat no reintenta por su cuenta: cada intento de `invoke_llm` es una sola llamada.
+        streaming (bool, opcional): Si es True, el modelo de chat recibe la respuesta por partes (ver `utils.token_stream`),
+            con el uso de tokens al final.
 
     Returns:
         ChatOpenAI: Instancia del modelo seleccionado. Si el tipo es "embeddings", se retorna un modelo de embeddings; de lo contrario, un modelo de chat.
@@ -36,108 +60,312 @@ def get_model(model_type, temperature=None, seed=None, model_chat=CHAT_NAME_MODE
 
     Notas:
         - El modelo de embeddings utiliza el nombre y el tamaño de los embeddings definidos en las constantes `EMBEDDING_NAME_MODEL` y `EMBEDDING_SIZE_MODEL`.
+        - Si 'OPENAI_BASE_URL' está definido, los modelos usan ese servidor en lugar de la API de OpenAI (ver `simulator`).
+          Con 'EMBEDDING_CHECK_CTX_LENGTH=false' los textos de los embeddings se envían sin dividirlos en tokens.
+        - Si 'EMBEDDING_BACKEND' es "local", los embeddings se calculan en CPU con el modelo ONNX de `utils.embeddings.LocalEmbeddings`.
         - El modelo de chat utiliza el nombre del modelo y la semilla definidos en las constantes `CHAT_NAME_MODEL` y `CHAT_SEED`.
     """
     logger.debug(f"Entrando en la función 'get_model'.")
+    if model_type == "embeddings" and EMBEDDING_BACKEND == "local":
+        # El modelo local se carga una vez por proceso y lo comparten todas las solicitudes
+        return get_local_embeddings()
+    from langchain_openai import ChatOpenAI, OpenAIEmbeddings
     if model_type == "embeddings":
-        model = OpenAIEmbeddings(model=model_embedding, dimensions=dimensions)
+        model = OpenAIEmbeddings(model=model_embedding, dimensions=dimensions, timeout=timeout,
+                                 base_url=OPENAI_BASE_URL, check_embedding_ctx_length=EMBEDDING_CHECK_CTX_LENGTH)
     else:
-        model = ChatOpenAI(model=model_chat, temperature=temperature, seed=seed)
-    logger.debug(f"Modelo de '{model_type}' instanciado.")
+        # Los reintentos los hace `invoke_llm` dentro del plazo de la solicitud, no el cliente de OpenAI
+        model = ChatOpenAI(model=model_chat, temperature=temperature, seed=seed, timeout=timeout, base_url=OPENAI_BASE_URL,
+                           streaming=streaming, stream_usage=streaming, max_retries=0)
+    logger.debug("Modelo de '%s' instanciado.", model_type)
     return model
 
 
-def get_prompt(inputs: dict, prompt_name: str, pydantic_object=None) -> tuple:
+@lru_cache(maxsize=1)
+def load_templates() -> dict:
     """
-    Carga una plantilla de prompt desde un archivo JSON y la formatea con los valores de entrada proporcionados.
+    Carga las plantillas de prompts desde el archivo JSON indicado en 'PATH_TEMPLATES'.
+    El archivo se lee una única vez por proceso.
+    """
+    with open(PATH_TEMPLATES, "r", encoding="utf-8") as file:
+        return json.load(file)
+
+
+def get_template(prompt_name: str) -> str:
+    """
+    Devuelve el texto de la plantilla 'prompt_name' sin formatear.
+    """
+    return load_templates()[prompt_name]
+
+
+# Métodos de `with_structured_output` que se pueden indicar en la clave 'structured_output' de una plantilla
+STRUCTURED_OUTPUT_METHODS = ("function_calling", "json_schema", "json_mode")
+
+
+def output_mode(prompt_name: str, pydantic_object=None) -> str:
+    """
+    Indica cómo se obtiene la salida del prompt 'prompt_name':
+        - 'text': sin esquema, el texto de la respuesta.
+        - 'json_parser': el modelo responde JSON siguiendo las instrucciones del prompt y se parsea con `JsonOutputParser`.
+        - 'function_calling', 'json_schema' o 'json_mode': salida estructurada nativa del proveedor
+          (`with_structured_output`), según la clave 'structured_output' de la plantilla, salvo que
+          'STRUCTURED_OUTPUT' sea 'false'.
+    """
+    if pydantic_object is None:
+        return "text"
+    template = load_templates()[prompt_name]
+    method = template.get("structured_output") if isinstance(template, dict) else None
+    if STRUCTURED_OUTPUT and method in STRUCTURED_OUTPUT_METHODS:
+        return method
+    return "json_parser"
+
+
+def structured_model(model: "ChatOpenAI", pydantic_object, mode: str):
+    """
+    Devuelve el modelo configurado para responder con una instancia de 'pydantic_object' si 'mode' es una
+    salida estructurada nativa; si no, el mismo modelo.
+    """
+    if mode not in STRUCTURED_OUTPUT_METHODS:
+        return model
+    return model.with_structured_output(pydantic_object, method=mode)
+
+
+@lru_cache(maxsize=None)
+def get_chat_prompt(prompt_name: str, structured: bool = False) -> "ChatPromptTemplate":
+    """
+    Arma (una vez por proceso) el `ChatPromptTemplate` de la plantilla 'prompt_name'.
+
+    Las plantillas de los prompts del LLM tienen dos partes: 'system', con las instrucciones fijas, y 'user',
+    con los valores de cada interacción. Así el comienzo del prompt es idéntico en todas las llamadas y el
+    proveedor puede reutilizarlo de su caché de prefijos (los tokens en caché se informan en
+    `parse_tokens`). Las plantillas de texto simple se envían como un único mensaje del usuario.
+
+    Con 'structured' se usa 'system_structured' si la plantilla lo tiene: las instrucciones sin la descripción
+    del formato JSON, que con salida estructurada nativa define el esquema.
+    """
+    from langchain_core.prompts import ChatPromptTemplate
+    template = load_templates()[prompt_name]
+    if isinstance(template, str):
+        return ChatPromptTemplate.from_messages([("human", template)])
+    system = template.get("system_structured", template["system"]) if structured else template["system"]
+    return ChatPromptTemplate.from_messages([("system", system), ("human", template["user"])])
+
+
+def get_prompt(inputs: dict, prompt_name: str, pydantic_object=None, mode: str = None) -> tuple:
+    """
+    Obtiene la plantilla de prompt 'prompt_name' y, si corresponde, el parser de su salida JSON.
 
     Args:
         prompt_name (str): El nombre de la plantilla de prompt a cargar.
         inputs (Dict[str, str]): Diccionario que contiene los datos que se almacenarán en la base de datos.
         pydantic_object (Optional[Type[PydanticModel]], optional): Un modelo de Pydantic opcional para parsear la salida JSON.
+        mode (str, opcional): Modo de salida (ver `output_mode`). Por defecto, el configurado para el prompt.
 
     Returns:
-        Tuple[str, Optional[JsonOutputParser]]:
-            - str: La plantilla de prompt formateada.
-            - Optional[JsonOutputParser]: Un objeto JsonOutputParser si se proporciona un pydantic_object, de lo contrario None.
+        Tuple[ChatPromptTemplate, Optional[JsonOutputParser]]:
+            - ChatPromptTemplate: La plantilla del prompt (ver `get_chat_prompt`), que se formatea al invocar al LLM.
+            - Optional[JsonOutputParser]: Un objeto JsonOutputParser si el modo es 'json_parser', de lo contrario None.
     """
     logger.debug(f"Entrando en la función 'get_prompt'.")
-    with open(PATH_TEMPLATES, "r", encoding="utf-8") as file:
-        templates = json.load(file)
-    if pydantic_object:
-        parser = JsonOutputParser(pydantic_object=pydantic_object)
-        prompt = PromptTemplate(
-            template=templates[prompt_name],
-            input_variables=inputs["input"],
-            partial_variables={"format_instructions": parser.get_format_instructions()},
-            )
-    else:
-        prompt_template = PromptTemplate.from_template(template=templates[prompt_name])
-        prompt = prompt_template.format(**inputs)
-        print(prompt)
+    from langchain_core.output_parsers import JsonOutputParser
+    mode = mode or output_mode(prompt_name, pydantic_object)
+    prompt = get_chat_prompt(prompt_name, structured=mode in STRUCTURED_OUTPUT_METHODS)
+    parser = JsonOutputParser(pydantic_object=pydantic_object) if mode == "json_parser" else None
+    if payload_logger.isEnabledFor(logging.DEBUG):
+        payload_logger.debug("Prompt '%s': %s", prompt_name, prompt.format(**prompt_variables(prompt, inputs)))
     logger.debug(f"Prompt instanciado.")
-    return prompt, parser if pydantic_object else None
+    return prompt, parser
+
+
+def prompt_variables(prompt: "ChatPromptTemplate", inputs: dict) -> dict:
+    """
+    Devuelve los valores de 'inputs' que usa la plantilla 'prompt'.
+    """
+    return {name: inputs.get(name) for name in prompt.input_variables}
+
+
+def _retry_inputs(retry_state) -> dict:
+    return retry_state.kwargs.get("inputs") or (retry_state.args[3] if len(retry_state.args) > 3 else None)
+
+
+def _stop_on_deadline(retry_state) -> bool:
+    """
+    Corta los reintentos si a la solicitud no le queda tiempo suficiente para otro intento.
+    """
+    remaining = remaining_time(_retry_inputs(retry_state))
+    return remaining is not None and remaining < LLM_MIN_ATTEMPT_TIME
 
 
-@retry(stop=stop_after_attempt(2), wait=wait_fixed(2), reraise=True)
-def invoke_llm(model: ChatOpenAI, prompt: str, parser: JsonOutputParser, inputs: dict) -> tuple:
+def _wait_within_deadline(retry_state) -> float:
+    """
+    Espera exponencial con jitter entre intentos, acotada por el tiempo restante de la solicitud.
+    """
+    wait = wait_random_exponential(multiplier=LLM_RETRY_BACKOFF, max=LLM_RETRY_MAX_WAIT)(retry_state)
+    remaining = remaining_time(_retry_inputs(retry_state))
+    if remaining is None:
+        return wait
+    return max(0.0, min(wait, remaining - LLM_MIN_ATTEMPT_TIME))
+
+
+@retry(stop=stop_after_attempt(LLM_MAX_ATTEMPTS) | _stop_on_deadline,
+       wait=_wait_within_deadline,
+       retry=retry_if_not_exception_type((Overloaded, DeadlineExceeded, CircuitOpen)),
+       reraise=True)
+def invoke_llm(model: Union["ChatOpenAI", Callable[[Optional[float]], "ChatOpenAI"]], prompt: "ChatPromptTemplate", parser: "JsonOutputParser", inputs: dict, prompt_name: str = None,
+               mode: str = None, stream_handler=None) -> tuple:
     """
     Invoca un LLM con un prompt dado y procesa la salida mediante un parser opcional.
 
     Args:
-        model: El modelo de lenguaje a invocar.
-        prompt: La plantilla de prompt que se utilizará para generar la entrada del modelo.
+        model: El modelo de lenguaje a invocar, o una función que recibe el timeout del intento (los segundos que le
+            quedan a la solicitud al conseguir lugar en `llm_limiter`) y devuelve el modelo.
+        prompt: La plantilla de prompt (`ChatPromptTemplate`) que se formatea con los valores de 'inputs'.
         parser: Un parser opcional que procesa la salida del modelo.
         inputs (Dict[str, Any]): Un diccionario que contiene las variables de entrada necesarias para el prompt.
+        prompt_name (str, opcional): Nombre del prompt, usado para llevar las latencias y decidir cuándo duplicar la llamada.
+        mode (str, opcional): Modo de salida (ver `output_mode`), para contar los errores de parseo por modo.
+        stream_handler (TokenStreamHandler, opcional): Recibe los tokens de la respuesta a medida que llegan (ver `utils.token_stream`).
 
     Returns:
         Tuple[Any, Any]:
             - output: La salida generada por el modelo de lenguaje.
             - cb: Un objeto de callback que proporciona información sobre la invocación (como el uso de tokens).
+              'cb.prompt_tokens_cached' tiene los tokens del prompt que el proveedor leyó de su caché.
+
+    Notas:
+        - Cada intento ocupa un lugar en el limitador de concurrencia `llm_limiter`. Si el servicio está
+          saturado se lanza `Overloaded`, que no se reintenta. El timeout de la llamada HTTP (si 'model' es una
+          función) se calcula recién al conseguir el lugar, así la espera en la cola no extiende el plazo.
+        - Los reintentos esperan un tiempo exponencial con jitter y nunca exceden el plazo de la solicitud
+          (clave 'deadline' de 'inputs'). Si el plazo vence se lanza `DeadlineExceeded`, que no se reintenta.
+        - Si está habilitado, la llamada se duplica cuando supera el percentil de latencia del prompt (ver `hedged_call`).
+        - Cada llamada al proveedor pasa por el circuit breaker `chat_breaker`, una vez conseguido el lugar en el
+          limitador. Si el circuito está abierto se lanza `CircuitOpen` sin llamar al proveedor ni reintentar.
+        - Con 'stream_handler' la llamada no se duplica: las dos respuestas llegarían mezcladas al cliente.
+        - Las salidas que no se pueden parsear (o una salida estructurada vacía) se reintentan y se cuentan en la
+          métrica 'llm.output.<mode>.parse_errors'.
     """
     logger.debug(f"Entrando en la función 'invoke_llm'.")
-    
+    from langchain_community.callbacks import get_openai_callback
+    from langchain_core.exceptions import OutputParserException
+    from pydantic import ValidationError
+    from utils.prompt_cache import CachedTokensHandler
+    remaining = check_deadline(inputs, prompt_name or "invoke_llm")
+    queue_timeout = LLM_QUEUE_TIMEOUT if remaining is None else min(LLM_QUEUE_TIMEOUT, remaining)
+    variables = prompt_variables(prompt, inputs)
+    cache_handler = CachedTokensHandler()
+    callbacks = [cache_handler, stream_handler] if stream_handler else [cache_handler]
+
+    def call():
+        if chat_breaker.is_open():
+            # Con el circuito abierto se falla de inmediato, sin esperar lugar en el limitador
+            raise CircuitOpen(f"Circuito '{chat_breaker.name}' abierto.")
+        # El breaker va dentro del limitador: la espera en la cola local no cuenta como una llamada lenta al proveedor
+        with llm_limiter.slot(queue_timeout):
+            llm = model if hasattr(model, "invoke") else model(check_deadline(inputs, prompt_name or "invoke_llm"))
+            chain = prompt | llm | parser if parser else prompt | llm
+            with chat_breaker.guard(ignore=(Overloaded, DeadlineExceeded)):
+                output = chain.invoke(variables, config={"callbacks": callbacks})
+        if output is None and mode in STRUCTURED_OUTPUT_METHODS:
+            # El modelo respondió sin llamar a la función del esquema
+            raise OutputParserException(f"El prompt '{prompt_name}' no devolvió una salida estructurada.")
+        return output
+
     try:
         with get_openai_callback() as cb:
-            if parser:
-                chain = prompt | model | parser
-                output = chain.invoke({"input": inputs["input"]})
-                logger.debug(f"Respuesta del LLM instanciada.")
-                return output, cb
-            else:
-                output = model.invoke(prompt.format(**inputs))
-                logger.debug(f"Respuesta del LLM instanciada.")
-                return output, cb
+            output = call() if stream_handler else hedged_call(call, prompt_name or "default", timeout=remaining)
+            cache_handler.apply(cb)
+            logger.debug(f"Respuesta del LLM instanciada.")
+            return output, cb
+    except (Overloaded, DeadlineExceeded, CircuitOpen):
+        raise
     except RetryError as e:
-        logger.error(f"Fallo tras varios intentos: {e}")
+        logger.error("Fallo tras varios intentos: %s", e)
         raise e  # Lanza el error tras agotar los intentos
+    except (OutputParserException, ValidationError) as e:
+        metrics.incr(f"llm.output.{mode or 'json_parser'}.parse_errors")
+        logger.error("No se pudo parsear la salida del prompt '%s': %s", prompt_name, e)
+        raise e
     except Exception as e:
-        logger.error(f"Error al invocar el LLM: {e}")
+        logger.error("Error al invocar el LLM: %s", e)
         raise e
 
 
+def get_vdb(corpus: str = None):
+    """
+    Devuelve la base de datos vectorial del corpus 'corpus' (o la del corpus por defecto, 'PATH_DB'): el
+    índice FAISS y el docstore mapeado en memoria (ver `db.vdb.docstore`). Los índices se cargan una vez por
+    proceso y se mantienen según el presupuesto de memoria del registro de corpus (ver `db.vdb.registry`).
+
+    Los embeddings de las consultas se calculan aparte, con el timeout de cada solicitud (ver `rag` y
+    `embed_queries`), y se buscan con `similarity_search_by_vector`.
+    """
+    from db.vdb.registry import corpus_registry
+    return corpus_registry.get(corpus)
+
+
 def rag(inputs: dict) -> str:
     """
     Realiza una búsqueda de documentos similar utilizando un modelo de embeddings y una base de datos FAISS.
 
     Args:
         inputs (Dict[str, Any]): Un diccionario que contiene la entrada para la búsqueda, específicamente
-                                  la clave "input" con el texto a buscar.
+                                  la clave "input" con el texto a buscar y la clave "corpus" con el corpus
+                                  en el que buscar (el corpus por defecto si es None).
 
     Returns:
         str: El contenido de la página del documento más similar encontrado en la base de datos.
+
+    Notas:
+        - El embedding de la consulta ocupa un lugar en el limitador de concurrencia `embeddings_limiter`
+          y usa como timeout el tiempo restante de la solicitud (con el backend local, el que queda después de
+          conseguir el lugar). Si se agota, se lanza `DeadlineExceeded`.
+        - Si 'inputs' ya trae el embedding de la consulta en la clave 'query_embedding' (por ejemplo, calculado
+          para todo un lote con `embed_queries`), no se vuelve a pedir al proveedor.
     """
     logger.debug(f"Entrando en la función 'rag'.")
-    embeddings = get_model(model_type="embeddings")
-    vdb = FAISS.load_local(PATH_DB, embeddings, allow_dangerous_deserialization = True)
-    doc = vdb.similarity_search(inputs["input"], k = 1)
-    logger.debug(f"Información recuperada por el RAG: '{doc[0].page_content}'")
-    return doc[0].page_content
+    remaining = check_deadline(inputs, "rag")
+    vdb = get_vdb(inputs.get("corpus"))
+    embedding = inputs.get("query_embedding")
+    if embedding is None:
+        embeddings = get_model(model_type="embeddings", timeout=remaining)
+        with embeddings_limiter.slot(LLM_QUEUE_TIMEOUT if remaining is None else min(LLM_QUEUE_TIMEOUT, remaining)):
+            if EMBEDDING_BACKEND == "local":
+                # El modelo local no tiene timeout propio: se espera el resultado como mucho lo que le queda a la solicitud
+                try:
+                    embedding = embeddings.embed_query(inputs["input"], timeout=remaining_time(inputs))
+                except TimeoutError:
+                    raise DeadlineExceeded("Plazo vencido esperando el embedding de la consulta en 'rag'.")
+            else:
+                embedding = embeddings.embed_query(inputs["input"])
+    doc = vdb.similarity_search_by_vector(embedding, k = 1)
+    payload_logger.debug("Información recuperada por el RAG: '%s'", doc[0])
+    return doc[0]
+
+
+def embed_queries(texts: list, deadline: float = None) -> list:
+    """
+    Calcula los embeddings de varias consultas con una sola llamada al proveedor.
+
+    Args:
+        texts (list[str]): Las consultas.
+        deadline (float, opcional): Instante (reloj monótono) en el que vence la solicitud.
+
+    Returns:
+        list[list[float]]: Un embedding por consulta, en el mismo orden.
+    """
+    logger.debug(f"Entrando en la función 'embed_queries'.")
+    remaining = check_deadline({"deadline": deadline}, "embed_queries")
+    embeddings = get_model(model_type="embeddings", timeout=remaining)
+    with embeddings_limiter.slot(LLM_QUEUE_TIMEOUT if remaining is None else min(LLM_QUEUE_TIMEOUT, remaining)):
+        return embeddings.embed_documents(texts)
 
 
 def parse_tokens(inputs: Dict[str, Any], cb) -> Dict[str, Any]:
     """
     Actualiza el diccionario 'inputs' con el uso de tokens a partir de un objeto de callback en la clave 'tokens_used'.
+    Los tokens del prompt se separan además en los que el proveedor leyó de su caché ('prompt_tokens_cached')
+    y los que procesó ('prompt_tokens_uncached').
 
     Args:
         inputs (Dict[str, str]): Diccionario que contiene los datos que se almacenarán en la base de datos, entre ellos la clave 'tokens_used'.
@@ -147,18 +375,20 @@ def parse_tokens(inputs: Dict[str, Any], cb) -> Dict[str, Any]:
         Dict[str, Any]: El diccionario de entrada actualizado con la información del uso de tokens.
     """
     logger.debug(f"Entrando en la función 'parse_tokens'.")
+    cached = getattr(cb, "prompt_tokens_cached", 0) or 0
     token_usage = {
         "completion_tokens": cb.completion_tokens,
         "prompt_tokens": cb.prompt_tokens,
-        "total_tokens": cb.total_tokens
+        "total_tokens": cb.total_tokens,
+        "prompt_tokens_cached": cached,
+        "prompt_tokens_uncached": cb.prompt_tokens - cached
     }
     if "tokens_used" in inputs:
-        inputs["tokens_used"]["completion_tokens"] += token_usage["completion_tokens"]
-        inputs["tokens_used"]["prompt_tokens"] += token_usage["prompt_tokens"]
-        inputs["tokens_used"]["total_tokens"] += token_usage["total_tokens"]
+        for name, value in token_usage.items():
+            inputs["tokens_used"][name] = inputs["tokens_used"].get(name, 0) + value
     else:
         inputs["tokens_used"] = token_usage
-    logger.debug(f"Tokens calculados: {inputs['tokens_used']}")
+    logger.debug("Tokens calculados: %s", inputs['tokens_used'])
     return inputs
 
 
@@ -202,7 +432,7 @@ def edge_has_name(inputs) -> str:
     Returns:
         str: Devuelve "request" si se proporciona un nombre, de lo contrario devuelve "end".
     """
-    logger.debug(f"Entrando a 'edge_has_name'. Sus inputs son: {inputs["user_name"]}")
+    logger.debug("Entrando a 'edge_has_name'. Sus inputs son: %s", inputs["user_name"])
     if inputs["user_name"]:
         logger.debug("Respuesta del conditional_edge 'edge_has_name': 'request'")
         return "request"
@@ -219,12 +449,31 @@ def edge_has_language(inputs) -> str:
         inputs (Dict[str, Any]): Un diccionario que contiene la clave "language" con el idioma del usuario.
 
     Returns:
-        str: Devuelve "rag" si se proporciona un idioma, de lo contrario devuelve "end".
+        str: Devuelve "rag" si se proporciona un idioma (o si se está en modo degradado con la consulta ya
+        recibida), de lo contrario devuelve "end".
     """
-    logger.debug(f"Entrando a 'edge_has_language'. Sus inputs son: {inputs["language"]}")
-    if inputs["language"]:
+    logger.debug("Entrando a 'edge_has_language'. Sus inputs son: %s", inputs["language"])
+    if inputs["language"] or (inputs.get("degraded") and inputs.get("input_translated")):
         logger.debug("Respuesta del conditional_edge 'edge_has_language': 'call_rag'")
         return "call_rag"
     else:
         logger.debug("Respuesta del conditional_edge 'edge_has_language': 'end'")
-        return "end"
\ No newline at end of file
+        return "end"
+
+
+def edge_is_degraded(inputs) -> str:
+    """
+    Evalúa si la respuesta se generó en modo degradado (sin LLM), en cuyo caso no se ejecuta el nodo 'personality'.
+
+    Args:
+        inputs (Dict[str, Any]): Un diccionario que contiene la clave "degraded".
+
+    Returns:
+        str: Devuelve "end" si se está en modo degradado, de lo contrario devuelve "personality".
+    """
+    if inputs.get("degraded"):
+        logger.debug("Respuesta del conditional_edge 'edge_is_degraded': 'end'")
+        return "end"
+    else:
+        logger.debug("Respuesta del conditional_edge 'edge_is_degraded': 'personality'")
+        return "personality"
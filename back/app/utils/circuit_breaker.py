@@ -0,0 +1,137 @@
+import os
+from dotenv import load_dotenv
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+BREAKER_WINDOW = int(os.getenv('BREAKER_WINDOW', '20'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('BREAKER_FAILURE_THRESHOLD', '5'))
+BREAKER_SLOW_CALL_SECONDS = float(os.getenv('BREAKER_SLOW_CALL_SECONDS', '20'))
+BREAKER_OPEN_SECONDS = float(os.getenv('BREAKER_OPEN_SECONDS', '30'))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv('BREAKER_HALF_OPEN_PROBES', '1'))
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """
+    Se lanza cuando el circuito está abierto y la llamada al proveedor no se intenta.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker para las llamadas al proveedor del LLM.
+
+    - Cerrado: las llamadas pasan. Se guarda el resultado de las últimas 'window' llamadas; las llamadas que
+      fallan o tardan más de 'slow_call_seconds' cuentan como fallas. Al llegar a 'failure_threshold' fallas
+      el circuito se abre.
+    - Abierto: las llamadas se rechazan de inmediato con `CircuitOpen` durante 'open_seconds'.
+    - Semiabierto: pasado ese tiempo se dejan pasar hasta 'half_open_probes' llamadas de prueba. Si una
+      prueba sale bien el circuito se cierra; si falla, se vuelve a abrir.
+    """
+    def __init__(self, name: str, window: int, failure_threshold: int, slow_call_seconds: float,
+                 open_seconds: float, half_open_probes: int):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.state = CLOSED
+        self._results = deque(maxlen=window)
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def _transition(self, state: str) -> None:
+        logger.warning("[%s] Circuito: '%s' -> '%s'.", self.name, self.state, state)
+        metrics.incr(f"{self.name}.{state}")
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        else:
+            self._results.clear()
+        self._probes = 0
+
+    def is_open(self) -> bool:
+        """
+        Indica si el circuito está abierto y todavía no llegó el momento de probar al proveedor.
+        No consume llamadas de prueba.
+        """
+        with self._lock:
+            return self.state == OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def before_call(self) -> None:
+        """
+        Decide si una llamada puede hacerse.
+
+        Excepciones:
+            CircuitOpen: Si el circuito está abierto, o semiabierto sin lugar para otra llamada de prueba.
+        """
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+                self._transition(HALF_OPEN)
+            if self.state == OPEN or (self.state == HALF_OPEN and self._probes >= self.half_open_probes):
+                metrics.incr(f"{self.name}.rejected")
+                raise CircuitOpen(f"Circuito '{self.name}' abierto.")
+            if self.state == HALF_OPEN:
+                self._probes += 1
+
+    def record(self, success: bool) -> None:
+        """
+        Registra el resultado de una llamada y actualiza el estado del circuito.
+        """
+        with self._lock:
+            if self.state == HALF_OPEN:
+                self._transition(CLOSED if success else OPEN)
+                return
+            if self.state == OPEN:
+                return
+            self._results.append(success)
+            if self._results.count(False) >= self.failure_threshold:
+                self._transition(OPEN)
+
+    @contextmanager
+    def guard(self, ignore: tuple = ()):
+        """
+        Context manager que verifica el circuito antes de la llamada y registra su resultado.
+        Las excepciones de los tipos en 'ignore' (errores locales, no del proveedor) no cuentan como fallas.
+        """
+        self.before_call()
+        start = time.monotonic()
+        try:
+            yield
+        except ignore:
+            with self._lock:
+                if self.state == HALF_OPEN:
+                    self._probes -= 1
+            raise
+        except Exception:
+            self.record(False)
+            raise
+        else:
+            self.record(time.monotonic() - start <= self.slow_call_seconds)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "recent_failures": self._results.count(False),
+                "recent_calls": len(self._results),
+                "seconds_until_half_open": (
+                    round(max(0.0, self.open_seconds - (time.monotonic() - self._opened_at)), 2)
+                    if self.state == OPEN else None
+                ),
+            }
+
+
+# static instance for common usages
+chat_breaker = CircuitBreaker("chat_breaker", BREAKER_WINDOW, BREAKER_FAILURE_THRESHOLD,
+                              BREAKER_SLOW_CALL_SECONDS, BREAKER_OPEN_SECONDS, BREAKER_HALF_OPEN_PROBES)
+metrics.register("chat_breaker", chat_breaker.snapshot)
@@ -0,0 +1,53 @@
+import os
+from dotenv import load_dotenv
+import time
+from typing import Optional
+from utils.logger import logger
+
+load_dotenv()
+REQUEST_TIMEOUT = float(os.getenv('REQUEST_TIMEOUT', '30'))
+
+
+class DeadlineExceeded(Exception):
+    """
+    Se lanza cuando se agotó el tiempo disponible para responder una solicitud.
+    """
+
+
+def new_deadline(timeout: float = REQUEST_TIMEOUT) -> float:
+    """
+    Calcula el instante (reloj monótono del proceso) en el que vence una solicitud que empieza ahora.
+    """
+    return time.monotonic() + timeout
+
+
+def remaining_time(inputs: dict) -> Optional[float]:
+    """
+    Devuelve los segundos que le quedan a la solicitud según la clave 'deadline' de 'inputs',
+    o None si la solicitud no tiene plazo.
+    """
+    deadline = inputs.get("deadline") if inputs else None
+    if deadline is None:
+        return None
+    return deadline - time.monotonic()
+
+
+def check_deadline(inputs: dict, where: str) -> Optional[float]:
+    """
+    Verifica que la solicitud todavía tenga tiempo disponible antes de empezar un paso costoso.
+
+    Args:
+        inputs (dict): Diccionario con el estado de la solicitud, incluyendo la clave 'deadline'.
+        where (str): Nombre del paso que se va a ejecutar, usado en el log.
+
+    Returns:
+        Optional[float]: Los segundos restantes, o None si la solicitud no tiene plazo.
+
+    Excepciones:
+        DeadlineExceeded: Si el plazo de la solicitud ya venció.
+    """
+    remaining = remaining_time(inputs)
+    if remaining is not None and remaining <= 0:
+        logger.warning("Plazo de la solicitud vencido antes de ejecutar '%s' (%.2f segundos de atraso).", where, -remaining)
+        raise DeadlineExceeded(f"Plazo vencido antes de ejecutar '{where}'.")
+    return remaining
@@ -0,0 +1,198 @@
+import os
+from dotenv import load_dotenv
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+# 'openai' (por defecto) o 'local' (modelo ONNX de 'LOCAL_EMBEDDING_PATH', en CPU)
+EMBEDDING_BACKEND = os.getenv('EMBEDDING_BACKEND', 'openai').lower()
+EMBEDDING_SIZE_MODEL = os.getenv('EMBEDDING_SIZE_MODEL')
+# Carpeta con 'model.onnx' (o el archivo .onnx) y 'tokenizer.json' de un modelo de sentence-embeddings
+LOCAL_EMBEDDING_PATH = os.getenv('LOCAL_EMBEDDING_PATH', 'models/embeddings')
+LOCAL_EMBEDDING_MAX_LENGTH = int(os.getenv('LOCAL_EMBEDDING_MAX_LENGTH', '256'))
+LOCAL_EMBEDDING_MAX_BATCH = int(os.getenv('LOCAL_EMBEDDING_MAX_BATCH', '32'))
+# Milisegundos que se espera a otras consultas para armar un lote
+LOCAL_EMBEDDING_BATCH_WAIT_MS = float(os.getenv('LOCAL_EMBEDDING_BATCH_WAIT_MS', '2'))
+# Lotes que se ejecutan a la vez, y hilos de ONNX Runtime por lote
+LOCAL_EMBEDDING_WORKERS = int(os.getenv('LOCAL_EMBEDDING_WORKERS', '2'))
+LOCAL_EMBEDDING_INTRA_THREADS = int(os.getenv('LOCAL_EMBEDDING_INTRA_THREADS', '1'))
+
+"""
+Backends de embeddings.
+
+`get_model(model_type="embeddings")` devuelve el backend configurado en 'EMBEDDING_BACKEND'. Ambos tienen la
+misma interfaz que usan `rag`, `embed_queries` y `create_vdb`: `embed_query(text)` y `embed_documents(texts)`.
+
+El backend local ejecuta un modelo de sentence-embeddings exportado a ONNX (opcionalmente cuantizado) en CPU,
+con 'onnxruntime' y 'tokenizers' (dependencias opcionales, solo necesarias con este backend):
+    - Las consultas concurrentes (`embed_query`) se agrupan en lotes de hasta 'LOCAL_EMBEDDING_MAX_BATCH',
+      esperando como mucho 'LOCAL_EMBEDDING_BATCH_WAIT_MS' a que lleguen otras.
+    - Los lotes se ejecutan en un pool de 'LOCAL_EMBEDDING_WORKERS' hilos; la cantidad de lotes pendientes
+      también está acotada, así que con el pool ocupado las consultas esperan en lugar de acumular memoria.
+    - Los embeddings se calculan con mean pooling sobre la máscara de atención y se normalizan (L2), salvo
+      que el modelo ya devuelva un vector por texto.
+"""
+
+
+class EmbeddingMismatch(ValueError):
+    """
+    Se lanza cuando la dimensión de los embeddings no coincide con 'EMBEDDING_SIZE_MODEL' o con la del índice.
+    """
+
+
+class LocalEmbeddings:
+    """
+    Embeddings calculados localmente con un modelo ONNX, con micro-batching de las consultas concurrentes.
+    """
+    def __init__(self, path: str = LOCAL_EMBEDDING_PATH,
+                 max_batch: int = LOCAL_EMBEDDING_MAX_BATCH,
+                 batch_wait_ms: float = LOCAL_EMBEDDING_BATCH_WAIT_MS,
+                 workers: int = LOCAL_EMBEDDING_WORKERS):
+        try:
+            import numpy as np
+            import onnxruntime as ort
+            from tokenizers import Tokenizer
+        except ImportError as e:
+            raise RuntimeError("El backend de embeddings 'local' requiere instalar 'onnxruntime' y 'tokenizers'.") from e
+        self._np = np
+        model_path = path if path.endswith(".onnx") else os.path.join(path, "model.onnx")
+        tokenizer_path = os.path.join(os.path.dirname(model_path), "tokenizer.json")
+        options = ort.SessionOptions()
+        options.intra_op_num_threads = LOCAL_EMBEDDING_INTRA_THREADS
+        options.inter_op_num_threads = 1
+        self._session = ort.InferenceSession(model_path, sess_options=options, providers=["CPUExecutionProvider"])
+        self._input_names = {i.name for i in self._session.get_inputs()}
+        self._tokenizer = Tokenizer.from_file(tokenizer_path)
+        self._tokenizer.enable_truncation(max_length=LOCAL_EMBEDDING_MAX_LENGTH)
+        self._tokenizer.enable_padding()
+        self.max_batch = max_batch
+        self.batch_wait = batch_wait_ms / 1000
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="embeddings")
+        # Como mucho dos lotes pendientes por hilo del pool
+        self._slots = threading.BoundedSemaphore(workers * 2)
+        self._queue = queue.SimpleQueue()
+        self._dispatcher = None
+        self._lock = threading.Lock()
+        self.dimensions = len(self._encode(["dimensión"])[0])
+        logger.info("Modelo de embeddings local cargado desde '%s' (%d dimensiones).", model_path, self.dimensions)
+
+    def _encode(self, texts: list) -> list:
+        np = self._np
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        output = self._session.run(None, {k: v for k, v in feeds.items() if k in self._input_names})[0]
+        if output.ndim == 3:
+            mask = attention_mask[..., None].astype(output.dtype)
+            output = (output * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+        output = output / np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+        return output.tolist()
+
+    def _run_batch(self, batch: list) -> None:
+        start = time.monotonic()
+        try:
+            vectors = self._encode([text for text, _ in batch])
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+        finally:
+            self._slots.release()
+            metrics.observe("embeddings.local.batch_size", len(batch))
+            metrics.observe("embeddings.local.batch_seconds", time.monotonic() - start)
+
+    def _dispatch(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._slots.acquire()
+            self._executor.submit(self._run_batch, batch)
+
+    def _ensure_dispatcher(self) -> None:
+        if self._dispatcher is None:
+            with self._lock:
+                if self._dispatcher is None:
+                    self._dispatcher = threading.Thread(target=self._dispatch, name="embeddings-batcher", daemon=True)
+                    self._dispatcher.start()
+
+    def embed_query(self, text: str, timeout: Optional[float] = None) -> list:
+        self._ensure_dispatcher()
+        future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout)
+
+    def embed_documents(self, texts: list) -> list:
+        """
+        Calcula los embeddings de muchos textos en lotes de 'max_batch', en el pool de hilos
+        (sin pasar por el agrupador de consultas).
+        """
+        futures = []
+        for i in range(0, len(texts), self.max_batch):
+            self._slots.acquire()
+            futures.append(self._executor.submit(self._encode_with_slot, texts[i:i + self.max_batch]))
+        return [vector for future in futures for vector in future.result()]
+
+    def _encode_with_slot(self, texts: list) -> list:
+        try:
+            return self._encode(texts)
+        finally:
+            self._slots.release()
+
+
+@lru_cache(maxsize=1)
+def get_local_embeddings() -> LocalEmbeddings:
+    """
+    Carga el modelo local una vez por proceso. En los workers creados con fork se vuelve a cargar
+    (ver `utils.startup.after_fork`), porque los hilos de ONNX Runtime no sobreviven al fork.
+    """
+    return LocalEmbeddings()
+
+
+def embedding_dimensions() -> Optional[int]:
+    """
+    Devuelve la dimensión de los embeddings del backend configurado, o None si no se puede saber
+    sin llamar al proveedor ('openai' sin 'EMBEDDING_SIZE_MODEL').
+
+    Excepciones:
+        EmbeddingMismatch: Si el modelo local no genera vectores de 'EMBEDDING_SIZE_MODEL' dimensiones.
+    """
+    configured = int(EMBEDDING_SIZE_MODEL) if EMBEDDING_SIZE_MODEL else None
+    if EMBEDDING_BACKEND != "local":
+        return configured
+    dimensions = get_local_embeddings().dimensions
+    if configured is not None and configured != dimensions:
+        raise EmbeddingMismatch(
+            f"El modelo local genera embeddings de {dimensions} dimensiones y EMBEDDING_SIZE_MODEL es {configured}."
+        )
+    return dimensions
+
+
+def validate_index(index, name: str) -> None:
+    """
+    Verifica que el índice FAISS 'index' tenga la dimensión de los embeddings del backend configurado.
+
+    Excepciones:
+        EmbeddingMismatch: Si no coinciden (por ejemplo, un índice creado con otro modelo de embeddings).
+    """
+    dimensions = embedding_dimensions()
+    if dimensions is not None and index.d != dimensions:
+        raise EmbeddingMismatch(
+            f"El índice '{name}' tiene vectores de {index.d} dimensiones y el backend de embeddings "
+            f"'{EMBEDDING_BACKEND}' genera {dimensions}. Hay que recrear el índice con el mismo modelo."
+        )
@@ -0,0 +1,126 @@
+import os
+from dotenv import load_dotenv
+import contextvars
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Optional
+from utils.deadline import DeadlineExceeded
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+LLM_HEDGE_ENABLED = os.getenv('LLM_HEDGE_ENABLED', 'false').lower() == 'true'
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '95'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW', '200'))
+LLM_HEDGE_MAX_WORKERS = int(os.getenv('LLM_HEDGE_MAX_WORKERS', '32'))
+
+
+class LatencyTracker:
+    """
+    Guarda las últimas latencias observadas por prompt para estimar sus percentiles.
+    """
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self._lock = threading.Lock()
+        self._window = window
+        self._samples = {}
+
+    def record(self, prompt_name: str, latency: float) -> None:
+        with self._lock:
+            self._samples.setdefault(prompt_name, deque(maxlen=self._window)).append(latency)
+
+    def percentile(self, prompt_name: str, percentile: float = LLM_HEDGE_PERCENTILE) -> Optional[float]:
+        """
+        Devuelve el percentil pedido de las latencias de 'prompt_name', o None si todavía no hay
+        suficientes muestras para estimarlo.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(prompt_name, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        index = min(len(samples) - 1, int(round(percentile / 100 * (len(samples) - 1))))
+        return samples[index]
+
+    def snapshot(self) -> dict:
+        return {
+            prompt_name: {"samples": len(self._samples[prompt_name]), f"p{int(LLM_HEDGE_PERCENTILE)}": self.percentile(prompt_name)}
+            for prompt_name in list(self._samples)
+        }
+
+
+latency_tracker = LatencyTracker()
+metrics.register("llm_latency", latency_tracker.snapshot)
+_executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+
+
+def _submit(fn: Callable, prompt_name: str):
+    def timed():
+        start = time.monotonic()
+        result = fn()
+        latency_tracker.record(prompt_name, time.monotonic() - start)
+        return result
+    # Cada llamada corre con una copia del contexto para conservar los callbacks de conteo de tokens
+    return _executor.submit(contextvars.copy_context().run, timed)
+
+
+def reset_executor() -> None:
+    """
+    Reemplaza el pool de hilos por uno nuevo. Se usa en los procesos hijos después de un fork,
+    donde los hilos del pool heredado no existen.
+    """
+    global _executor
+    _executor = ThreadPoolExecutor(max_workers=LLM_HEDGE_MAX_WORKERS, thread_name_prefix="hedge")
+
+
+def hedged_call(fn: Callable, prompt_name: str, timeout: Optional[float] = None):
+    """
+    Ejecuta 'fn' y, si tarda más que el percentil configurado de las latencias del prompt, lanza una
+    segunda llamada idéntica y devuelve el resultado de la que termine primero.
+
+    Args:
+        fn (Callable): Función sin argumentos que realiza la llamada al LLM.
+        prompt_name (str): Nombre del prompt, usado para llevar las latencias por separado.
+        timeout (Optional[float]): Segundos máximos de espera (el tiempo restante de la solicitud).
+
+    Returns:
+        El resultado de la primera llamada exitosa.
+
+    Excepciones:
+        DeadlineExceeded: Si ninguna llamada terminó antes de 'timeout'.
+        Exception: El error de la última llamada si todas fallaron.
+
+    Notas:
+        - Si 'LLM_HEDGE_ENABLED' está desactivado o todavía no hay suficientes muestras, la llamada se
+          hace directamente en el hilo actual (solo se registra su latencia).
+        - La llamada que pierde no se cancela; su resultado se descarta.
+    """
+    delay = latency_tracker.percentile(prompt_name) if LLM_HEDGE_ENABLED else None
+    if delay is None or (timeout is not None and delay >= timeout):
+        start = time.monotonic()
+        result = fn()
+        latency_tracker.record(prompt_name, time.monotonic() - start)
+        return result
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    primary = _submit(fn, prompt_name)
+    done, pending = wait({primary}, timeout=delay)
+    if not done:
+        metrics.incr(f"hedge.{prompt_name}.fired")
+        logger.info("Llamada al LLM con el prompt '%s' superó %.2f segundos, se lanza una llamada duplicada.", prompt_name, delay)
+        pending.add(_submit(fn, prompt_name))
+    error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                if future is not primary:
+                    metrics.incr(f"hedge.{prompt_name}.won")
+                return future.result()
+            error = future.exception()
+        if not pending:
+            raise error
+        wait_for = None if deadline is None else max(0, deadline - time.monotonic())
+        done, pending = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+        if not done:
+            raise DeadlineExceeded(f"La llamada al LLM con el prompt '{prompt_name}' superó el plazo de la solicitud.")
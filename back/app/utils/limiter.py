@@ -0,0 +1,165 @@
+import os
+from dotenv import load_dotenv
+import math
+import threading
+import time
+from contextlib import contextmanager
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+LLM_INITIAL_CONCURRENCY = int(os.getenv('LLM_INITIAL_CONCURRENCY', '8'))
+LLM_MIN_CONCURRENCY = int(os.getenv('LLM_MIN_CONCURRENCY', '1'))
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '64'))
+LLM_MAX_QUEUE = int(os.getenv('LLM_MAX_QUEUE', '64'))
+LLM_QUEUE_TIMEOUT = float(os.getenv('LLM_QUEUE_TIMEOUT', '10'))
+LLM_TARGET_LATENCY = float(os.getenv('LLM_TARGET_LATENCY', '10'))
+EMBEDDING_TARGET_LATENCY = float(os.getenv('EMBEDDING_TARGET_LATENCY', '2'))
+
+
+class Overloaded(Exception):
+    """
+    Se lanza cuando el servicio no puede admitir más trabajo. 'retry_after' es la cantidad
+    de segundos sugerida al cliente antes de reintentar.
+    """
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def is_throttled(error: Exception) -> bool:
+    """
+    Indica si una excepción del proveedor corresponde a un límite de tasa (HTTP 429).
+    """
+    return getattr(error, "status_code", None) == 429
+
+
+class AdaptiveLimiter:
+    """
+    Limitador de concurrencia adaptativo (AIMD) con cola acotada.
+
+    Cada llamada al proveedor ocupa un lugar mientras dura. Si no hay lugares libres, la llamada
+    espera en la cola hasta que se libere uno o venza su plazo. Si la cola está llena, se rechaza
+    de inmediato con `Overloaded`.
+
+    El límite crece de a uno por ventana de llamadas exitosas (incremento aditivo) y se reduce a la
+    mitad ante un 429, o un 10% ante una latencia mayor a 'target_latency' (decremento multiplicativo),
+    como mucho una vez por ventana de 'target_latency' segundos.
+    """
+    def __init__(self, name: str, initial: int, min_limit: int, max_limit: int, max_queue: int, target_latency: float):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.target_latency = target_latency
+        self.limit = float(min(max(initial, min_limit), max_limit))
+        self.in_flight = 0
+        self.waiting = 0
+        self._avg_latency = None
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def _retry_after(self) -> int:
+        latency = self._avg_latency or self.target_latency
+        return max(1, min(60, math.ceil(latency * (self.waiting + 1) / max(self.limit, 1))))
+
+    def _reject(self, reason: str) -> Overloaded:
+        metrics.incr(f"{self.name}.rejected.{reason}")
+        logger.warning("[%s] Solicitud rechazada (%s): %s en curso, %s en cola, límite %.1f.",
+                       self.name, reason, self.in_flight, self.waiting, self.limit)
+        return Overloaded(f"Servicio saturado ({self.name}).", retry_after=self._retry_after())
+
+    def check_admission(self) -> None:
+        """
+        Rechaza la solicitud de inmediato si la cola ya está llena, antes de hacer cualquier otro trabajo.
+        """
+        with self._cond:
+            if self.waiting >= self.max_queue:
+                raise self._reject("queue_full")
+
+    def acquire(self, timeout: float) -> None:
+        """
+        Ocupa un lugar, esperando como mucho 'timeout' segundos en la cola.
+
+        Excepciones:
+            Overloaded: Si la cola está llena o si venció el plazo de espera.
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight >= int(self.limit) or self.waiting:
+                if self.waiting >= self.max_queue:
+                    raise self._reject("queue_full")
+                self.waiting += 1
+                metrics.set_gauge(f"{self.name}.queue_depth", self.waiting)
+                try:
+                    while self.in_flight >= int(self.limit):
+                        remaining = start + timeout - time.monotonic()
+                        if remaining <= 0:
+                            raise self._reject("queue_timeout")
+                        self._cond.wait(remaining)
+                finally:
+                    self.waiting -= 1
+                    metrics.set_gauge(f"{self.name}.queue_depth", self.waiting)
+            self.in_flight += 1
+            metrics.set_gauge(f"{self.name}.in_flight", self.in_flight)
+        metrics.observe(f"{self.name}.queue_wait_seconds", time.monotonic() - start)
+
+    def release(self, latency: float = None, throttled: bool = False) -> None:
+        """
+        Libera un lugar y ajusta el límite según la latencia observada o si hubo un 429.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            now = time.monotonic()
+            slow = latency is not None and latency > self.target_latency
+            if throttled or slow:
+                if now - self._last_decrease > self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * (0.5 if throttled else 0.9))
+                    self._last_decrease = now
+                    logger.info("[%s] Límite de concurrencia reducido a %.1f (%s).",
+                                self.name, self.limit, "429" if throttled else "latencia alta")
+            elif latency is not None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            if latency is not None:
+                self._avg_latency = latency if self._avg_latency is None else 0.9 * self._avg_latency + 0.1 * latency
+            metrics.set_gauge(f"{self.name}.in_flight", self.in_flight)
+            metrics.set_gauge(f"{self.name}.limit", round(self.limit, 2))
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout: float = LLM_QUEUE_TIMEOUT):
+        """
+        Context manager que ocupa un lugar durante la llamada al proveedor y lo libera al terminar,
+        informando la latencia (si la llamada fue exitosa) o si el proveedor respondió con un 429.
+        """
+        self.acquire(timeout)
+        start = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            throttled = is_throttled(e)
+            if throttled:
+                metrics.incr(f"{self.name}.throttled")
+            self.release(throttled=throttled)
+            raise
+        else:
+            self.release(latency=time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queue_depth": self.waiting,
+                "max_queue": self.max_queue,
+                "avg_latency": round(self._avg_latency, 4) if self._avg_latency is not None else None,
+            }
+
+
+# static instances for common usages
+llm_limiter = AdaptiveLimiter("llm_limiter", LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY,
+                              LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, LLM_TARGET_LATENCY)
+embeddings_limiter = AdaptiveLimiter("embeddings_limiter", LLM_INITIAL_CONCURRENCY, LLM_MIN_CONCURRENCY,
+                                     LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE, EMBEDDING_TARGET_LATENCY)
+metrics.register("llm_limiter", llm_limiter.snapshot)
+metrics.register("embeddings_limiter", embeddings_limiter.snapshot)
@@ -1,11 +1,23 @@
+import atexit
+import copy
+import json
 import logging
+import logging.handlers
 import os
 import platform
+import queue
+import random
 import sys
 from dotenv import load_dotenv
 
 load_dotenv()
 DEBUG = os.getenv('DEBUG')
+# 'text' (con colores, para desarrollo) o 'json' (una línea JSON por registro, para producción)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text').lower()
+# Si está activo, los registros se escriben desde un hilo aparte (QueueHandler/QueueListener)
+LOG_ASYNC = os.getenv('LOG_ASYNC', 'true').lower() == 'true'
+# Proporción de registros que se conservan por logger hijo, por ejemplo: "payload=0.1"
+LOG_SAMPLE_RATES = os.getenv('LOG_SAMPLE_RATES', '')
 
 # Define color codes for log levels
 COLOR_CODES = {
@@ -17,33 +29,161 @@ COLOR_CODES = {
 }
 RESET_CODE = '\033[0m'  # Reset color code
 
+# Atributos estándar de LogRecord; el resto son campos agregados con 'extra'
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+def _hostname() -> str:
+    try:
+        return os.uname().nodename
+    except AttributeError:
+        return platform.uname().node
+    except Exception:
+        return "unknown"
+
 
 class ColoredFormatter(logging.Formatter):
     def format(self, record):
         levelname = record.levelname
         if levelname in COLOR_CODES:
-            levelname_color = f"{COLOR_CODES[levelname]}{levelname}{RESET_CODE}"
-            record.levelname = levelname_color
+            # Se colorea una copia para no modificar el registro que pueden usar otros handlers
+            record = copy.copy(record)
+            record.levelname = f"{COLOR_CODES[levelname]}{levelname}{RESET_CODE}"
         return super().format(record)
 
 
+class JsonFormatter(logging.Formatter):
+    """
+    Formatea cada registro como una línea JSON con los campos estándar y los agregados con 'extra'.
+    """
+    def __init__(self, hostname: str):
+        super().__init__()
+        self.hostname = hostname
+
+    def format(self, record):
+        data = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "host": self.hostname,
+            "process": record.process,
+            "module": record.module,
+            "function": record.funcName,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                data[key] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler que en el hilo que hace el log solo arma el mensaje con sus argumentos (y el texto de la
+    excepción, si hay): el resto del formateo (fecha, colores o JSON) ocurre en el hilo del QueueListener.
+
+    Se encola el mismo registro con el mensaje ya armado y sin argumentos ni excepción, así los cambios
+    posteriores a los objetos pasados al logger no alteran lo que se escribe. No se copia (como hace
+    `QueueHandler.prepare`): copiar el registro costaba casi lo mismo que escribirlo, y otros handlers del
+    mismo registro obtienen el mismo mensaje y el mismo texto de la excepción.
+    """
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Conserva solo una proporción 'rate' de los registros de nivel menor a WARNING.
+    Las advertencias y errores siempre se conservan.
+    """
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def _parse_sample_rates(value: str) -> dict:
+    rates = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, _, rate = item.partition("=")
+        rates[name.strip()] = float(rate)
+    return rates
+
+
 class GetLogger:
-    def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        self.logger.setLevel(logging.DEBUG if DEBUG else logging.INFO)
+    def __init__(self, name=__name__, level=None, log_format=LOG_FORMAT, use_queue=LOG_ASYNC, stream=None):
+        self.logger = logging.getLogger(name)
+        self.logger.setLevel(level if level is not None else (logging.DEBUG if DEBUG else logging.INFO))
+        self.listener = None
+        self._listening = False
         if not self.logger.handlers:
             # add console handler
-            stream_handler = logging.StreamHandler(sys.stdout)
-            try:
-                hostname = os.uname().nodename
-            except AttributeError:
-                hostname = platform.uname().node
-            except Exception:
-                hostname = "unknown"
-            formatter = ColoredFormatter(
-                f'[%(asctime)s][%(levelname)s][{hostname}/%(process)d][%(module)s][%(funcName)s] %(message)s')
+            stream_handler = logging.StreamHandler(stream or sys.stdout)
+            hostname = _hostname()
+            if log_format == "json":
+                formatter = JsonFormatter(hostname)
+            else:
+                formatter = ColoredFormatter(
+                    f'[%(asctime)s][%(levelname)s][{hostname}/%(process)d][%(module)s][%(funcName)s] %(message)s')
             stream_handler.setFormatter(formatter)
-            self.logger.addHandler(stream_handler)
+            if use_queue:
+                # La escritura (y el formateo) se hace en el hilo del listener, fuera del hilo de la solicitud
+                log_queue = queue.SimpleQueue()
+                self.logger.addHandler(LazyQueueHandler(log_queue))
+                self._start_listener(log_queue, stream_handler)
+                atexit.register(self.stop)
+            else:
+                self.logger.addHandler(stream_handler)
+
+    def _start_listener(self, log_queue, *handlers):
+        self.listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self._listening = True
+
+    def stop(self):
+        """
+        Detiene el hilo del listener, escribiendo antes los registros pendientes.
+        """
+        if self.listener and self._listening:
+            self._listening = False
+            self.listener.stop()
+
+    def restart(self):
+        """
+        Vuelve a iniciar el hilo del listener (por ejemplo, en un proceso hijo después de un fork,
+        donde los hilos del proceso padre no existen): crea un listener nuevo con la misma cola y handlers.
+        """
+        if self.listener:
+            self._start_listener(self.listener.queue, *self.listener.handlers)
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Devuelve un logger hijo de 'logger' (comparte sus handlers). Si 'LOG_SAMPLE_RATES' define una
+    proporción para 'name', se conserva solo esa proporción de sus registros informativos y de debug.
+
+    Se usa para los registros con contenido voluminoso (prompts, respuestas completas, información recuperada).
+    """
+    child = logger.getChild(name)
+    rate = _parse_sample_rates(LOG_SAMPLE_RATES).get(name)
+    if rate is not None and not any(isinstance(f, SamplingFilter) for f in child.filters):
+        child.addFilter(SamplingFilter(rate))
+    return child
 
 
-logger = GetLogger().logger
\ No newline at end of file
+_root = GetLogger()
+logger = _root.logger
+# Logger para el contenido voluminoso de cada interacción
+payload_logger = get_logger("payload")
@@ -0,0 +1,99 @@
+import threading
+from typing import Callable
+
+
+class Metrics:
+    """
+    Registro de métricas en memoria del proceso.
+
+    Mantiene contadores, indicadores (gauges) y observaciones de tiempos identificados por nombre,
+    protegidos por un lock para poder actualizarlos desde los distintos hilos que atienden las solicitudes.
+    Otros componentes pueden registrar funciones que devuelven su propio estado, que se incluyen en `snapshot`.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._timings = {}
+        self._providers = {}
+
+    def incr(self, name: str, value: int = 1) -> None:
+        """
+        Incrementa el contador 'name' en 'value' unidades.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def get(self, name: str) -> int:
+        """
+        Devuelve el valor actual del contador 'name' (0 si nunca se incrementó).
+        """
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """
+        Fija el valor instantáneo del indicador 'name' (por ejemplo, la profundidad de una cola).
+        """
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name: str, value: float) -> None:
+        """
+        Registra una observación (por ejemplo, un tiempo de espera en segundos) acumulando
+        cantidad, suma y máximo.
+        """
+        with self._lock:
+            timing = self._timings.setdefault(name, {"count": 0, "sum": 0.0, "max": 0.0})
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["max"] = max(timing["max"], value)
+
+    def register(self, name: str, provider: Callable[[], dict]) -> None:
+        """
+        Registra una función que devuelve el estado de un componente para incluirlo en `snapshot`.
+        """
+        with self._lock:
+            self._providers[name] = provider
+
+    def ratio(self, hits: str, misses: str) -> float:
+        """
+        Calcula la proporción de aciertos entre dos contadores (por ejemplo, la tasa de acierto
+        de un camino rápido). Devuelve 0.0 si todavía no hubo eventos.
+        """
+        with self._lock:
+            hit = self._counters.get(hits, 0)
+            total = hit + self._counters.get(misses, 0)
+        return round(hit / total, 4) if total else 0.0
+
+    def reset(self) -> None:
+        """
+        Borra contadores, indicadores y tiempos, conservando las funciones registradas
+        (por ejemplo, en un proceso hijo para no heredar los valores del proceso padre).
+        """
+        with self._lock:
+            self._counters = {}
+            self._gauges = {}
+            self._timings = {}
+
+    def snapshot(self) -> dict:
+        """
+        Devuelve una copia de todas las métricas registradas.
+        """
+        with self._lock:
+            snapshot = {
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+                "timings": {
+                    name: {**timing, "avg": round(timing["sum"] / timing["count"], 4)}
+                    for name, timing in self._timings.items()
+                },
+            }
+            providers = dict(self._providers)
+        for name, provider in providers.items():
+            snapshot[name] = provider()
+        return snapshot
+
+
+# static instance for common usages
+metrics = Metrics()
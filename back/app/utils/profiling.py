@@ -0,0 +1,285 @@
+import os
+from dotenv import load_dotenv
+import hmac
+import io
+import random
+import re
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+# Todo el perfilado está desactivado por defecto
+PROFILING_ENABLED = os.getenv('PROFILING_ENABLED', 'false').lower() == 'true'
+# Valor del encabezado 'X-Profile' que pide perfilar una solicitud (vacío: no se aceptan pedidos por encabezado)
+PROFILING_TOKEN = os.getenv('PROFILING_TOKEN', '')
+# Proporción de solicitudes que se perfilan al azar (0 a 1)
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', '0'))
+# 'auto' (pyinstrument si está instalado, si no cProfile), 'pyinstrument' o 'cprofile'
+PROFILING_ENGINE = os.getenv('PROFILING_ENGINE', 'auto').lower()
+PROFILING_DIR = os.getenv('PROFILING_DIR', 'profiles')
+# Cantidad máxima de perfiles guardados; se borran los más viejos
+PROFILING_MAX_PROFILES = int(os.getenv('PROFILING_MAX_PROFILES', '200'))
+# Cuadros de pila que guarda tracemalloc por asignación (0: sin seguimiento de memoria)
+PROFILING_TRACEMALLOC_FRAMES = int(os.getenv('PROFILING_TRACEMALLOC_FRAMES', '0'))
+
+"""
+Perfilado bajo demanda de solicitudes individuales.
+
+Con 'PROFILING_ENABLED=true', una interacción se perfila si trae el encabezado 'X-Profile' con el valor de
+'PROFILING_TOKEN', o al azar con probabilidad 'PROFILING_SAMPLE_RATE'. El perfil se toma con pyinstrument
+(perfilador por muestreo, genera un flamegraph HTML) si está instalado, o con cProfile (genera un archivo
+pstats, que se puede abrir con `snakeviz` o `python -m pstats`), y se guarda en
+'<PROFILING_DIR>/<session_id>/' junto con un resumen en texto.
+
+Los perfiladores solo ven el hilo que atiende la solicitud: el flujo de nodos, el RAG y los parsers de
+langchain corren en ese hilo, pero las llamadas duplicadas de `utils.hedging` no.
+
+Con 'PROFILING_TRACEMALLOC_FRAMES' mayor a 0 se activa tracemalloc al arrancar y `memory_snapshot` informa
+las líneas que más memoria asignaron y la diferencia con la instantánea anterior. tracemalloc tiene un
+costo apreciable en CPU y memoria, por eso es una opción aparte.
+
+Con el perfilado desactivado, cada solicitud solo evalúa una condición.
+"""
+
+_SAFE_NAME = re.compile(r"^[\w.\-]+$")
+
+
+class ProfileRun:
+    """
+    Perfil de una solicitud en curso. 'key' (normalmente el 'session_id') define la carpeta donde se guarda;
+    se puede asignar dentro del bloque, cuando se conoce (por ejemplo, al crear una sesión nueva).
+    """
+    def __init__(self, engine: str, reason: str):
+        self.engine = engine
+        self.reason = reason
+        self.key = None
+        self.started_at = datetime.now(timezone.utc)
+        self._profiler = None
+
+    def start(self) -> None:
+        self._start_time = time.perf_counter()
+        if self.engine == "pyinstrument":
+            from pyinstrument import Profiler
+            self._profiler = Profiler(async_mode="disabled")
+            self._profiler.start()
+        else:
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+
+    def stop(self) -> None:
+        if self.engine == "pyinstrument":
+            self._profiler.stop()
+        else:
+            self._profiler.disable()
+        self.seconds = time.perf_counter() - self._start_time
+
+    def save(self, directory: str) -> str:
+        """
+        Guarda el perfil en 'directory' y devuelve la ruta del archivo principal.
+        """
+        os.makedirs(directory, exist_ok=True)
+        stem = os.path.join(directory, f"{self.started_at:%Y%m%dT%H%M%S%f}-{self.engine}")
+        if self.engine == "pyinstrument":
+            path = stem + ".html"
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self._profiler.output_html())
+            summary = self._profiler.output_text(unicode=True, color=False)
+        else:
+            import pstats
+            path = stem + ".prof"
+            self._profiler.dump_stats(path)
+            out = io.StringIO()
+            pstats.Stats(self._profiler, stream=out).sort_stats("cumulative").print_stats(40)
+            summary = out.getvalue()
+        with open(stem + ".txt", "w", encoding="utf-8") as f:
+            f.write(f"# {self.reason}, {self.seconds:.3f} segundos\n{summary}")
+        return path
+
+
+class _NoProfile:
+    """
+    Reemplazo sin costo de `ProfileRun` para las solicitudes que no se perfilan.
+    """
+    key = None
+
+    def __setattr__(self, name, value) -> None:
+        pass
+
+
+_NO_PROFILE = _NoProfile()
+
+
+class Profiler:
+    """
+    Decide qué solicitudes se perfilan, guarda los perfiles y los lista.
+    """
+    def __init__(self, enabled: bool = PROFILING_ENABLED,
+                 token: str = PROFILING_TOKEN,
+                 sample_rate: float = PROFILING_SAMPLE_RATE,
+                 engine: str = PROFILING_ENGINE,
+                 directory: str = PROFILING_DIR,
+                 max_profiles: int = PROFILING_MAX_PROFILES):
+        self.enabled = enabled
+        self.token = token
+        self.sample_rate = sample_rate
+        self.engine = self._resolve_engine(engine) if enabled else engine
+        self.directory = directory
+        self.max_profiles = max_profiles
+        # Un perfil a la vez por proceso: cProfile no admite dos perfiladores activos en paralelo
+        self._busy = threading.Lock()
+
+    @staticmethod
+    def _resolve_engine(engine: str) -> str:
+        if engine in ("auto", "pyinstrument"):
+            try:
+                import pyinstrument  # noqa: F401
+                return "pyinstrument"
+            except ImportError:
+                if engine == "pyinstrument":
+                    logger.warning("pyinstrument no está instalado; se usará cProfile.")
+        return "cprofile"
+
+    def _reason(self, token: Optional[str]) -> Optional[str]:
+        if token and self.token and hmac.compare_digest(token, self.token):
+            return "encabezado X-Profile"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "muestreo"
+        return None
+
+    @contextmanager
+    def maybe_profile(self, token: Optional[str] = None, key: Optional[str] = None) -> Iterator[object]:
+        """
+        Perfila el bloque si corresponde (ver el docstring del módulo) y al salir guarda el perfil en la carpeta
+        de 'key'. Devuelve el `ProfileRun` o, si la solicitud no se perfila, un objeto que ignora las asignaciones.
+        """
+        if not self.enabled:
+            yield _NO_PROFILE
+            return
+        reason = self._reason(token)
+        if reason is None or not self._busy.acquire(blocking=False):
+            yield _NO_PROFILE
+            return
+        run = ProfileRun(self.engine, reason)
+        run.key = key
+        try:
+            run.start()
+            try:
+                yield run
+            finally:
+                run.stop()
+                self._save(run)
+        finally:
+            self._busy.release()
+
+    def _save(self, run: ProfileRun) -> None:
+        try:
+            key = run.key if run.key and _SAFE_NAME.match(str(run.key)) else "sin_sesion"
+            path = run.save(os.path.join(self.directory, str(key)))
+            metrics.incr("profiling.saved")
+            logger.info("Perfil de la sesión '%s' (%s, %.2f segundos) guardado en '%s'.", key, run.reason, run.seconds, path)
+            self._prune()
+        except Exception as e:
+            logger.error("No se pudo guardar el perfil: %s", e)
+
+    def _prune(self) -> None:
+        profiles = self.list()
+        for profile in profiles[self.max_profiles:]:
+            folder = os.path.join(self.directory, profile["session_id"])
+            stem = os.path.splitext(os.path.join(folder, profile["file"]))[0]
+            for extension in (".html", ".prof", ".txt"):
+                if os.path.exists(stem + extension):
+                    os.remove(stem + extension)
+            if not os.listdir(folder):
+                os.rmdir(folder)
+
+    def list(self, session_id: Optional[str] = None) -> list:
+        """
+        Devuelve los perfiles guardados, del más nuevo al más viejo, opcionalmente solo los de una sesión.
+        """
+        if not os.path.isdir(self.directory):
+            return []
+        keys = [session_id] if session_id else os.listdir(self.directory)
+        profiles = []
+        for key in keys:
+            folder = os.path.join(self.directory, key)
+            if not _SAFE_NAME.match(key) or not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if not name.endswith((".html", ".prof")):
+                    continue
+                stat = os.stat(os.path.join(folder, name))
+                profiles.append({
+                    "session_id": key,
+                    "file": name,
+                    "engine": "pyinstrument" if name.endswith(".html") else "cprofile",
+                    "ts": datetime.strptime(name.split("-")[0], "%Y%m%dT%H%M%S%f").replace(tzinfo=timezone.utc).isoformat(),
+                    "size": stat.st_size,
+                })
+        return sorted(profiles, key=lambda profile: profile["ts"], reverse=True)
+
+    def path(self, session_id: str, name: str) -> Optional[str]:
+        """
+        Devuelve la ruta de un archivo de perfil, o None si no existe o el nombre no es válido.
+        """
+        if not (_SAFE_NAME.match(session_id) and _SAFE_NAME.match(name)):
+            return None
+        path = os.path.join(self.directory, session_id, name)
+        return path if os.path.isfile(path) else None
+
+
+_last_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def start_memory_tracing(frames: int = PROFILING_TRACEMALLOC_FRAMES) -> None:
+    """
+    Activa tracemalloc si el perfilado está habilitado y 'frames' es mayor a 0.
+    """
+    if PROFILING_ENABLED and frames > 0 and not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        logger.info("Seguimiento de memoria con tracemalloc activado (%d cuadros).", frames)
+
+
+def memory_snapshot(limit: int = 20, group_by: str = "lineno") -> dict:
+    """
+    Toma una instantánea de tracemalloc y devuelve las 'limit' ubicaciones con más memoria asignada y las que
+    más crecieron desde la instantánea anterior (la primera vez, 'growth' está vacío).
+
+    Excepciones:
+        RuntimeError: Si tracemalloc no está activo (ver 'PROFILING_TRACEMALLOC_FRAMES').
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("El seguimiento de memoria no está activo (PROFILING_TRACEMALLOC_FRAMES).")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    with _snapshot_lock:
+        previous, _last_snapshot = _last_snapshot, snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    describe = lambda stat: {
+        "location": str(stat.traceback[0]),
+        "size_kb": round(stat.size / 1024, 1),
+        "count": stat.count,
+    }
+    return {
+        "traced_mb": round(current / 1024 / 1024, 2),
+        "peak_mb": round(peak / 1024 / 1024, 2),
+        "top": [describe(stat) for stat in snapshot.statistics(group_by)[:limit]],
+        "growth": [] if previous is None else [
+            {**describe(stat), "size_diff_kb": round(stat.size_diff / 1024, 1), "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(previous, group_by)[:limit]
+        ],
+    }
+
+
+# static instance for common usages
+profiler = Profiler()
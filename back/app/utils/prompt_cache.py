@@ -0,0 +1,50 @@
+import threading
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
+
+"""
+Registro de los tokens del prompt que el proveedor leyó de su caché de prefijos.
+
+Se importa recién al invocar al LLM (ver `invoke_llm`), igual que el resto de langchain.
+"""
+
+
+def cached_tokens(response: LLMResult) -> int:
+    """
+    Devuelve los tokens del prompt en caché de una respuesta del LLM: de 'prompt_tokens_details.cached_tokens'
+    en el uso que informa el proveedor o, si no está, de 'usage_metadata' de los mensajes generados.
+    """
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    details = usage.get("prompt_tokens_details") or {}
+    if details.get("cached_tokens") is not None:
+        return details["cached_tokens"]
+    total = 0
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            total += (metadata.get("input_token_details") or {}).get("cache_read", 0) or 0
+    return total
+
+
+class CachedTokensHandler(BaseCallbackHandler):
+    """
+    Suma los tokens en caché de las respuestas de una invocación (incluidas las llamadas duplicadas,
+    igual que `get_openai_callback` con el resto de los tokens).
+    """
+    def __init__(self):
+        super().__init__()
+        self.cached_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response: LLMResult, **kwargs) -> None:
+        cached = cached_tokens(response)
+        with self._lock:
+            self.cached_tokens += cached
+
+    def apply(self, cb) -> None:
+        """
+        Completa 'cb.prompt_tokens_cached' del callback de `get_openai_callback` si la versión de
+        langchain no lo calcula.
+        """
+        if not getattr(cb, "prompt_tokens_cached", 0):
+            cb.prompt_tokens_cached = self.cached_tokens
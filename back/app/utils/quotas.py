@@ -0,0 +1,171 @@
+import os
+from dotenv import load_dotenv
+import math
+import threading
+import time
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+# 'memory' (en el proceso) o 'redis' (compartido entre workers y nodos)
+QUOTA_BACKEND = os.getenv('QUOTA_BACKEND', 'memory').lower()
+QUOTA_URL = os.getenv('QUOTA_URL', os.getenv('SESSION_CACHE_URL', 'redis://localhost:6379/0'))
+
+"""
+Cuotas por cliente de la API con token buckets.
+
+Cada cliente (ver `utils.security.ApiClient`) tiene dos baldes que se recargan de forma continua:
+    - solicitudes: cada solicitud (o cada pregunta de un lote) consume una unidad; con el balde vacío se rechaza.
+    - tokens del LLM: los tokens no se conocen antes de procesar la solicitud, así que se descuentan al terminar
+      (los 'tokens_used' de la interacción) y el balde puede quedar en negativo. Mientras esté en negativo se
+      rechazan las solicitudes nuevas del cliente.
+Los rechazos lanzan `QuotaExceeded` con los segundos hasta que el balde se recupere (encabezado 'Retry-After').
+
+Con 'QUOTA_BACKEND=redis' los baldes se guardan en un servidor con el protocolo de Redis y se actualizan con
+un script de Lua (atómico y con el reloj del servidor), así que la cuota es una sola para todos los workers
+y nodos. Si el servidor no responde, las solicitudes se admiten y se registra el error.
+"""
+
+
+class QuotaExceeded(Exception):
+    """
+    Se lanza cuando un cliente superó su cuota. 'retry_after' es la cantidad de segundos sugerida
+    al cliente antes de reintentar.
+    """
+    def __init__(self, message: str, retry_after: int = 1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class MemoryBuckets:
+    """
+    Baldes en el proceso. Con varios workers cada uno tiene los suyos (la cuota efectiva se multiplica).
+    """
+    name = "memory"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._buckets = {}  # clave -> [tokens, instante de la última actualización]
+
+    def consume(self, key: str, capacity: float, rate: float, cost: float, force: bool = False) -> tuple:
+        """
+        Recarga el balde 'key' ('rate' unidades por segundo, hasta 'capacity') y descuenta 'cost' si alcanza
+        (o siempre, con 'force'). Un costo mayor que la capacidad se admite con el balde lleno y lo deja en
+        negativo.
+
+        Retorno:
+            tuple[bool, float]: Si se admitió y las unidades que quedan en el balde.
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, last = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - last) * rate)
+            allowed = force or tokens >= min(cost, capacity)
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = [tokens, now]
+            return allowed, tokens
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"backend": self.name, "buckets": len(self._buckets)}
+
+
+# Mismo algoritmo que `MemoryBuckets.consume`, con el reloj del servidor. La clave vence cuando el balde se llenaría.
+_CONSUME_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local force = ARGV[4] == '1'
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local last = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - last) * rate)
+local allowed = 0
+if force or tokens >= math.min(cost, capacity) then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+
+class RedisBuckets:
+    """
+    Baldes compartidos en un servidor con el protocolo de Redis: un hash 'quota:<cliente>:<balde>' por balde.
+    """
+    name = "redis"
+
+    def __init__(self, url: str = QUOTA_URL):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+        self._consume = self._client.register_script(_CONSUME_SCRIPT)
+
+    def consume(self, key: str, capacity: float, rate: float, cost: float, force: bool = False) -> tuple:
+        allowed, tokens = self._consume(keys=[key], args=[capacity, rate, cost, int(force)])
+        return bool(allowed), float(tokens)
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name}
+
+
+class Quotas:
+    """
+    Aplica las cuotas de solicitudes y de tokens de cada cliente sobre el backend de baldes configurado.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def admit(self, client, requests: int = 1) -> None:
+        """
+        Admite 'requests' solicitudes del cliente o lanza `QuotaExceeded`. El balde de tokens solo se consulta
+        (tiene que no estar en negativo); se descuenta al terminar con `charge`.
+        """
+        if client is None:
+            return
+        if client.tokens_per_minute:
+            self._consume(client, "tokens", client.tokens_per_minute, client.tokens_per_minute / 60, 0)
+        if client.requests_per_minute:
+            self._consume(client, "requests", client.requests_burst, client.requests_per_minute / 60, requests)
+        metrics.incr(f"quota.{client.name}.admitted", requests)
+
+    def charge(self, client, tokens: int) -> None:
+        """
+        Descuenta del balde de tokens del cliente los tokens que usó una interacción.
+        """
+        if client is None or not tokens:
+            return
+        metrics.incr(f"quota.{client.name}.tokens", tokens)
+        if client.tokens_per_minute:
+            self._consume(client, "tokens", client.tokens_per_minute, client.tokens_per_minute / 60, tokens, force=True)
+
+    def _consume(self, client, bucket: str, capacity: float, rate: float, cost: float, force: bool = False) -> None:
+        try:
+            allowed, tokens = self.backend.consume(f"quota:{client.name}:{bucket}", capacity, rate, cost, force)
+        except Exception as e:
+            metrics.incr("quota.error")
+            logger.warning("Error al consultar la cuota de '%s' (%s), se admite la solicitud: %s", client.name, bucket, e)
+            return
+        if not allowed:
+            metrics.incr(f"quota.{client.name}.rejected.{bucket}")
+            retry_after = max(1, math.ceil((min(cost, capacity) - tokens) / rate))
+            logger.warning("Cuota de %s del cliente '%s' agotada, reintentar en %s segundos.", bucket, client.name, retry_after)
+            raise QuotaExceeded(f"Cuota de {bucket} agotada para el cliente '{client.name}'.", retry_after=retry_after)
+
+    def snapshot(self) -> dict:
+        return self.backend.snapshot()
+
+
+def _create_backend(backend: str):
+    if backend == "redis":
+        return RedisBuckets()
+    return MemoryBuckets()
+
+
+# static instance for common usages
+quotas = Quotas(_create_backend(QUOTA_BACKEND))
+metrics.register("quotas", quotas.snapshot)
@@ -0,0 +1,150 @@
+import os
+from dotenv import load_dotenv
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from utils.limiter import Overloaded, LLM_QUEUE_TIMEOUT
+from utils.logger import logger
+from utils.metrics import metrics
+from utils.quotas import QuotaExceeded
+
+load_dotenv()
+# Ejecuciones del flujo de nodos a la vez en el proceso
+FAIR_MAX_CONCURRENCY = int(os.getenv('FAIR_MAX_CONCURRENCY', '32'))
+# Solicitudes en espera por cliente; las siguientes se rechazan con un 429
+FAIR_MAX_QUEUE_PER_CLIENT = int(os.getenv('FAIR_MAX_QUEUE_PER_CLIENT', '32'))
+FAIR_QUEUE_TIMEOUT = float(os.getenv('FAIR_QUEUE_TIMEOUT', str(LLM_QUEUE_TIMEOUT)))
+
+"""
+Reparto equitativo de la capacidad del LLM entre los clientes de la API.
+
+Cada ejecución del flujo de nodos ocupa un lugar de 'FAIR_MAX_CONCURRENCY'. Si no hay lugares libres, la
+solicitud espera en la cola de su cliente; cuando se libera un lugar se elige el cliente con round-robin
+ponderado suave (el de nginx) según el peso de cada uno. Así un cliente con muchas solicitudes en espera no
+demora a los demás: cada cliente con solicitudes en espera recibe lugares en proporción a su peso.
+
+El reparto es por proceso; las cuotas (ver `utils.quotas`) pueden compartirse entre procesos.
+"""
+
+
+class _Ticket:
+    __slots__ = ("granted",)
+
+    def __init__(self):
+        self.granted = False
+
+
+class FairScheduler:
+    """
+    Semáforo con una cola por cliente y round-robin ponderado entre las colas.
+    """
+    def __init__(self, max_concurrency: int = FAIR_MAX_CONCURRENCY, max_queue_per_client: int = FAIR_MAX_QUEUE_PER_CLIENT):
+        self.max_concurrency = max_concurrency
+        self.max_queue_per_client = max_queue_per_client
+        self.in_flight = 0
+        self._queues = {}   # cliente -> deque de tickets en espera
+        self._weights = {}  # cliente -> peso
+        self._current = {}  # cliente -> peso acumulado del round-robin
+        self._avg_duration = None
+        self._cond = threading.Condition()
+
+    def _next_client(self) -> str:
+        # Round-robin ponderado suave: suma su peso a cada cliente en espera, elige el de mayor acumulado
+        # y le resta el total. Los clientes sin solicitudes en espera no acumulan.
+        total = 0.0
+        for name in self._queues:
+            self._current[name] = self._current.get(name, 0.0) + self._weights[name]
+            total += self._weights[name]
+        chosen = max(self._queues, key=lambda name: self._current[name])
+        self._current[chosen] -= total
+        return chosen
+
+    def _dispatch(self) -> None:
+        while self.in_flight < self.max_concurrency and self._queues:
+            name = self._next_client()
+            queue = self._queues[name]
+            queue.popleft().granted = True
+            if not queue:
+                del self._queues[name]
+                self._current.pop(name, None)
+            self.in_flight += 1
+        self._cond.notify_all()
+
+    def _retry_after(self, waiting: int) -> int:
+        duration = self._avg_duration or 1.0
+        return max(1, min(60, math.ceil(duration * (waiting + 1) / self.max_concurrency)))
+
+    def acquire(self, name: str, weight: float, timeout: float = None, limit_queue: bool = True) -> None:
+        """
+        Ocupa un lugar para el cliente 'name', esperando como mucho 'timeout' segundos en su cola
+        (sin límite si es None).
+
+        Con 'limit_queue=False' la solicitud espera aunque la cola del cliente esté llena: la usan las
+        solicitudes de un lote, que ya pasaron la cuota y cuya concurrencia ya está acotada (ver `api.chat.get_answers`).
+
+        Excepciones:
+            QuotaExceeded: Si la cola del cliente está llena (y 'limit_queue' es True).
+            Overloaded: Si venció el plazo de espera.
+        """
+        start = time.monotonic()
+        with self._cond:
+            if self.in_flight < self.max_concurrency and not self._queues:
+                self.in_flight += 1
+                return
+            queue = self._queues.get(name)
+            if limit_queue and queue is not None and len(queue) >= self.max_queue_per_client:
+                metrics.incr(f"fair_scheduler.{name}.rejected")
+                raise QuotaExceeded(f"Demasiadas solicitudes en espera para el cliente '{name}'.",
+                                    retry_after=self._retry_after(len(queue)))
+            ticket = _Ticket()
+            self._weights[name] = weight
+            self._queues.setdefault(name, deque()).append(ticket)
+            while not ticket.granted:
+                remaining = None if timeout is None else start + timeout - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    queue = self._queues.get(name)
+                    queue.remove(ticket)
+                    if not queue:
+                        del self._queues[name]
+                        self._current.pop(name, None)
+                    metrics.incr(f"fair_scheduler.{name}.timeout")
+                    logger.warning("[fair_scheduler] La solicitud del cliente '%s' no obtuvo lugar a tiempo.", name)
+                    raise Overloaded("Servicio saturado (fair_scheduler).", retry_after=self._retry_after(len(queue)))
+                self._cond.wait(remaining)
+        metrics.observe(f"fair_scheduler.{name}.wait_seconds", time.monotonic() - start)
+
+    def release(self, duration: float = None) -> None:
+        with self._cond:
+            self.in_flight -= 1
+            if duration is not None:
+                self._avg_duration = duration if self._avg_duration is None else 0.9 * self._avg_duration + 0.1 * duration
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, client, timeout: float = FAIR_QUEUE_TIMEOUT, limit_queue: bool = True):
+        """
+        Context manager que ocupa un lugar para 'client' (un `ApiClient`; sin cliente, el cliente 'default'
+        con peso 1) mientras dura la ejecución del flujo de nodos (ver `acquire`).
+        """
+        name, weight = (client.name, client.weight) if client is not None else ("default", 1.0)
+        self.acquire(name, weight, timeout, limit_queue)
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.release(time.monotonic() - start)
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "max_concurrency": self.max_concurrency,
+                "in_flight": self.in_flight,
+                "queued": {name: len(queue) for name, queue in self._queues.items()},
+            }
+
+
+# static instance for common usages
+fair_scheduler = FairScheduler()
+metrics.register("fair_scheduler", fair_scheduler.snapshot)
@@ -1,34 +1,122 @@
 import os
 from dotenv import load_dotenv
-from fastapi import Depends, HTTPException
+import asyncio
+import hashlib
+import json
+from typing import Optional
+from fastapi import Depends, HTTPException, WebSocket
 from fastapi.security import APIKeyHeader
+from utils.logger import logger
 
 # Cargo variables de ambiente
 load_dotenv()
 FASTAPI_PASSWORD = os.getenv('FASTAPI_PASSWORD')
+# Archivo JSON con los clientes de la API y sus cuotas (ver `load_api_keys`)
+PATH_API_KEYS = os.getenv('PATH_API_KEYS', 'docs/api_keys.json')
+# Cuotas por defecto de cada cliente, por minuto ('0' = sin límite)
+QUOTA_REQUESTS_PER_MINUTE = float(os.getenv('QUOTA_REQUESTS_PER_MINUTE', '0'))
+QUOTA_TOKENS_PER_MINUTE = float(os.getenv('QUOTA_TOKENS_PER_MINUTE', '0'))
+# Nombre del cliente que usa 'FASTAPI_PASSWORD'
+DEFAULT_CLIENT = "default"
+# Segundos que tiene una conexión WebSocket para enviar su clave
+WS_AUTH_TIMEOUT = float(os.getenv('WS_AUTH_TIMEOUT', '10'))
 
 
-def verify_api_key(x_api_key: str = Depends(APIKeyHeader(name="X-API-Key"))):
+class ApiClient:
     """
-    Verifica la clave API proporcionada contra un valor almacenado en las variables de entorno.
+    Un cliente de la API: su nombre, sus cuotas por minuto de solicitudes y de tokens del LLM (ver
+    `utils.quotas`) y su peso en el reparto de la capacidad del LLM (ver `utils.scheduler`).
 
-    Esta función utiliza la inyección de dependencias de FastAPI para extraer la clave API 
-    de los encabezados de la solicitud (específicamente, el encabezado "X-API-Key"). Luego 
-    compara la clave con el valor preconfigurado almacenado en la variable de entorno 
-    `FASTAPI_PASSWORD`.
+    'requests_burst' es la cantidad de solicitudes que puede enviar de golpe; por defecto, las de un minuto.
+    """
+    def __init__(self, name: str, requests_per_minute: float = QUOTA_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float = QUOTA_TOKENS_PER_MINUTE, requests_burst: float = None, weight: float = 1):
+        self.name = name
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self.requests_burst = float(requests_burst or max(1.0, self.requests_per_minute))
+        self.weight = max(float(weight), 0.01)
+
+    def __repr__(self) -> str:
+        return f"ApiClient({self.name!r})"
+
+
+def _digest(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def load_api_keys(path_api_keys: str = PATH_API_KEYS) -> dict:
+    """
+    Devuelve los clientes de la API indexados por el SHA-256 de su clave.
+
+    El archivo 'path_api_keys' declara un cliente por nombre, con la clave en claro ('key') o su SHA-256
+    ('key_sha256') y, opcionalmente, sus cuotas y su peso:
+        {"integracion_a": {"key_sha256": "...", "requests_per_minute": 60, "tokens_per_minute": 40000, "weight": 2}}
+    'FASTAPI_PASSWORD', si está definida, es la clave del cliente 'default' con las cuotas por defecto.
+    """
+    clients = {}
+    if FASTAPI_PASSWORD:
+        clients[_digest(FASTAPI_PASSWORD)] = ApiClient(DEFAULT_CLIENT)
+    if path_api_keys and os.path.exists(path_api_keys):
+        with open(path_api_keys, encoding="utf-8") as f:
+            for name, config in json.load(f).items():
+                config = dict(config)
+                digest = config.pop("key_sha256", None) or _digest(config.pop("key"))
+                config.pop("key", None)
+                clients[digest.lower()] = ApiClient(name, **config)
+        logger.info("Clientes de la API cargados: %s.", sorted(client.name for client in clients.values()))
+    return clients
+
+
+API_KEYS = load_api_keys()
+
+
+def verify_api_key(x_api_key: str = Depends(APIKeyHeader(name="X-API-Key"))) -> ApiClient:
+    """
+    Verifica la clave API proporcionada contra las claves de los clientes configurados.
+
+    Esta función utiliza la inyección de dependencias de FastAPI para extraer la clave API
+    de los encabezados de la solicitud (específicamente, el encabezado "X-API-Key"). Luego
+    busca el cliente con esa clave entre los declarados en 'PATH_API_KEYS' y el cliente 'default'
+    (la variable de entorno `FASTAPI_PASSWORD`). Las claves se comparan por su SHA-256.
 
     Args:
         x_api_key (str): La clave API extraída del encabezado de la solicitud "X-API-Key".
 
     Raises:
-        HTTPException: Si la clave API proporcionada no coincide con el valor esperado, 
+        HTTPException: Si la clave API proporcionada no corresponde a ningún cliente,
         se lanza un error 403 (Prohibido) con el detalle "Acceso denegado".
 
     Returns:
-        None: Si la clave API es válida, la solicitud se permite continuar sin lanzar una excepción.
+        ApiClient: El cliente de la clave. Las rutas lo reciben declarando la misma dependencia
+        (FastAPI la resuelve una sola vez por solicitud).
     """
-    if (x_api_key != FASTAPI_PASSWORD):
+    client = API_KEYS.get(_digest(x_api_key))
+    if client is None:
         raise HTTPException(
             status_code=403,
             detail="Acceso denegado"
-        )
\ No newline at end of file
+        )
+    return client
+
+
+async def verify_websocket(websocket: WebSocket) -> Optional[ApiClient]:
+    """
+    Autentica una conexión WebSocket ya aceptada, una sola vez para toda la conexión.
+
+    La clave se toma del encabezado "X-API-Key" del handshake (clientes servidor a servidor) o, si no está
+    (los navegadores no pueden enviar encabezados), del primer mensaje: {"type": "auth", "api_key": "..."},
+    que tiene que llegar antes de 'WS_AUTH_TIMEOUT' segundos.
+
+    Returns:
+        Optional[ApiClient]: El cliente de la clave, o None si la clave falta o no corresponde a ningún cliente.
+    """
+    key = websocket.headers.get("x-api-key")
+    if key is None:
+        try:
+            message = json.loads(await asyncio.wait_for(websocket.receive_text(), WS_AUTH_TIMEOUT))
+        except (asyncio.TimeoutError, ValueError):
+            return None
+        if isinstance(message, dict) and message.get("type") == "auth":
+            key = message.get("api_key")
+    return API_KEYS.get(_digest(key)) if isinstance(key, str) else None
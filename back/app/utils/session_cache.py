@@ -0,0 +1,222 @@
+import os
+from dotenv import load_dotenv
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+# 'memory' (en el proceso, un solo nodo), 'redis' (compartido entre nodos) o 'none' (sin caché)
+SESSION_CACHE_BACKEND = os.getenv('SESSION_CACHE_BACKEND', 'memory').lower()
+# Cualquier servidor que hable el protocolo de Redis (redis, valkey, keydb...), por ejemplo: redis://localhost:6379/0
+SESSION_CACHE_URL = os.getenv('SESSION_CACHE_URL', 'redis://localhost:6379/0')
+SESSION_CACHE_TTL = float(os.getenv('SESSION_CACHE_TTL', '1800'))
+SESSION_CACHE_MAX_SESSIONS = int(os.getenv('SESSION_CACHE_MAX_SESSIONS', '10000'))
+# Cantidad de mensajes del historial que recibe el flujo de nodos (igual que `retrieve_history`)
+HISTORY_SIZE = 5
+
+"""
+Caché del estado de las sesiones, delante de Postgres.
+
+Guarda por 'session_id' el nombre del usuario, el idioma, el corpus y los últimos 'HISTORY_SIZE' mensajes
+(con el mismo formato que devuelve `retrieve_history`, del más nuevo al más viejo). Se actualiza después de
+cada escritura en la base de datos (write-through), así que una sesión caliente no lee la base de datos en
+cada interacción.
+
+El estado de una sesión es un diccionario:
+    {"user_name": str, "language": str, "corpus": str, "client": str, "messages": [{"user_message": str, "answer": str}, ...]}
+"""
+
+
+class MemorySessionCache:
+    """
+    Caché en el proceso, con vencimiento ('ttl') y una cantidad máxima de sesiones (se descartan las menos usadas).
+
+    Solo sirve con un único proceso: con varios workers, cada uno vería una copia distinta de la sesión
+    (ver `configure`).
+    """
+    name = "memory"
+
+    def __init__(self, ttl: float = SESSION_CACHE_TTL, max_sessions: int = SESSION_CACHE_MAX_SESSIONS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, session_id: str) -> Optional[dict]:
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                del self._items[session_id]
+                return None
+            self._items.move_to_end(session_id)
+            return _copy(item[1])
+
+    def set(self, session_id: str, state: dict) -> None:
+        with self._lock:
+            self._items[session_id] = (time.monotonic(), _copy(state))
+            self._items.move_to_end(session_id)
+            while len(self._items) > self.max_sessions:
+                self._items.popitem(last=False)
+
+    def update(self, session_id: str, message: dict) -> None:
+        with self._lock:
+            item = self._items.get(session_id)
+            if item is not None:
+                self._items[session_id] = (time.monotonic(), apply_message(item[1], message))
+                self._items.move_to_end(session_id)
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._items.pop(session_id, None)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"backend": self.name, "sessions": len(self._items)}
+
+
+class RedisSessionCache:
+    """
+    Caché compartida entre nodos en un servidor con el protocolo de Redis. Cada sesión es una clave
+    'session:<id>' con el estado en JSON y vencimiento 'ttl'; el límite de memoria y el desalojo LRU los
+    maneja el servidor ('maxmemory' y 'maxmemory-policy allkeys-lru').
+
+    Las actualizaciones leen y reescriben la clave: se apoyan en que las interacciones de una misma sesión
+    se procesan de a una (ver `utils.single_flight.SessionLocks`).
+    """
+    name = "redis"
+
+    def __init__(self, url: str = SESSION_CACHE_URL, ttl: float = SESSION_CACHE_TTL):
+        import redis
+        self.ttl = int(ttl)
+        self._client = redis.Redis.from_url(url, socket_timeout=1, socket_connect_timeout=1)
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"session:{session_id}"
+
+    def get(self, session_id: str) -> Optional[dict]:
+        data = self._client.get(self._key(session_id))
+        return json.loads(data) if data else None
+
+    def set(self, session_id: str, state: dict) -> None:
+        self._client.set(self._key(session_id), json.dumps(state, ensure_ascii=False, default=str), ex=self.ttl)
+
+    def update(self, session_id: str, message: dict) -> None:
+        state = self.get(session_id)
+        if state is not None:
+            self.set(session_id, apply_message(state, message))
+
+    def delete(self, session_id: str) -> None:
+        self._client.delete(self._key(session_id))
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name}
+
+
+class NullSessionCache:
+    """
+    Sin caché: todas las lecturas van a la base de datos.
+    """
+    name = "none"
+
+    def get(self, session_id: str) -> Optional[dict]:
+        return None
+
+    def set(self, session_id: str, state: dict) -> None:
+        pass
+
+    def update(self, session_id: str, message: dict) -> None:
+        pass
+
+    def delete(self, session_id: str) -> None:
+        pass
+
+    def snapshot(self) -> dict:
+        return {"backend": self.name}
+
+
+def _copy(state: dict) -> dict:
+    return {**state, "messages": list(state.get("messages", []))}
+
+
+def apply_message(state: dict, message: dict) -> dict:
+    """
+    Devuelve el estado de la sesión con 'message' (un registro de la tabla 'messages' como diccionario)
+    agregado al principio del historial.
+    """
+    state = _copy(state)
+    state["user_name"] = message.get("user_name")
+    state["language"] = message.get("language")
+    state["messages"] = [
+        {"user_message": message.get("user_message", ""), "answer": message.get("answer", "")},
+        *state["messages"]
+    ][:HISTORY_SIZE]
+    return state
+
+
+class SessionCache:
+    """
+    Envuelve el backend configurado: cuenta aciertos y fallos, y si el backend falla (por ejemplo, el
+    servidor de Redis no responde) registra el error y sigue sin caché, de modo que la solicitud lee
+    la base de datos en lugar de fallar.
+    """
+    def __init__(self, backend):
+        self.backend = backend
+
+    def get(self, session_id: str) -> Optional[dict]:
+        try:
+            state = self.backend.get(session_id)
+        except Exception as e:
+            metrics.incr("session_cache.error")
+            logger.warning("Error al leer la sesión '%s' de la caché: %s", session_id, e)
+            return None
+        metrics.incr("session_cache.hit" if state is not None else "session_cache.miss")
+        return state
+
+    def set(self, session_id: str, state: dict) -> None:
+        self._call("set", session_id, state)
+
+    def update(self, session_id: str, message: dict) -> None:
+        self._call("update", session_id, message)
+
+    def delete(self, session_id: str) -> None:
+        self._call("delete", session_id)
+
+    def _call(self, method: str, session_id: str, *args) -> None:
+        try:
+            getattr(self.backend, method)(session_id, *args)
+        except Exception as e:
+            metrics.incr("session_cache.error")
+            logger.warning("Error al actualizar la sesión '%s' en la caché: %s", session_id, e)
+            # Una entrada que no se pudo actualizar quedaría desactualizada: se intenta borrar
+            if method != "delete":
+                self._call("delete", session_id)
+
+    def snapshot(self) -> dict:
+        return {**self.backend.snapshot(), "hit_rate": metrics.ratio("session_cache.hit", "session_cache.miss")}
+
+
+def _create_backend(backend: str):
+    if backend == "redis":
+        return RedisSessionCache()
+    if backend == "none":
+        return NullSessionCache()
+    return MemorySessionCache()
+
+
+session_cache = SessionCache(_create_backend(SESSION_CACHE_BACKEND))
+metrics.register("session_cache", lambda: session_cache.snapshot())
+
+
+def configure(backend: str) -> None:
+    """
+    Cambia el backend de la caché (por ejemplo, desde la configuración de gunicorn).
+    """
+    session_cache.backend = _create_backend(backend)
+    logger.info("Caché de sesiones: '%s'.", session_cache.backend.name)
@@ -0,0 +1,139 @@
+import os
+from dotenv import load_dotenv
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Callable, Hashable, Optional
+from utils.limiter import Overloaded
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+SESSION_LOCK_TIMEOUT = float(os.getenv('SESSION_LOCK_TIMEOUT', '20'))
+IDEMPOTENCY_TTL = float(os.getenv('IDEMPOTENCY_TTL', '600'))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv('IDEMPOTENCY_MAX_KEYS', '10000'))
+
+
+class SessionBusy(Overloaded):
+    """
+    Se lanza cuando una sesión tiene otra interacción en curso y no se liberó a tiempo.
+    """
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Agrupa llamadas concurrentes con la misma clave para que se ejecuten una sola vez.
+
+    La primera llamada con una clave ejecuta la función; las que llegan mientras está en curso esperan
+    y reciben el mismo resultado (o la misma excepción). Una vez terminada, la clave se libera.
+    """
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key: Hashable, fn: Callable[[], Any], timeout: Optional[float] = None) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            metrics.incr(f"{self.name}.shared")
+            logger.info("[%s] Solicitud duplicada en curso, se comparte el resultado.", self.name)
+            if not call.done.wait(timeout):
+                raise Overloaded(f"La solicitud duplicada ({self.name}) no terminó a tiempo.")
+            if call.error:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class SessionLocks:
+    """
+    Serializa las interacciones de una misma sesión con un lock por sesión. Los locks se crean al
+    primer uso y se eliminan cuando nadie los está usando ni esperando.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._locks = {}
+
+    @contextmanager
+    def hold(self, session_id: str, timeout: float = SESSION_LOCK_TIMEOUT):
+        """
+        Context manager que toma el lock de la sesión, esperando como mucho 'timeout' segundos.
+
+        Excepciones:
+            SessionBusy: Si la sesión sigue ocupada al vencer el plazo.
+        """
+        with self._lock:
+            entry = self._locks.setdefault(session_id, [threading.Lock(), 0])
+            entry[1] += 1
+        start = time.monotonic()
+        try:
+            if not entry[0].acquire(timeout=max(0.0, timeout)):
+                metrics.incr("session_locks.timeout")
+                raise SessionBusy(f"La sesión '{session_id}' tiene otra interacción en curso.", retry_after=2)
+            metrics.observe("session_locks.wait_seconds", time.monotonic() - start)
+            try:
+                yield
+            finally:
+                entry[0].release()
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._locks[session_id]
+
+
+class IdempotencyStore:
+    """
+    Guarda en memoria las respuestas asociadas a una clave de idempotencia, con vencimiento ('ttl')
+    y una cantidad máxima de claves (se descartan las menos usadas).
+    """
+    def __init__(self, ttl: float = IDEMPOTENCY_TTL, max_keys: int = IDEMPOTENCY_MAX_KEYS):
+        self.ttl = ttl
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._items = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            if time.monotonic() - item[0] > self.ttl:
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return item[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._items[key] = (time.monotonic(), value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_keys:
+                self._items.popitem(last=False)
+
+
+# static instances for common usages
+chat_flight = SingleFlight("chat_single_flight")
+session_locks = SessionLocks()
+idempotency_store = IdempotencyStore()
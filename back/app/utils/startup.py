@@ -0,0 +1,154 @@
+from dotenv import load_dotenv
+import threading
+import time
+from typing import Optional
+from utils.limiter import Overloaded
+from utils.logger import logger
+from utils.metrics import metrics
+
+load_dotenv()
+
+COMPONENTS = ("prompts", "database", "graph", "index")
+
+
+class NotReady(Overloaded):
+    """
+    Se lanza cuando llega una solicitud antes de que la aplicación termine de inicializarse.
+    """
+
+
+class Readiness:
+    """
+    Estado de inicialización de cada componente de la aplicación (prompts, base de datos, flujo de nodos
+    compilado e índice vectorial), con el tiempo que tomó y el error, si lo hubo.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._components = {name: {"ready": False, "seconds": None, "error": None} for name in COMPONENTS}
+
+    def mark(self, name: str, seconds: float = None, error: Exception = None) -> None:
+        with self._lock:
+            self._components[name] = {
+                "ready": error is None,
+                "seconds": round(seconds, 3) if seconds is not None else None,
+                "error": str(error) if error else None,
+            }
+
+    def is_ready(self) -> bool:
+        with self._lock:
+            return all(component["ready"] for component in self._components.values())
+
+    def check(self) -> None:
+        """
+        Excepciones:
+            NotReady: Si algún componente todavía no está inicializado.
+        """
+        if not self.is_ready():
+            raise NotReady("La aplicación todavía se está inicializando.", retry_after=5)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {name: dict(component) for name, component in self._components.items()}
+
+
+readiness = Readiness()
+metrics.register("readiness", readiness.snapshot)
+
+
+def _init(name: str, fn) -> None:
+    start_time = time.time()
+    try:
+        fn()
+        readiness.mark(name, seconds=time.time() - start_time)
+        logger.info("Componente '%s' inicializado en %.2f segundos.", name, time.time() - start_time)
+    except Exception as e:
+        readiness.mark(name, seconds=time.time() - start_time, error=e)
+        logger.error("Error al inicializar el componente '%s': %s", name, e)
+
+
+def init_prompts() -> None:
+    from utils.auxiliar_functions import load_templates
+    load_templates()
+
+
+def init_database() -> None:
+    from db.orm.orm import db_engine
+    from db.orm.partitions import ensure_partitions
+    db_engine.create_tables()
+    ensure_partitions()
+
+
+def init_graph() -> None:
+    from api.graph import get_graph
+    get_graph()
+
+
+def init_index() -> None:
+    """
+    Crea (o convierte) la base de datos vectorial del corpus por defecto si hace falta y la carga en memoria.
+    Los demás corpus se cargan al primer uso (ver `db.vdb.registry`).
+    """
+    from db.vdb.registry import corpus_registry
+    corpus_registry.get()
+
+
+def initialize() -> None:
+    """
+    Inicializa todos los componentes en el hilo actual. Los errores quedan registrados en `readiness`
+    y no interrumpen la inicialización de los demás componentes.
+    """
+    start_time = time.time()
+    _init("prompts", init_prompts)
+    _init("database", init_database)
+    _init("graph", init_graph)
+    _init("index", init_index)
+    logger.info("Inicialización terminada en %.2f segundos. Lista: %s.", time.time() - start_time, readiness.is_ready())
+
+
+def before_fork() -> None:
+    """
+    Prepara el proceso padre para crear los workers: cierra las conexiones abiertas durante la
+    inicialización y congela los objetos ya creados para que el recolector de basura no escriba
+    en sus páginas de memoria (que así se comparten copy-on-write entre los workers).
+    """
+    import gc
+    from db.orm.orm import db_engine
+    db_engine.engine.dispose()
+    gc.collect()
+    gc.freeze()
+    logger.info("Objetos congelados antes del fork: %d.", gc.get_freeze_count())
+
+
+def after_fork() -> None:
+    """
+    Reinicializa en el proceso hijo los recursos que no se pueden compartir con el padre: el pool de
+    conexiones de la base de datos (sin cerrar las conexiones del padre), el hilo del logger, el pool
+    de hilos de las llamadas duplicadas, el modelo de embeddings local (los hilos de ONNX Runtime no
+    sobreviven al fork) y las métricas en memoria. El índice vectorial, las plantillas
+    y el flujo de nodos compilado quedan compartidos en modo de solo lectura.
+    """
+    from db.orm.orm import db_engine
+    from utils.embeddings import get_local_embeddings
+    from utils.hedging import reset_executor
+    from utils.logger import _root
+    _root.restart()
+    db_engine.engine.dispose(close=False)
+    reset_executor()
+    get_local_embeddings.cache_clear()
+    metrics.reset()
+
+
+def initialize_in_background() -> Optional[threading.Thread]:
+    """
+    Inicializa todos los componentes en un hilo aparte, para que la aplicación empiece a aceptar
+    conexiones (y responda '/health') mientras se crea o carga el índice.
+
+    Si la aplicación ya se inicializó antes del fork (modo multiproceso con 'preload_app', ver
+    'gunicorn.conf.py'), no hace nada y devuelve None.
+    """
+    if readiness.is_ready():
+        logger.info("Componentes ya inicializados antes del fork; se omite la inicialización.")
+        return None
+    thread = threading.Thread(target=initialize, name="startup", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,39 @@
+from typing import Callable, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+
+"""
+Envío de la respuesta del LLM token a token mientras se genera.
+
+La solicitud indica a quién enviar los tokens con la clave 'on_token' del estado del flujo de nodos (una
+función que recibe cada parte del texto, o None para descartar lo enviado si la llamada se reintenta).
+Solo se transmiten los prompts que generan la respuesta final (ver `nodes.run.STREAMED_PROMPTS`).
+
+Se importa recién al invocar al LLM (ver `invoke_llm`), igual que el resto de langchain.
+"""
+
+
+class TokenStreamHandler(BaseCallbackHandler):
+    """
+    Pasa a 'on_token' cada token nuevo del modelo. Si la llamada se reintenta después de haber enviado
+    tokens, primero avisa con `on_token(None)` que la respuesta vuelve a empezar.
+    """
+    def __init__(self, on_token: Callable[[Optional[str]], None]):
+        super().__init__()
+        self.on_token = on_token
+        self.sent = 0
+
+    def on_llm_start(self, serialized: dict, prompts: list, **kwargs) -> None:
+        self._restart()
+
+    def on_chat_model_start(self, serialized: dict, messages: list, **kwargs) -> None:
+        self._restart()
+
+    def _restart(self) -> None:
+        if self.sent:
+            self.on_token(None)
+            self.sent = 0
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        if token:
+            self.sent += 1
+            self.on_token(token)
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import uuid
+import httpx
+from typing import Iterator, Optional
+from dotenv import load_dotenv
+
+load_dotenv()
+FASTAPI_PASSWORD = os.getenv('FASTAPI_PASSWORD')
+FASTAPI_URL = os.getenv('FASTAPI_URL')
+# Endpoint opcional que devuelve la respuesta por partes (NDJSON, '/chat/stream' del backend); si no está definido se usa FASTAPI_URL
+FASTAPI_STREAM_URL = os.getenv('FASTAPI_STREAM_URL')
+FASTAPI_CONNECT_TIMEOUT = float(os.getenv('FASTAPI_CONNECT_TIMEOUT', '5'))
+# Un poco más que el plazo de cada interacción en el backend (REQUEST_TIMEOUT)
+FASTAPI_READ_TIMEOUT = float(os.getenv('FASTAPI_READ_TIMEOUT', '40'))
+FASTAPI_MAX_RETRIES = int(os.getenv('FASTAPI_MAX_RETRIES', '2'))
+FASTAPI_MAX_CONNECTIONS = int(os.getenv('FASTAPI_MAX_CONNECTIONS', '20'))
+
+
+class ChatTurn:
+    """
+    Una pregunta de una sesión de Streamlit. Cada turno tiene su propia clave de idempotencia, así que los
+    reintentos no generan respuestas duplicadas en el backend.
+    """
+    def __init__(self, question: str, session_id: Optional[str] = None):
+        self.question = question
+        self.session_id = session_id or ""
+        self.idempotency_key = str(uuid.uuid4())
+        self.answer = None
+
+    def payload(self) -> dict:
+        return {"session_id": self.session_id, "question": self.question}
+
+
+class ChatClient:
+    """
+    Cliente HTTP del backend con un pool de conexiones keep-alive compartido entre todas las sesiones
+    de Streamlit (httpx.Client es seguro para usar desde varios hilos).
+
+    - Los errores de conexión se reintentan en el transporte; las respuestas 503 (backend saturado o
+      iniciándose) se reintentan respetando 'Retry-After', hasta 'FASTAPI_MAX_RETRIES' veces.
+    - Si 'FASTAPI_STREAM_URL' está definido, `stream` lee la respuesta por partes a medida que llega.
+    """
+    def __init__(self, url: str = FASTAPI_URL, stream_url: str = FASTAPI_STREAM_URL, max_retries: int = FASTAPI_MAX_RETRIES):
+        self.url = url
+        self.stream_url = stream_url
+        self.max_retries = max_retries
+        self._client = httpx.Client(
+            headers={
+                'accept': 'application/json',
+                'X-API-Key': FASTAPI_PASSWORD or "",
+                'Content-Type': 'application/json'
+            },
+            timeout=httpx.Timeout(FASTAPI_READ_TIMEOUT, connect=FASTAPI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=FASTAPI_MAX_CONNECTIONS, max_keepalive_connections=FASTAPI_MAX_CONNECTIONS),
+            transport=httpx.HTTPTransport(retries=max_retries)
+        )
+
+    @property
+    def streaming(self) -> bool:
+        return bool(self.stream_url)
+
+    def _post(self, url: str, turn: ChatTurn, stream: bool = False) -> httpx.Response:
+        headers = {"Idempotency-Key": turn.idempotency_key}
+        attempt = 0
+        while True:
+            request = self._client.build_request("POST", url, json=turn.payload(), headers=headers)
+            response = self._client.send(request, stream=stream)
+            if response.status_code == 503 and attempt < self.max_retries:
+                response.close()
+                time.sleep(min(float(response.headers.get("Retry-After", 1)), 5))
+                attempt += 1
+                continue
+            if response.is_error:
+                if stream:
+                    response.read()
+                response.raise_for_status()
+            return response
+
+    def ask(self, turn: ChatTurn) -> dict:
+        """
+        Envía la pregunta y devuelve la respuesta completa ({"respuesta": ..., "session_id": ...}).
+        """
+        data = self._post(self.url, turn).json()
+        turn.answer = data["respuesta"]
+        turn.session_id = data.get("session_id") or turn.session_id
+        return data
+
+    def stream(self, turn: ChatTurn) -> Iterator[str]:
+        """
+        Devuelve la respuesta por partes. Con 'FASTAPI_STREAM_URL' lee las líneas NDJSON a medida que llegan:
+        {"type": "token", "content": "..."} con cada parte, {"type": "reset"} si el backend reintentó la llamada y
+        la respuesta vuelve a empezar, y {"type": "end", "respuesta": "...", "session_id": "..."} al final. Sin
+        endpoint de streaming, pide la respuesta completa y la devuelve de una vez.
+        Al terminar, 'turn.answer' y 'turn.session_id' quedan actualizados.
+        """
+        if not self.streaming:
+            yield self.ask(turn)["respuesta"]
+            return
+        response = self._post(self.stream_url, turn, stream=True)
+        try:
+            parts = []
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get("type") == "token":
+                    parts.append(event["content"])
+                    yield event["content"]
+                elif event.get("type") == "reset":
+                    # Lo ya mostrado no se puede borrar: se separa y la respuesta completa queda en 'turn.answer'
+                    parts.clear()
+                    yield "\n\n"
+                elif event.get("type") == "end":
+                    turn.session_id = event.get("session_id") or turn.session_id
+                    turn.answer = event.get("respuesta", "".join(parts))
+                    # Si el backend no envió partes (por ejemplo, respuesta en modo degradado), se muestra la respuesta final
+                    if not parts:
+                        yield turn.answer
+                elif event.get("type") == "error":
+                    raise RuntimeError(event.get("detail", "Error en el backend."))
+        finally:
+            response.close()
+
+    def close(self) -> None:
+        self._client.close()
@@ -1,24 +1,10 @@
 import os
-from requests import post
 from typing import Generator
 from dotenv import load_dotenv
 
 load_dotenv()
-FASTAPI_PASSWORD = os.getenv('FASTAPI_PASSWORD')
-FASTAPI_URL = os.getenv('FASTAPI_URL')
-
-url = FASTAPI_URL
-
-payload = {
-    "session_id": "",
-    "question": ""
-}
-
-headers = {
-    'accept': 'application/json',
-    'X-API-Key': FASTAPI_PASSWORD,
-    'Content-Type': 'application/json'
-    }
+# Cantidad máxima de mensajes del historial que se dibujan en cada rerun (los anteriores se ocultan)
+MAX_RENDERED_MESSAGES = int(os.getenv('MAX_RENDERED_MESSAGES', '50'))
 
 
 def write_stream(text: str) -> Generator:
@@ -26,8 +12,12 @@ def write_stream(text: str) -> Generator:
         yield s
 
 
-def get_response(prompt: str, conversation_id) -> dict:
-    payload["question"] = prompt
-    payload["session_id"] = conversation_id
-    response = post(url, json=payload, headers=headers).json()
-    return response
+def visible_messages(messages: list, show_all: bool = False) -> tuple:
+    """
+    Devuelve los mensajes a dibujar (los últimos 'MAX_RENDERED_MESSAGES', o todos si 'show_all') y la
+    cantidad de mensajes ocultos.
+    """
+    if show_all or len(messages) <= MAX_RENDERED_MESSAGES:
+        return messages, 0
+    hidden = len(messages) - MAX_RENDERED_MESSAGES
+    return messages[hidden:], hidden
@@ -1,9 +1,16 @@
 import streamlit as st
-from functions import write_stream, get_response
+from client import ChatClient, ChatTurn
+from functions import write_stream, visible_messages
 
 st.title("Pi Consulting challenge")
 
 
+@st.cache_resource
+def get_client() -> ChatClient:
+    # Un único cliente (y pool de conexiones) para todas las sesiones del servidor de Streamlit
+    return ChatClient()
+
+
 if "messages" not in st.session_state:
     st.session_state.messages = []
     st.session_state.messages.append({"role": "assistant",
@@ -16,7 +23,16 @@ Para empezar me encantaría que me dijeras tu nombre.
 if "conversation_id" not in st.session_state:
     st.session_state.conversation_id = ""
 
-for message in st.session_state.messages:
+if "show_all" not in st.session_state:
+    st.session_state.show_all = False
+
+messages, hidden = visible_messages(st.session_state.messages, st.session_state.show_all)
+if hidden:
+    if st.button(f"Mostrar {hidden} mensajes anteriores"):
+        st.session_state.show_all = True
+        st.rerun()
+
+for message in messages:
     with st.chat_message(message["role"]):
         st.markdown(message["content"])
 
@@ -26,12 +42,17 @@ if prompt := st.chat_input("Di algo..."):
         st.markdown(prompt)
 
     with st.chat_message("assistant"):
+        client = get_client()
+        turn = ChatTurn(prompt, st.session_state.conversation_id)
         try:
-            query_param = st.query_params
-            response = get_response(prompt, st.session_state.conversation_id)
-            stream = write_stream(str(response["respuesta"]))
-            st.session_state.conversation_id = response["session_id"]
+            if client.streaming:
+                stream = client.stream(turn)
+            else:
+                stream = write_stream(str(client.ask(turn)["respuesta"]))
+            response = st.write_stream(stream)
+            # Si la respuesta se reinició mientras se mostraba, en el historial se guarda la versión final
+            response = turn.answer or response
+            st.session_state.conversation_id = turn.session_id
         except Exception as e:
-            stream = write_stream(f"NSe ha producido un error: {e}")
-        response = st.write_stream(stream)
+            response = st.write_stream(write_stream(f"Se ha producido un error: {e}"))
     st.session_state.messages.append({"role": "assistant", "content": response})